@@ -1,11 +1,19 @@
-from fastapi import APIRouter, File, UploadFile, HTTPException, Form, Depends, BackgroundTasks
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, File, UploadFile, HTTPException, Form, Depends, BackgroundTasks, WebSocket, WebSocketDisconnect, Query, Header
+from fastapi.responses import JSONResponse, StreamingResponse, Response
+from starlette.concurrency import run_in_threadpool
+from datetime import datetime
+import asyncio
 from typing import List, Optional
 import logging
 
 from ..core import services
 from ..core.queue_manager import queue_manager 
-from ..models.schemas import ImageUploadResponse, ImageSummaryRecord, QueuedItem
+from ..core.admission import AdmissionRejected
+from ..core.request_status import request_status_store
+from ..core.summary_reads import SummaryPage, etag_matches
+from ..utils.image_processing import inspect_upload, ImageValidationError
+from ..utils.dates import utc_date_str
+from ..models.schemas import ImageUploadResponse, ImageSummaryRecord, QueuedItem, RequestStatus
 
 # Configure basic logging
 logging.basicConfig(level=logging.INFO)
@@ -19,6 +27,32 @@ def get_db_status():
         raise HTTPException(status_code=503, detail="Database service is not available. Please check server logs.")
     return True
 
+# The summary listings are sent pre-serialized (summary_page_response), so no response_model applies
+SUMMARY_PAGE_RESPONSES = {
+    200: {
+        "description": "JSON array of summary records, newest first, each with only the requested `fields` "
+                       "(all ImageSummaryRecord fields by default).",
+        "headers": {
+            "ETag": {"description": "Validator for If-None-Match.", "schema": {"type": "string"}},
+            "X-Next-Cursor": {"description": "`cursor` for the next page; absent on the last page.", "schema": {"type": "string"}}
+        }
+    },
+    304: {"description": "The client's copy (If-None-Match) is current."},
+    400: {"description": "Unknown field or malformed cursor."}
+}
+
+def summary_page_response(page: SummaryPage, if_none_match: Optional[str]) -> Response:
+    """
+    Sends a serialized summary page with its ETag and next-page cursor, or 304 if the client's copy is current.
+    """
+    body, etag, next_cursor = page
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if next_cursor:
+        headers["X-Next-Cursor"] = next_cursor
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
 @router.post("/upload_image/", 
              response_model=ImageUploadResponse, 
              summary="Upload an image for text summarization")
@@ -31,6 +65,7 @@ async def upload_image(
     """
     Receives an image and customer ID. Validates the request, checks user limits,
     adds the image to a processing queue, and returns an immediate acknowledgment.
+    The upload stays in its spooled temp file; size and magic bytes are checked before it is decoded.
 
     - **customer_id**: The unique identifier for the customer.
     - **image**: The image file to be processed.
@@ -42,21 +77,28 @@ async def upload_image(
         logger.warning(f"Invalid file type for customer {customer_id}: {image.content_type}")
         return ImageUploadResponse(success=False, message="Invalid file type. Please upload an image (JPEG, PNG, etc.).", error_info="Unsupported content type")
     
-    image_bytes = await image.read()
-    if not image_bytes:
-        logger.warning(f"Empty image file uploaded by customer {customer_id}.")
-        return ImageUploadResponse(success=False, message="Image file is empty.", error_info="Empty file")
+    # Oversized bodies were already cut off by UploadSizeLimitMiddleware; this is the exact per-file check
+    try:
+        sniffed_type, image_size = await run_in_threadpool(inspect_upload, image.file, image.size)
+    except ImageValidationError as e:
+        logger.warning(f"Rejected upload from customer {customer_id} ({image.filename}): {e}")
+        return JSONResponse(
+            status_code=e.status_code,
+            content=ImageUploadResponse(success=False, message=str(e), error_info=type(e).__name__).model_dump()
+        )
+    logger.info(f"Upload from customer {customer_id} ({image.filename}): {sniffed_type}, {image_size} bytes.")
 
     try:
-        success, message, request_id = await services.process_image_submission(
+        success, message, request_id, details = await services.process_image_submission(
             customer_id=customer_id, 
             file_name=image.filename, 
-            image_bytes=image_bytes
+            image_source=image.file,
+            image_size=image_size
         )
         
         if success:
             logger.info(f"Image from {customer_id} ({image.filename}) accepted. Request ID: {request_id}")
-            return ImageUploadResponse(success=True, message=message, request_id=request_id)
+            return ImageUploadResponse(success=True, message=message, request_id=request_id, **details)
         else:
             logger.warning(f"Image submission failed for {customer_id} ({image.filename}): {message}")
             status_code = 429 if "limit" in message.lower() else 400
@@ -65,6 +107,12 @@ async def upload_image(
                 content=ImageUploadResponse(success=False, message=message, error_info=message).model_dump()
             )
 
+    except AdmissionRejected as e:
+        return JSONResponse(
+            status_code=e.status_code,
+            content=ImageUploadResponse(success=False, message=str(e), error_info=str(e), retry_after_seconds=e.retry_after).model_dump(),
+            headers={"Retry-After": str(e.retry_after)}
+        )
     except Exception as e:
         logger.error(f"Unexpected error during image upload for customer {customer_id}: {e}", exc_info=True)
         return JSONResponse(
@@ -73,16 +121,32 @@ async def upload_image(
         )
 
 @router.get("/summaries/{customer_id}", 
-            response_model=List[ImageSummaryRecord], 
+            response_model=None, 
+            responses=SUMMARY_PAGE_RESPONSES,
             summary="Get summaries for a customer")
-async def get_customer_summaries(customer_id: str, limit: int = 10, db_available: bool = Depends(get_db_status)):
+async def get_customer_summaries(
+    customer_id: str,
+    limit: int = Query(10, ge=1),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None),
+    db_available: bool = Depends(get_db_status)
+):
     """
-    Retrieves the latest image summaries for a given customer.
+    Retrieves the latest image summaries for a given customer, newest first, as a JSON array of
+    records holding only the requested `fields`.
+
+    - **cursor**: the `X-Next-Cursor` header of the previous page (absent on the last page).
+    - **fields**: comma-separated fields to return, e.g. `sequence_number,original_file_name,text_summary,created_at`.
+
+    Responses carry an `ETag`; a request with a matching `If-None-Match` gets `304 Not Modified`.
     """
     logger.info(f"Fetching summaries for customer_id: {customer_id}, limit: {limit}")
     try:
-        summaries = await services.get_summaries_by_customer(customer_id, limit)
-        return summaries
+        page = await services.get_summary_page(customer_id, limit, cursor, fields)
+        return summary_page_response(page, if_none_match)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error fetching summaries for customer {customer_id}: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="Failed to retrieve summaries.")
@@ -107,22 +171,141 @@ async def get_specific_summary(customer_id: str, filename: str, db_available: bo
         logger.error(f"Error fetching specific summary for {customer_id}, {filename}: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="Failed to retrieve summary.")
 
+@router.get("/requests/{request_id}",
+            response_model=RequestStatus,
+            summary="Get the processing status of an upload")
+async def get_request_status(request_id: str):
+    """
+    Returns the state of an upload by the request_id from /upload_image/: queued (with queue position),
+    processing, done (with the summary) or failed. Served from memory; use the /events or /ws stream
+    instead of polling to be told when the request finishes.
+    """
+    status = await services.get_request_status(request_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Unknown request_id.")
+    return status
+
+@router.get("/requests/{request_id}/events", summary="Stream the processing status of an upload (Server-Sent Events)")
+async def stream_request_status(request_id: str):
+    """
+    Sends a `status` event with the current state, then one per state change; the stream ends once the
+    request is done or failed. Comment lines are sent as keepalives while nothing changes.
+    """
+    status = await services.get_request_status(request_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Unknown request_id.")
+
+    async def event_stream():
+        async for update in request_status_store.stream(status):
+            if update is None:
+                yield ": keepalive\n\n"
+            else:
+                yield f"event: status\ndata: {update.model_dump_json()}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        # Keep proxies from buffering the events
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.websocket("/requests/{request_id}/ws")
+async def request_status_websocket(websocket: WebSocket, request_id: str):
+    """
+    Sends the current status as a JSON message, then one per state change, and closes (1000) once the
+    request is done or failed. Unknown request ids are closed with code 4404. Client messages are ignored.
+    """
+    await websocket.accept()
+    status = await services.get_request_status(request_id)
+    if status is None:
+        await websocket.close(code=4404, reason="Unknown request_id.")
+        return
+
+    async def send_updates():
+        async for update in request_status_store.stream(status):
+            if update is not None:
+                await websocket.send_text(update.model_dump_json())
+        await websocket.close()
+
+    async def wait_for_disconnect():
+        # Reading is how a closed connection is noticed while no state change is being sent
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+
+    sender = asyncio.create_task(send_updates())
+    receiver = asyncio.create_task(wait_for_disconnect())
+    try:
+        await asyncio.wait((sender, receiver), return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        client_closed = receiver.done() and not sender.done()
+        # Cancelling the sender ends the status stream, which unsubscribes it. Not awaited here, so a
+        # cancellation of this handler (server shutdown) propagates right away.
+        for task in (sender, receiver):
+            task.cancel()
+    errors = [task.exception() for task in (sender, receiver) if task.done() and not task.cancelled()]
+    if client_closed or any(isinstance(error, WebSocketDisconnect) for error in errors):
+        logger.info(f"Status WebSocket for {request_id} closed by the client.")
+    elif errors and errors[0] is not None:
+        logger.error(f"Status WebSocket for {request_id} failed: {errors[0]}")
+
 @router.get("/admin/queue_status/", summary="Get current queue status (Admin)")
 async def get_queue_info():
     status = await queue_manager.get_queue_status()
+    status["pipeline"] = services.processing_pipeline.get_status()
     return status
 
+@router.get("/admin/quota_status/", summary="Get in-memory daily quota counters (Admin)")
+async def get_quota_info():
+    return services.quota_engine.get_status()
+
+@router.get("/admin/daily_stats/", summary="Get materialized daily statistics (Admin)")
+async def get_daily_stats(date: Optional[str] = None, customer_id: Optional[str] = None):
+    """
+    Summaries, failures, partial results, cache hits, per-stage failures and average stage latencies of a day
+    (YYYY-MM-DD, UTC; default today), over all customers or for one customer. One indexed lookup, no scans.
+    """
+    date_str = date or utc_date_str()
+    try:
+        datetime.strptime(date_str, "%Y-%m-%d")
+    except ValueError:
+        raise HTTPException(status_code=400, detail="date must be in YYYY-MM-DD format.")
+    return await services.daily_stats.get(date_str, customer_id)
+
+@router.get("/admin/admission_status/", summary="Get admission control state and processing rate estimate (Admin)")
+async def get_admission_info():
+    return services.admission_controller.get_status()
+
+@router.get("/admin/request_status/", summary="Get request status store counters (Admin)")
+async def get_request_status_info():
+    return request_status_store.get_status()
+
+@router.get("/admin/cache_stats/", summary="Get result cache hit/miss counters (Admin)")
+async def get_cache_stats():
+    return services.result_cache.get_stats()
+
+@router.get("/admin/summary_cache_stats/", summary="Get summary read cache hit/miss counters (Admin)")
+async def get_summary_cache_stats():
+    return services.summary_read_cache.get_stats()
+
 @router.get("/admin/all_queued_items/", response_model=List[QueuedItem], summary="Get all items currently in queue (Admin)")
 async def get_all_queued_items_snapshot():
     items = queue_manager.get_all_items_snapshot()
     return items
 
-@router.get("/admin/all_summaries/", response_model=List[ImageSummaryRecord], summary="Get all processed summaries (Admin)")
-async def get_all_processed_summaries(limit: int = 50, db_available: bool = Depends(get_db_status)):
+@router.get("/admin/all_summaries/", response_model=None, responses=SUMMARY_PAGE_RESPONSES, summary="Get all processed summaries (Admin)")
+async def get_all_processed_summaries(
+    limit: int = Query(50, ge=1),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None),
+    db_available: bool = Depends(get_db_status)
+):
     logger.info(f"Fetching all summaries, limit: {limit}")
     try:
-        summaries = await services.get_all_summaries(limit)
-        return summaries
+        page = await services.get_summary_page(None, limit, cursor, fields)
+        return summary_page_response(page, if_none_match)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error fetching all summaries: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="Failed to retrieve all summaries.") 
\ No newline at end of file
@@ -0,0 +1,159 @@
+import math
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+import logging
+
+# Configure basic logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Admitted-but-unfinished requests (queued + in the pipeline) above which new uploads are shed with 503
+QUEUE_HIGH_WATER_MARK = int(os.getenv("QUEUE_HIGH_WATER_MARK", 100))
+# Unfinished requests a single customer may have at once; more are rejected with 429
+MAX_INFLIGHT_PER_CUSTOMER = int(os.getenv("MAX_INFLIGHT_PER_CUSTOMER", 5))
+# EWMA weight of the newest completion interval when estimating the processing rate
+ADMISSION_RATE_SMOOTHING = float(os.getenv("ADMISSION_RATE_SMOOTHING", 0.2))
+# Processing rate (items/second) assumed until the first completions have been measured
+ADMISSION_INITIAL_RATE = float(os.getenv("ADMISSION_INITIAL_RATE", 0.5))
+ADMISSION_MAX_RETRY_AFTER = int(os.getenv("ADMISSION_MAX_RETRY_AFTER", 120))
+
+class AdmissionRejected(Exception):
+    """
+    Raised when an upload is shed. `status_code` is 503 (server overloaded) or 429 (customer in-flight cap).
+    """
+    def __init__(self, message: str, status_code: int, retry_after: int):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+class AdmissionController:
+    """
+    Admission control for uploads, driven by the number of unfinished requests and the measured processing rate.
+
+    A request is tracked from admit() until complete() (or release() if it never made it into the queue).
+    The processing rate is an EWMA over the intervals between completions while the system is busy,
+    so idle periods do not make the service look slow. All methods are synchronous and run on the event loop.
+    """
+    def __init__(self, high_water_mark: int = QUEUE_HIGH_WATER_MARK, max_in_flight_per_customer: int = MAX_INFLIGHT_PER_CUSTOMER,
+                 smoothing: float = ADMISSION_RATE_SMOOTHING, initial_rate: float = ADMISSION_INITIAL_RATE,
+                 max_retry_after: int = ADMISSION_MAX_RETRY_AFTER):
+        self.high_water_mark = max(1, high_water_mark)
+        self.max_in_flight_per_customer = max(1, max_in_flight_per_customer)
+        self.smoothing = min(max(smoothing, 0.01), 1.0)
+        self.max_retry_after = max(1, max_retry_after)
+        # request_id -> customer_id for every admitted, unfinished request
+        self._requests: Dict[str, str] = {}
+        self._per_customer: Dict[str, int] = {}
+        self._interval = 1.0 / max(initial_rate, 1e-3)
+        self._rate_measured = False
+        self._last_completion: Optional[float] = None
+        self._busy_since: Optional[float] = None
+        self._stats = {"admitted": 0, "completed": 0, "rejected_overload": 0, "rejected_customer": 0}
+
+    @property
+    def depth(self) -> int:
+        return len(self._requests)
+
+    @property
+    def processing_rate(self) -> float:
+        return 1.0 / self._interval
+
+    def estimate_wait(self, items_ahead: int) -> float:
+        return items_ahead * self._interval
+
+    def _retry_after(self, items_to_drain: int) -> int:
+        return min(self.max_retry_after, max(1, math.ceil(self.estimate_wait(max(1, items_to_drain)))))
+
+    def _track(self, request_id: str, customer_id: str):
+        if not self._requests:
+            self._busy_since = time.monotonic()
+        self._requests[request_id] = customer_id
+        self._per_customer[customer_id] = self._per_customer.get(customer_id, 0) + 1
+
+    def admit(self, request_id: str, customer_id: str) -> Tuple[float, int]:
+        """
+        Admits a request or raises AdmissionRejected.
+        Returns: (estimated_wait_seconds, customer_in_flight) including this request.
+        """
+        depth = self.depth
+        if depth >= self.high_water_mark:
+            self._stats["rejected_overload"] += 1
+            retry_after = self._retry_after(depth - self.high_water_mark + 1)
+            logger.warning(f"Shedding upload from {customer_id}: {depth} unfinished requests (high-water mark {self.high_water_mark}), Retry-After {retry_after}s.")
+            raise AdmissionRejected("Server is busy. Please retry later.", 503, retry_after)
+
+        customer_in_flight = self._per_customer.get(customer_id, 0)
+        if customer_in_flight >= self.max_in_flight_per_customer:
+            self._stats["rejected_customer"] += 1
+            # The customer's oldest request finishes no later than the current backlog drains
+            retry_after = self._retry_after(depth)
+            logger.warning(f"Rejecting upload from {customer_id}: {customer_in_flight} requests already in flight.")
+            raise AdmissionRejected(
+                f"In-flight request limit reached ({self.max_in_flight_per_customer}). Please wait for earlier uploads to finish.",
+                429, retry_after
+            )
+
+        self._track(request_id, customer_id)
+        self._stats["admitted"] += 1
+        return round(self.estimate_wait(depth + 1), 2), customer_in_flight + 1
+
+    def release(self, request_id: str) -> bool:
+        """
+        Drops an admitted request without counting it as processed (rejected later on or never queued).
+        Safe to call more than once.
+        """
+        customer_id = self._requests.pop(request_id, None)
+        if customer_id is None:
+            return False
+        remaining = self._per_customer.get(customer_id, 1) - 1
+        if remaining > 0:
+            self._per_customer[customer_id] = remaining
+        else:
+            self._per_customer.pop(customer_id, None)
+        return True
+
+    def complete(self, request_id: str):
+        """
+        Marks an admitted request as finished (saved or given up on) and updates the rate estimate.
+        """
+        if not self.release(request_id):
+            return
+        self._stats["completed"] += 1
+        now = time.monotonic()
+        # Measure from the previous completion, or from the moment the system became busy after being idle
+        marks = [t for t in (self._last_completion, self._busy_since) if t is not None]
+        interval = now - max(marks) if marks else 0.0
+        if interval > 0:
+            if self._rate_measured:
+                self._interval += self.smoothing * (interval - self._interval)
+            else:
+                self._interval = interval
+                self._rate_measured = True
+        self._last_completion = now
+        if not self._requests:
+            self._busy_since = None
+
+    def register_backlog(self, items: List) -> int:
+        """
+        Tracks items that are already queued without going through admit() (recovered from the queue spool).
+        """
+        for item in items:
+            if item.request_id not in self._requests:
+                self._track(item.request_id, item.customer_id)
+        return len(items)
+
+    def get_status(self) -> dict:
+        return {
+            "unfinished_requests": self.depth,
+            "high_water_mark": self.high_water_mark,
+            "max_in_flight_per_customer": self.max_in_flight_per_customer,
+            "processing_rate_per_second": round(self.processing_rate, 3),
+            "rate_measured": self._rate_measured,
+            "estimated_wait_seconds": round(self.estimate_wait(self.depth), 2),
+            "customers_in_flight": len(self._per_customer),
+            **self._stats
+        }
+
+# Global instance, shared by the upload route and the processing pipeline
+admission_controller = AdmissionController()
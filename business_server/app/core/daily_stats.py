@@ -0,0 +1,142 @@
+import asyncio
+import os
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+import logging
+
+from ..models.schemas import ProcessingResult
+from .database import mongo_repository
+from ..utils.dates import utc_date_str
+
+# Configure basic logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# How often pending aggregate changes are written back to MongoDB
+DAILY_STATS_FLUSH_INTERVAL_SECONDS = float(os.getenv("DAILY_STATS_FLUSH_INTERVAL_SECONDS", 1.0))
+
+# (date, customer_id); customer_id None is the day's total over all customers
+StatsKey = Tuple[str, Optional[str]]
+
+class DailyStatsEngine:
+    """
+    Materialized per-day aggregates, over all customers and per customer, in the daily_stats collection:
+    summaries, failures, partial results, cache hits, per-stage failures and per-stage latency sums/counts.
+
+    Every saved (or failed) item adds its increments in memory; a background flusher applies them with one
+    bulk $inc (write-behind, like the quota engine). Reads are a single indexed find_one plus the increments
+    not flushed yet, so the admin stats never scan image_summaries. Days are UTC (utc_date_str), the same
+    keys the quota engine uses for the `reserved` total it writes into the day's document.
+    """
+    def __init__(self, flush_interval: float = DAILY_STATS_FLUSH_INTERVAL_SECONDS):
+        self.flush_interval = flush_interval
+        self._pending: Dict[StatsKey, Dict[str, float]] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+
+    async def start(self):
+        # Created here so the lock belongs to the running event loop
+        self._flush_lock = asyncio.Lock()
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_loop())
+        logger.info(f"Daily stats engine started (flush interval: {self.flush_interval}s).")
+
+    async def stop(self):
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        await self.flush()
+
+    def _add(self, date_str: str, customer_id: str, increments: Dict[str, float]):
+        for key in ((date_str, None), (date_str, customer_id)):
+            pending = self._pending.setdefault(key, defaultdict(int))
+            for field, amount in increments.items():
+                pending[field] += amount
+
+    def record_summary(self, result: ProcessingResult, created_at: datetime):
+        """
+        Called once the item's summary record has been written.
+        """
+        stage_seconds = dict(result.stage_seconds)
+        stage_seconds["end_to_end"] = max(0.0, (created_at - result.received_at).total_seconds())
+        increments = {"summaries": 1, "partial": 1 if result.failed_stages else 0, "cache_hits": 1 if result.from_cache else 0}
+        for stage in result.failed_stages:
+            increments[f"stage_failures.{stage}"] = 1
+        for stage, seconds in stage_seconds.items():
+            increments[f"latency_sum_seconds.{stage}"] = seconds
+            increments[f"latency_count.{stage}"] = 1
+        self._add(utc_date_str(created_at), result.customer_id, increments)
+
+    def record_failure(self, item):
+        """
+        Called when an item leaves the pipeline without a saved summary (QueuedItem or ProcessingResult).
+        """
+        self._add(utc_date_str(), item.customer_id, {"failures": 1})
+
+    async def get(self, date_str: str, customer_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        The day's aggregates (over all customers when customer_id is None), with average latencies per stage.
+        """
+        doc = {}
+        if mongo_repository.available:
+            doc = await mongo_repository.find_daily_stats(date_str, customer_id) or {}
+        totals = _unflatten(self._pending.get((date_str, customer_id), {}))
+        for field in ("summaries", "failures", "partial", "cache_hits", "reserved"):
+            totals[field] = doc.get(field, 0) + totals.get(field, 0)
+        for group in ("stage_failures", "latency_sum_seconds", "latency_count"):
+            merged = dict(doc.get(group, {}))
+            for stage, amount in totals.get(group, {}).items():
+                merged[stage] = merged.get(stage, 0) + amount
+            totals[group] = merged
+        sums, counts = totals.pop("latency_sum_seconds"), totals.pop("latency_count")
+        stats = {"date": date_str, "customer_id": customer_id, **{field: int(amount) for field, amount in totals.items() if field != "stage_failures"}}
+        stats["stage_failures"] = {stage: int(amount) for stage, amount in totals["stage_failures"].items()}
+        stats["avg_latency_seconds"] = {stage: round(sums[stage] / counts[stage], 4) for stage in sums if counts.get(stage)}
+        if customer_id is not None:
+            # Quota reservations are only kept as a total over all customers (per customer: daily_usage)
+            stats.pop("reserved")
+        return stats
+
+    async def flush(self):
+        """
+        Writes pending increments to MongoDB in one bulk write.
+        On failure the increments are merged back and retried on the next flush.
+        """
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            if not self._pending:
+                return
+            pending, self._pending = self._pending, {}
+            try:
+                await mongo_repository.apply_stats_increments({key: dict(changes) for key, changes in pending.items()})
+            except Exception as e:
+                logger.error(f"Daily stats flush failed, will retry: {e}")
+                for key, changes in pending.items():
+                    merged = self._pending.setdefault(key, defaultdict(int))
+                    for field, amount in changes.items():
+                        merged[field] += amount
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+def _unflatten(increments: Dict[str, float]) -> Dict[str, Any]:
+    # "latency_count.caption" -> {"latency_count": {"caption": n}}, the shape of the stored document
+    nested: Dict[str, Any] = {}
+    for field, amount in increments.items():
+        group, _, stage = field.partition(".")
+        if stage:
+            nested.setdefault(group, {})[stage] = amount
+        else:
+            nested[field] = amount
+    return nested
+
+# Global instance of the daily stats engine
+daily_stats = DailyStatsEngine()
@@ -0,0 +1,178 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from functools import partial
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import logging
+
+from pymongo import MongoClient, ReturnDocument, UpdateOne
+from pymongo.errors import ConnectionFailure, OperationFailure
+
+# Configure basic logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+MONGO_HOST = os.getenv("MONGO_HOST", "localhost")
+MONGO_PORT = int(os.getenv("MONGO_PORT", 27017))
+MONGO_DB_NAME = os.getenv("MONGO_DB_NAME", "image_summary_db")
+MONGO_USER = os.getenv("MONGO_INITDB_ROOT_USERNAME", "mongoadmin")
+MONGO_PASS = os.getenv("MONGO_INITDB_ROOT_PASSWORD", "secret")
+
+# Threads used to run blocking pymongo calls outside the event loop
+MONGO_EXECUTOR_WORKERS = int(os.getenv("MONGO_EXECUTOR_WORKERS", 8))
+# pymongo pool size; kept at least as large as the executor so no thread waits on a connection
+MONGO_MAX_POOL_SIZE = max(int(os.getenv("MONGO_MAX_POOL_SIZE", 20)), MONGO_EXECUTOR_WORKERS)
+
+# MongoDB Client Setup
+# Construct the MongoDB URI
+mongo_uri = f"mongodb://{MONGO_HOST}:{MONGO_PORT}/"
+try:
+    client = MongoClient(mongo_uri, serverSelectionTimeoutMS=5000, maxPoolSize=MONGO_MAX_POOL_SIZE)
+    client.admin.command('ping') # Verify connection
+    db = client[MONGO_DB_NAME]
+    image_summaries_collection = db["image_summaries"]
+    daily_usage_collection = db["daily_usage"]
+    counters_collection = db["counters"]
+    # Create indexes if they don't exist for faster queries
+    # Keyset pagination sorts on (created_at, sequence_number), per customer and over all customers
+    image_summaries_collection.create_index([("customer_id", 1), ("created_at", -1), ("sequence_number", -1)])
+    image_summaries_collection.create_index([("created_at", -1), ("sequence_number", -1)])
+    image_summaries_collection.create_index([("sequence_number", 1)], unique=True)
+    image_summaries_collection.create_index([("request_id", 1)], sparse=True)
+    daily_usage_collection.create_index([("customer_id", 1), ("date", 1)], unique=True)
+    result_cache_collection = db["result_cache"]
+    result_cache_collection.create_index([("expires_at", 1)], expireAfterSeconds=0)
+    # Materialized per-day aggregates; customer_id is null on the day's total over all customers
+    daily_stats_collection = db["daily_stats"]
+    daily_stats_collection.create_index([("date", 1), ("customer_id", 1)], unique=True)
+    logger.info(f"Successfully connected to MongoDB: {MONGO_HOST}:{MONGO_PORT}")
+except ConnectionFailure:
+    logger.error(f"Failed to connect to MongoDB: {MONGO_HOST}:{MONGO_PORT}. Check connection settings and Docker service.")
+    db = None # Indicate DB is not available
+    image_summaries_collection = None
+    daily_usage_collection = None
+    counters_collection = None
+    result_cache_collection = None
+    daily_stats_collection = None
+
+class MongoRepository:
+    """
+    Async data-access layer over pymongo.
+    Every blocking driver call runs on a dedicated thread pool, so a slow MongoDB never blocks the event loop.
+    """
+    def __init__(self, max_workers: int = MONGO_EXECUTOR_WORKERS):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="mongo")
+
+    @property
+    def available(self) -> bool:
+        return db is not None
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        if db is None:
+            raise OperationFailure("MongoDB not connected.")
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(fn, *args, **kwargs))
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        if client is not None:
+            client.close()
+            logger.info("MongoDB connection closed.")
+
+    # --- counters ---
+    async def next_sequence_number(self) -> int:
+        sequence_doc = await self.run(
+            counters_collection.find_one_and_update,
+            {"_id": "summary_sequence"},
+            {"$inc": {"sequence_value": 1}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        return sequence_doc["sequence_value"]
+
+    async def get_daily_total(self, date_str: str) -> int:
+        """
+        Quota reservations of the day (UTC, see utc_date_str) over all customers.
+        Counts written to the former counters document (summary_total_<date>) are still included.
+        """
+        def _read():
+            stats = daily_stats_collection.find_one({"date": date_str, "customer_id": None}, {"reserved": 1})
+            legacy = counters_collection.find_one({"_id": f"summary_total_{date_str}"})
+            return (stats or {}).get("reserved", 0) + (legacy or {}).get("count", 0)
+        return await self.run(_read)
+
+    # --- daily_usage ---
+    async def find_daily_usage(self, customer_id: str, date_str: str) -> Optional[Dict[str, Any]]:
+        return await self.run(daily_usage_collection.find_one, {"customer_id": customer_id, "date": date_str})
+
+    async def find_daily_usage_for_date(self, date_str: str) -> List[Dict[str, Any]]:
+        return await self.run(lambda: list(daily_usage_collection.find({"date": date_str})))
+
+    async def apply_usage_increments(self, total_increments: Dict[str, int], usage_increments: Dict[Tuple[str, str], Dict[str, int]]):
+        """
+        Applies batched counter changes: {date: amount} to the day's `reserved` total in daily_stats and
+        {(date, customer_id): {field: amount}} to daily_usage, one bulk write per collection.
+        """
+        def _apply():
+            if total_increments:
+                daily_stats_collection.bulk_write([
+                    UpdateOne({"date": date_str, "customer_id": None}, {"$inc": {"reserved": amount}}, upsert=True)
+                    for date_str, amount in total_increments.items()
+                ], ordered=False)
+            if usage_increments:
+                daily_usage_collection.bulk_write([
+                    UpdateOne({"customer_id": customer_id, "date": date_str}, {"$inc": changes}, upsert=True)
+                    for (date_str, customer_id), changes in usage_increments.items()
+                ], ordered=False)
+        await self.run(_apply)
+
+    # --- image_summaries ---
+    async def insert_summary(self, document: Dict[str, Any]):
+        return await self.run(image_summaries_collection.insert_one, document)
+
+    async def find_latest_summary(self, customer_id: str, filename: str) -> Optional[Dict[str, Any]]:
+        return await self.run(
+            image_summaries_collection.find_one,
+            {"customer_id": customer_id, "original_file_name": filename},
+            sort=[("created_at", -1)]
+        )
+
+    async def find_summary_by_request_id(self, request_id: str) -> Optional[Dict[str, Any]]:
+        return await self.run(image_summaries_collection.find_one, {"request_id": request_id})
+
+    async def find_summary_page(self, query: Dict[str, Any], projection: Dict[str, int], sort: List[Tuple[str, int]], limit: int) -> List[Dict[str, Any]]:
+        def _find():
+            # The cursor is created and exhausted on the executor thread
+            return list(image_summaries_collection.find(query, projection).sort(sort).limit(limit))
+        return await self.run(_find)
+
+    # --- result_cache ---
+    async def find_cached_result(self, content_hash: str) -> Optional[Dict[str, Any]]:
+        return await self.run(result_cache_collection.find_one, {"_id": content_hash})
+
+    async def upsert_cached_result(self, content_hash: str, document: Dict[str, Any], expires_at: datetime):
+        return await self.run(
+            result_cache_collection.replace_one,
+            {"_id": content_hash},
+            {**document, "expires_at": expires_at},
+            upsert=True
+        )
+
+    # --- daily_stats ---
+    async def apply_stats_increments(self, increments: Dict[Tuple[str, Optional[str]], Dict[str, float]]):
+        """
+        Applies {(date, customer_id): {field: amount}} with one bulk $inc; dotted fields update nested counters.
+        """
+        def _apply():
+            daily_stats_collection.bulk_write([
+                UpdateOne({"date": date_str, "customer_id": customer_id}, {"$inc": changes}, upsert=True)
+                for (date_str, customer_id), changes in increments.items()
+            ], ordered=False)
+        await self.run(_apply)
+
+    async def find_daily_stats(self, date_str: str, customer_id: Optional[str]) -> Optional[Dict[str, Any]]:
+        return await self.run(daily_stats_collection.find_one, {"date": date_str, "customer_id": customer_id}, {"_id": 0})
+
+# Global instance of the repository
+mongo_repository = MongoRepository()
@@ -0,0 +1,62 @@
+import aiohttp
+import os
+from typing import Optional
+import logging
+
+# Configure basic logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Connection pool and timeout settings for calls to the model servers
+MODEL_HTTP_POOL_LIMIT = int(os.getenv("MODEL_HTTP_POOL_LIMIT", 100))
+MODEL_HTTP_POOL_LIMIT_PER_HOST = int(os.getenv("MODEL_HTTP_POOL_LIMIT_PER_HOST", 20))
+MODEL_HTTP_KEEPALIVE_TIMEOUT = float(os.getenv("MODEL_HTTP_KEEPALIVE_TIMEOUT", 30))
+MODEL_HTTP_DNS_CACHE_TTL = int(os.getenv("MODEL_HTTP_DNS_CACHE_TTL", 300))
+MODEL_HTTP_CONNECT_TIMEOUT = float(os.getenv("MODEL_HTTP_CONNECT_TIMEOUT", 5))
+MODEL_HTTP_READ_TIMEOUT = float(os.getenv("MODEL_HTTP_READ_TIMEOUT", 60))
+
+class ModelServerClient:
+    """
+    Owns the single long-lived aiohttp session used for all model server calls.
+    Connections to the model servers are pooled and kept alive between queue items.
+    """
+    def __init__(self):
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def start(self):
+        if self._session is not None and not self._session.closed:
+            return
+        connector = aiohttp.TCPConnector(
+            limit=MODEL_HTTP_POOL_LIMIT,
+            limit_per_host=MODEL_HTTP_POOL_LIMIT_PER_HOST,
+            keepalive_timeout=MODEL_HTTP_KEEPALIVE_TIMEOUT,
+            ttl_dns_cache=MODEL_HTTP_DNS_CACHE_TTL,
+            use_dns_cache=True
+        )
+        # No total timeout: a hung server is caught by sock_connect/sock_read, and stage timeouts bound the whole call
+        timeout = aiohttp.ClientTimeout(
+            total=None,
+            connect=MODEL_HTTP_CONNECT_TIMEOUT,
+            sock_connect=MODEL_HTTP_CONNECT_TIMEOUT,
+            sock_read=MODEL_HTTP_READ_TIMEOUT
+        )
+        self._session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+        logger.info(
+            f"Model server HTTP client started (limit={MODEL_HTTP_POOL_LIMIT}, limit_per_host={MODEL_HTTP_POOL_LIMIT_PER_HOST}, "
+            f"connect_timeout={MODEL_HTTP_CONNECT_TIMEOUT}s, read_timeout={MODEL_HTTP_READ_TIMEOUT}s)."
+        )
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+            logger.info("Model server HTTP client closed.")
+        self._session = None
+
+    async def get_session(self) -> aiohttp.ClientSession:
+        # Created lazily as well, for callers running outside the app lifecycle (scripts, tests)
+        if self._session is None or self._session.closed:
+            await self.start()
+        return self._session
+
+# Global instance of the model server HTTP client
+model_server_client = ModelServerClient()
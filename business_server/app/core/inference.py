@@ -0,0 +1,158 @@
+import asyncio
+import importlib.util
+import io
+import os
+import logging
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from types import ModuleType
+from typing import Any, Callable, Dict, List, Optional
+
+from PIL import Image
+
+from .metrics import MODEL_SERVER_ERRORS
+
+# Configure basic logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# "remote": call the model servers over HTTP. "fused": run the three model handlers inside this process.
+PIPELINE_MODE = os.getenv("PIPELINE_MODE", "remote").strip().lower()
+# Directory holding the model server packages (fused mode only)
+MODEL_SERVERS_PATH = os.getenv(
+    "MODEL_SERVERS_PATH",
+    os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "..", "model_servers"))
+)
+
+# Handler module file and the name of its module-level handler instance, per model
+HANDLER_MODULES = {
+    "captioning": ("image_captioning_server", "captioning_handler"),
+    "detection": ("object_detection_server", "object_detection_handler"),
+    "generation": ("text_summarization_server", "text_summarization_handler"),
+}
+
+def load_handler_module(server_dir: str, name: str) -> ModuleType:
+    """
+    Imports <server_dir>/app/model_handler.py under a unique module name.
+    The three servers each have an `app` package of their own, so they cannot be imported as packages side by side.
+    """
+    path = os.path.join(server_dir, "app", "model_handler.py")
+    spec = importlib.util.spec_from_file_location(f"fused_{name}_model_handler", path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+class InProcessInference:
+    """
+    Runs the captioning, detection and generation handlers in the business server process (PIPELINE_MODE=fused).
+    Each model gets its own single inference thread, like one container per model in remote mode, so captioning
+    and detection of an item still overlap. Results are shaped like the model servers' JSON responses.
+    """
+    def __init__(self, model_servers_path: str = MODEL_SERVERS_PATH):
+        self.model_servers_path = model_servers_path
+        self.modules: Dict[str, ModuleType] = {}
+        self.handlers: Dict[str, Any] = {}
+        self._executors: Dict[str, ThreadPoolExecutor] = {}
+        self._ready: Optional[asyncio.Event] = None
+        self.state = "not_loaded"
+
+    async def start(self):
+        """
+        Imports and loads the three models, then warms them up (concurrently, one thread each).
+        Loading is sequential: transformers' low_cpu_mem_usage loading patches torch globally and is not thread-safe.
+        """
+        if self._ready is not None:
+            return
+        self._ready = asyncio.Event()
+        self.state = "loading"
+        for name, (server_dir, attribute) in HANDLER_MODULES.items():
+            self._executors[name] = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"fused-{name}")
+            try:
+                module = load_handler_module(os.path.join(self.model_servers_path, server_dir), name)
+            except Exception as e:
+                # Missing model dependencies (e.g. ultralytics) only disable that model
+                logger.error(f"Could not import the {name} handler from {server_dir}: {e}")
+                continue
+            self.modules[name] = module
+            self.handlers[name] = getattr(module, attribute)
+        for name, handler in self.handlers.items():
+            await self._run(name, handler.load)
+        await asyncio.gather(*(self._run(name, handler.warm_up) for name, handler in self.handlers.items()))
+        loaded = [name for name, handler in self.handlers.items() if handler.is_ready]
+        self.state = "ready" if len(loaded) == len(HANDLER_MODULES) else ("degraded" if loaded else "failed")
+        logger.info(f"In-process inference {self.state} (models ready: {', '.join(loaded) or 'none'}).")
+        self._ready.set()
+
+    def stop(self):
+        for executor in self._executors.values():
+            executor.shutdown(wait=False)
+
+    async def wait_until_loaded(self):
+        await self.start()
+        await self._ready.wait()
+
+    async def _run(self, name: str, fn: Callable, *args) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executors[name], partial(fn, *args))
+
+    def _handler(self, name: str):
+        handler = self.handlers.get(name)
+        if handler is None or not handler.is_ready:
+            MODEL_SERVER_ERRORS.labels(target=f"in_process_{name}", reason="not_ready").inc()
+            raise RuntimeError(f"In-process {name} model is not available.")
+        return handler
+
+    @staticmethod
+    def _decode(image_bytes: bytes) -> Image.Image:
+        image = Image.open(io.BytesIO(image_bytes))
+        return image if image.mode == "RGB" else image.convert("RGB")
+
+    async def decode_image(self, image_bytes: bytes) -> Image.Image:
+        """
+        Decodes once into an RGB PIL image that is shared by captioning and detection.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self._decode, image_bytes)
+
+    async def caption(self, image: Image.Image, filename: str) -> Dict[str, Any]:
+        handler = self._handler("captioning")
+        try:
+            captions = await self._run("captioning", handler.caption_images, [image])
+        except Exception:
+            MODEL_SERVER_ERRORS.labels(target="in_process_captioning", reason="other").inc()
+            raise
+        return {"filename": filename, "caption": captions[0]}
+
+    async def detect(self, image: Image.Image, filename: str) -> Dict[str, Any]:
+        import numpy as np  # installed with the model dependencies
+
+        handler = self._handler("detection")
+        try:
+            # Same array the detection server builds from its own decode (np.array of the RGB image)
+            image_np = np.asarray(image)
+            objects = await self._run("detection", handler.detect_images, [image_np])
+        except Exception:
+            MODEL_SERVER_ERRORS.labels(target="in_process_detection", reason="other").inc()
+            raise
+        return {"filename": filename, "objects": objects[0]}
+
+    async def generate(self, payload: Dict[str, Any]) -> List[str]:
+        handler = self._handler("generation")
+        request = self.modules["generation"].TextSummarizationRequest(**payload)
+        texts = await self._run("generation", handler.generate_text, request)
+        if texts and texts[0].startswith("Error"):
+            MODEL_SERVER_ERRORS.labels(target="in_process_generation", reason="other").inc()
+            raise RuntimeError(texts[0])
+        return texts
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "mode": "fused",
+            "state": self.state,
+            "models": {name: getattr(self.handlers.get(name), "state", "not_imported") for name in HANDLER_MODULES},
+        }
+
+# Global instance; None in remote mode
+in_process_inference: Optional[InProcessInference] = InProcessInference() if PIPELINE_MODE == "fused" else None
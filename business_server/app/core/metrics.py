@@ -0,0 +1,55 @@
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from prometheus_client import Counter, Gauge, Histogram, CONTENT_TYPE_LATEST, generate_latest
+
+# Latency buckets (seconds) covering fast Mongo writes up to slow CPU text generation
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Queue waits can run into minutes under load
+WAIT_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+QUEUE_DEPTH = Gauge(
+    "queue_depth", "Items waiting in the upload queue.", ["priority"]
+)
+QUEUE_WAIT_SECONDS = Histogram(
+    "queue_wait_seconds", "Time from enqueue until processing of the item starts.",
+    buckets=WAIT_BUCKETS
+)
+STAGE_LATENCY_SECONDS = Histogram(
+    "stage_latency_seconds", "Latency of one processing stage for one item (caption, detection, generation, mongo).",
+    ["stage"], buckets=LATENCY_BUCKETS
+)
+MODEL_SERVER_ERRORS = Counter(
+    "model_server_errors_total", "Failed call_model_server requests.", ["target", "reason"]
+)
+MODEL_SERVER_READY = Gauge(
+    "model_server_ready", "1 while the model server replica reports ready, 0 otherwise.", ["server", "url"]
+)
+
+@contextmanager
+def observe_stage(stage: str, timings: Optional[Dict[str, float]] = None):
+    """
+    Times a block into stage_latency_seconds and also records the seconds in `timings` (per-item daily stats).
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_LATENCY_SECONDS.labels(stage=stage).observe(elapsed)
+        if timings is not None:
+            timings[stage] = elapsed
+
+def bind_queue_depth(queue_manager):
+    """
+    Reads the queue sizes at scrape time instead of updating gauges on every enqueue/dequeue.
+    """
+    QUEUE_DEPTH.labels(priority="priority").set_function(lambda: len(queue_manager.priority_queue))
+    QUEUE_DEPTH.labels(priority="normal").set_function(lambda: len(queue_manager.normal_queue))
+
+def render_metrics():
+    """
+    Returns: (body, content_type) in the Prometheus text exposition format.
+    """
+    return generate_latest(), CONTENT_TYPE_LATEST
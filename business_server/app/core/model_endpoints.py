@@ -0,0 +1,164 @@
+import aiohttp
+import asyncio
+import os
+import logging
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+
+from .metrics import MODEL_SERVER_READY
+
+# Configure basic logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# How often the replicas' /ready endpoints are polled; replicas that are not ready are polled every second
+MODEL_READINESS_POLL_SECONDS = float(os.getenv("MODEL_READINESS_POLL_SECONDS", 5))
+MODEL_READINESS_PROBE_TIMEOUT = float(os.getenv("MODEL_READINESS_PROBE_TIMEOUT", 2))
+# How long a call waits for some replica to become ready before it fails
+MODEL_READINESS_WAIT_SECONDS = float(os.getenv("MODEL_READINESS_WAIT_SECONDS", 20))
+
+NOT_READY_POLL_SECONDS = 1.0
+
+class ModelEndpoint:
+    def __init__(self, url: str):
+        self.url = url
+        parts = urlsplit(url)
+        self.ready_url = f"{parts.scheme}://{parts.netloc}/ready"
+        # None until the first probe; unknown replicas are still used so calls work before probing starts
+        self.ready: Optional[bool] = None
+        self.state = "unknown"
+
+    def set_state(self, pool_name: str, ready: bool, state: str):
+        if ready != self.ready:
+            log = logger.info if ready else logger.warning
+            log(f"{pool_name} server {self.url} is {'ready' if ready else 'not ready'} ({state}).")
+        self.ready = ready
+        self.state = state
+        MODEL_SERVER_READY.labels(server=pool_name, url=self.url).set(1 if ready else 0)
+
+class ModelEndpointPool:
+    """
+    The replicas of one model server. Calls go round-robin to the replicas whose /ready answered 200,
+    so a replica that is still loading its model (or went away) is skipped until it reports ready again.
+    """
+    def __init__(self, name: str, urls: List[str]):
+        self.name = name
+        self.endpoints = [ModelEndpoint(url) for url in urls]
+        self._next = 0
+
+    def _routable(self) -> List[ModelEndpoint]:
+        ready = [endpoint for endpoint in self.endpoints if endpoint.ready]
+        return ready or [endpoint for endpoint in self.endpoints if endpoint.ready is None]
+
+    @property
+    def has_ready(self) -> bool:
+        return bool(self._routable())
+
+    async def acquire(self, wait_seconds: float = MODEL_READINESS_WAIT_SECONDS) -> Optional[str]:
+        """
+        Returns the URL of the next ready replica, waiting up to wait_seconds for one to become ready.
+        Returns None when none did.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + wait_seconds
+        while True:
+            candidates = self._routable()
+            if candidates:
+                endpoint = candidates[self._next % len(candidates)]
+                self._next += 1
+                return endpoint.url
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return None
+            await asyncio.sleep(min(remaining, NOT_READY_POLL_SECONDS / 2))
+
+    async def probe(self, session: aiohttp.ClientSession):
+        await asyncio.gather(*(self._probe_endpoint(session, endpoint) for endpoint in self.endpoints))
+
+    async def _probe_endpoint(self, session: aiohttp.ClientSession, endpoint: ModelEndpoint):
+        try:
+            timeout = aiohttp.ClientTimeout(total=MODEL_READINESS_PROBE_TIMEOUT)
+            async with session.get(endpoint.ready_url, timeout=timeout) as response:
+                if response.status == 200:
+                    endpoint.set_state(self.name, True, "ready")
+                elif response.status == 404:
+                    # Server without a readiness endpoint: treat it as ready, failed calls still mark it down
+                    endpoint.set_state(self.name, True, "no_ready_endpoint")
+                else:
+                    try:
+                        state = (await response.json()).get("state", f"http_{response.status}")
+                    except (aiohttp.ContentTypeError, ValueError, AttributeError):
+                        state = f"http_{response.status}"
+                    endpoint.set_state(self.name, False, state)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            endpoint.set_state(self.name, False, f"unreachable ({type(e).__name__})")
+
+    def mark_unavailable(self, url: str, reason: str) -> bool:
+        for endpoint in self.endpoints:
+            if endpoint.url == url:
+                endpoint.set_state(self.name, False, reason)
+                return True
+        return False
+
+    def get_status(self) -> List[Dict]:
+        return [{"url": endpoint.url, "ready": endpoint.ready, "state": endpoint.state} for endpoint in self.endpoints]
+
+class ModelEndpointRegistry:
+    """
+    Tracks the readiness of every model server replica with a background /ready poller.
+    """
+    def __init__(self):
+        self.pools: Dict[str, ModelEndpointPool] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def register(self, name: str, urls: str) -> ModelEndpointPool:
+        """
+        `urls` is one endpoint URL or several comma-separated replica URLs.
+        """
+        pool = ModelEndpointPool(name, [url.strip() for url in urls.split(",") if url.strip()])
+        self.pools[name] = pool
+        return pool
+
+    async def start(self, client):
+        """
+        Probes every replica once, then keeps polling in the background. `client` is the ModelServerClient.
+        """
+        if self._task is not None:
+            return
+        session = await client.get_session()
+        await self.probe_all(session)
+        self._task = asyncio.create_task(self._run(client))
+        logger.info(f"Model server readiness: {self.get_status()}")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def probe_all(self, session: aiohttp.ClientSession):
+        await asyncio.gather(*(pool.probe(session) for pool in self.pools.values()))
+
+    async def _run(self, client):
+        while True:
+            all_ready = all(endpoint.ready for pool in self.pools.values() for endpoint in pool.endpoints)
+            await asyncio.sleep(MODEL_READINESS_POLL_SECONDS if all_ready else NOT_READY_POLL_SECONDS)
+            try:
+                await self.probe_all(await client.get_session())
+            except Exception as e:
+                logger.error(f"Model server readiness probe failed: {e}")
+
+    def mark_unavailable(self, url: str, reason: str):
+        """
+        Called when a call to `url` failed in a way that means the replica cannot serve (connect failure or timeout, 503).
+        The replica is skipped until its next successful readiness probe.
+        """
+        for pool in self.pools.values():
+            if pool.mark_unavailable(url, reason):
+                return
+
+    def get_status(self) -> Dict[str, List[Dict]]:
+        return {name: pool.get_status() for name, pool in self.pools.items()}
+
+# Global instance of the model server readiness registry
+model_endpoints = ModelEndpointRegistry()
@@ -0,0 +1,73 @@
+import aiohttp
+import os
+import time
+import logging
+from typing import Any, Dict
+
+import msgpack
+
+# Configure basic logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# "auto": use the model servers' raw-body "/raw" endpoints, falling back to multipart/JSON for servers without them.
+# "multipart": always use the original multipart/JSON endpoints.
+MODEL_TRANSPORT = os.getenv("MODEL_TRANSPORT", "auto").strip().lower()
+# A server found without "/raw" endpoints is asked again after this long (it may have been upgraded)
+MODEL_TRANSPORT_RECHECK_SECONDS = float(os.getenv("MODEL_TRANSPORT_RECHECK_SECONDS", 300))
+
+MSGPACK_MEDIA_TYPE = "application/x-msgpack"
+RAW_ACCEPT = f"{MSGPACK_MEDIA_TYPE}, application/json;q=0.9"
+# Answers meaning "this server has no raw endpoint" rather than "this request failed".
+# Not 415: the raw handlers return it for a bad image content type, which must not downgrade the URL.
+RAW_UNSUPPORTED_STATUSES = (404, 405)
+
+class TransportNegotiator:
+    """
+    Remembers per model server URL whether its raw-body variant (<url>raw) exists.
+    Unknown servers are tried with the raw variant first.
+    """
+    def __init__(self, mode: str = MODEL_TRANSPORT, recheck_seconds: float = MODEL_TRANSPORT_RECHECK_SECONDS):
+        self.mode = mode
+        self.recheck_seconds = recheck_seconds
+        # url -> monotonic time until which the raw variant is not tried again
+        self._unsupported_until: Dict[str, float] = {}
+
+    @staticmethod
+    def raw_url(url: str) -> str:
+        return url.rstrip("/") + "/raw"
+
+    def should_try_raw(self, url: str) -> bool:
+        if self.mode != "auto":
+            return False
+        return time.monotonic() >= self._unsupported_until.get(url, 0.0)
+
+    def is_unsupported_response(self, url: str, status: int) -> bool:
+        """
+        Records a raw-endpoint answer; returns True when the caller should fall back to multipart/JSON.
+        """
+        if status in RAW_UNSUPPORTED_STATUSES:
+            if url not in self._unsupported_until:
+                logger.info(f"{url} has no raw endpoint (HTTP {status}); using multipart/JSON.")
+            self._unsupported_until[url] = time.monotonic() + self.recheck_seconds
+            return True
+        self._unsupported_until.pop(url, None)
+        return False
+
+    def get_status(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "mode": self.mode,
+            "multipart_fallback": [url for url, until in self._unsupported_until.items() if until > now],
+        }
+
+async def read_model_response(response: aiohttp.ClientResponse) -> Any:
+    if response.content_type == MSGPACK_MEDIA_TYPE:
+        return msgpack.unpackb(await response.read(), raw=False)
+    return await response.json()
+
+def pack(content: Any) -> bytes:
+    return msgpack.packb(content, use_bin_type=True)
+
+# Global instance of the transport negotiator
+model_transport = TransportNegotiator()
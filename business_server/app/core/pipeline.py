@@ -0,0 +1,101 @@
+import asyncio
+from typing import Any, Awaitable, Callable, List, Optional
+import logging
+
+# Configure basic logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class PipelineStage:
+    """
+    One stage of the processing pipeline: a bounded input queue served by a fixed number of workers.
+    Whatever the handler returns is passed on to the next stage; returning None ends processing for that item.
+    `await on_error(item, exc)` is called when the handler raises, so the owner can account for the dropped item.
+    """
+    def __init__(self, name: str, handler: Callable[[Any], Awaitable[Any]], workers: int = 1, queue_size: int = 16,
+                 on_error: Optional[Callable[[Any, Exception], Awaitable[None]]] = None):
+        self.name = name
+        self.handler = handler
+        self.on_error = on_error
+        self.worker_count = max(1, workers)
+        self.queue_size = max(1, queue_size)
+        self.next_stage: Optional["PipelineStage"] = None
+        self.in_flight = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+
+    async def start(self):
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._tasks = [
+            asyncio.create_task(self._worker(index), name=f"pipeline-{self.name}-{index}")
+            for index in range(self.worker_count)
+        ]
+        logger.info(f"Pipeline stage '{self.name}' started with {self.worker_count} worker(s), queue size {self.queue_size}.")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def put(self, item: Any):
+        # Waits while the stage queue is full (backpressure towards the previous stage)
+        await self._queue.put(item)
+
+    def get_status(self) -> dict:
+        return {
+            "workers": self.worker_count,
+            "queued": self._queue.qsize() if self._queue else 0,
+            "queue_size": self.queue_size,
+            "in_flight": self.in_flight
+        }
+
+    async def _worker(self, index: int):
+        while True:
+            item = await self._queue.get()
+            self.in_flight += 1
+            try:
+                result = await self.handler(item)
+                if result is not None and self.next_stage is not None:
+                    await self.next_stage.put(result)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error in pipeline stage '{self.name}' (worker {index}): {e}", exc_info=True)
+                if self.on_error is not None:
+                    await self.on_error(item, e)
+            finally:
+                self.in_flight -= 1
+                self._queue.task_done()
+
+class ProcessingPipeline:
+    """
+    Chains PipelineStages so that different items can be in different stages at the same time.
+    """
+    def __init__(self, stages: List[PipelineStage]):
+        if not stages:
+            raise ValueError("ProcessingPipeline needs at least one stage.")
+        self.stages = stages
+        for stage, next_stage in zip(stages, stages[1:]):
+            stage.next_stage = next_stage
+        self._started = False
+
+    async def start(self):
+        if self._started:
+            return
+        for stage in self.stages:
+            await stage.start()
+        self._started = True
+
+    async def stop(self):
+        if not self._started:
+            return
+        for stage in self.stages:
+            await stage.stop()
+        self._started = False
+
+    async def submit(self, item: Any):
+        await self.stages[0].put(item)
+
+    def get_status(self) -> dict:
+        return {stage.name: stage.get_status() for stage in self.stages}
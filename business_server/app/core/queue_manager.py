@@ -1,52 +1,280 @@
 import asyncio
+import os
 from collections import deque
-from typing import Deque, Optional, List
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
+from typing import Deque, Optional, List, Set
 from ..models.schemas import QueuedItem
+from .queue_spool import QueueSpool
 import logging
 
 # Configure basic logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# When enabled, a new item is handed directly to the longest-waiting consumer,
+# so consumers are served strictly in the order they started waiting.
+QUEUE_FAIR_HANDOFF = os.getenv("QUEUE_FAIR_HANDOFF", "True").lower() == "true"
+
+# Directory for the durable queue spool (segment log + payload files). Empty keeps the queue in memory only.
+QUEUE_SPOOL_DIR = os.getenv("QUEUE_SPOOL_DIR", "")
+# With a spool, payload bytes beyond this total stay on disk only and are read back when the item is dequeued
+QUEUE_MEMORY_CAP_BYTES = int(os.getenv("QUEUE_MEMORY_CAP_BYTES", 64 * 1024 * 1024))
+
+# Result set on a waiter whose timeout expired
+_WAIT_TIMED_OUT = object()
+
 class SimpleQueueManager:
-    def __init__(self):
-        self.priority_queue: Deque[QueuedItem] = deque() 
-        self.normal_queue: Deque[QueuedItem] = deque()   
-        self._lock = asyncio.Lock() 
-        logger.info("SimpleQueueManager initialized.")
+    def __init__(self, fair: bool = QUEUE_FAIR_HANDOFF, spool_dir: str = QUEUE_SPOOL_DIR, memory_cap_bytes: int = QUEUE_MEMORY_CAP_BYTES):
+        self.priority_queue: Deque[QueuedItem] = deque()
+        self.normal_queue: Deque[QueuedItem] = deque()
+        self._lock = asyncio.Lock()
+        # Futures of consumers blocked in get()/get_many(), oldest first
+        self._waiters: Deque[asyncio.Future] = deque()
+        self.fair = fair
+        self._spool: Optional[QueueSpool] = QueueSpool(spool_dir) if spool_dir else None
+        # Spool I/O runs on one dedicated thread: off the event loop, and writes in submission order
+        self._spool_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="queue-spool") if spool_dir else None
+        self.memory_cap_bytes = memory_cap_bytes
+        # Payload bytes currently held in the deques, and queued items whose payload is only on disk
+        self._memory_bytes = 0
+        self._spilled: Set[str] = set()
+        logger.info(f"SimpleQueueManager initialized (fair handoff: {self.fair}, spool: {spool_dir or 'disabled'}).")
+
+    async def _run_spool(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._spool_executor, fn, *args)
 
     async def add_to_queue(self, item: QueuedItem):
+        if self._spool is not None:
+            # Durable before the upload is acknowledged; the disk write happens outside the queue lock
+            await self._run_spool(self._spool.append, item)
         async with self._lock:
+            if self.fair and self._hand_off(item):
+                logger.info(f"Handed item {item.request_id} (customer: {item.customer_id}) directly to a waiting consumer.")
+                return True
+            self._store(item)
             if item.is_first_time_user:
-                self.priority_queue.append(item)
                 logger.info(f"Added item {item.request_id} (customer: {item.customer_id}) to PRIORITY queue. Size: {len(self.priority_queue)}")
             else:
-                self.normal_queue.append(item)
                 logger.info(f"Added item {item.request_id} (customer: {item.customer_id}) to NORMAL queue. Size: {len(self.normal_queue)}")
+            self._wake_next_waiter()
             return True
 
+    def _store(self, item: QueuedItem, front: bool = False):
+        # Over the memory cap, keep only the metadata in RAM; the payload is already in the spool
+        if self._spool is not None and self._memory_bytes + len(item.image_bytes) > self.memory_cap_bytes:
+            self._spilled.add(item.request_id)
+            item = item.model_copy(update={"image_bytes": b""})
+        else:
+            self._memory_bytes += len(item.image_bytes)
+        target = self.priority_queue if item.is_first_time_user else self.normal_queue
+        if front:
+            target.appendleft(item)
+        else:
+            target.append(item)
+
+    def _load(self, item: QueuedItem) -> QueuedItem:
+        # A spilled item keeps its empty payload here; _read_spilled fills it in after the lock is released
+        if item.request_id not in self._spilled:
+            self._memory_bytes -= len(item.image_bytes)
+        return item
+
+    async def _read_spilled(self, item: QueuedItem) -> QueuedItem:
+        """
+        Reads a spilled item's payload back from the spool, off the event loop and outside the queue lock.
+        """
+        if item.request_id not in self._spilled:
+            return item
+        try:
+            image_bytes = await self._run_spool(self._spool.read_payload, item.request_id)
+        except asyncio.CancelledError:
+            # The consumer went away mid-read: the item goes back to the front, still spilled
+            (self.priority_queue if item.is_first_time_user else self.normal_queue).appendleft(item)
+            self._wake_next_waiter()
+            raise
+        self._spilled.discard(item.request_id)
+        return item.model_copy(update={"image_bytes": image_bytes})
+
+    def _pop_next(self) -> Optional[QueuedItem]:
+        if self.priority_queue:
+            item = self._load(self.priority_queue.popleft())
+            logger.info(f"Retrieved item {item.request_id} from PRIORITY queue. Remaining: {len(self.priority_queue)}")
+            return item
+        elif self.normal_queue:
+            item = self._load(self.normal_queue.popleft())
+            logger.info(f"Retrieved item {item.request_id} from NORMAL queue. Remaining: {len(self.normal_queue)}")
+            return item
+        return None
+
+    def _return_to_front(self, item: QueuedItem):
+        # Used when a consumer was cancelled after an item had already been handed to it
+        self._store(item, front=True)
+        logger.info(f"Returned item {item.request_id} to the front of the queue.")
+        self._wake_next_waiter()
+
+    async def recover(self) -> int:
+        """
+        Re-queues items that were queued or in flight when the process last stopped (spool only).
+        Must run before consumers start. Returns the number of recovered items.
+        """
+        if self._spool is None:
+            return 0
+        items = await self._run_spool(self._spool.recover)
+        # Recovered items start on disk; payloads that still fit under the cap are read back before taking the lock
+        loaded, loaded_bytes = 0, self._memory_bytes
+        while loaded < len(items) and loaded_bytes < self.memory_cap_bytes:
+            item = items[loaded]
+            items[loaded] = item.model_copy(update={"image_bytes": await self._run_spool(self._spool.read_payload, item.request_id)})
+            loaded_bytes += len(items[loaded].image_bytes)
+            loaded += 1
+        async with self._lock:
+            for index, item in enumerate(items):
+                if index < loaded:
+                    self._store(item)
+                else:
+                    self._spilled.add(item.request_id)
+                    (self.priority_queue if item.is_first_time_user else self.normal_queue).append(item)
+            for _ in items:
+                self._wake_next_waiter()
+        return len(items)
+
+    async def mark_done(self, request_id: str):
+        """
+        Called once an item has been fully processed; it will not be replayed after a restart.
+        """
+        if self._spool is not None:
+            await self._run_spool(self._spool.mark_done, request_id)
+
+    async def mark_failed(self, request_id: str):
+        """
+        Called when processing an item failed for good (the client was told so); it will not be replayed either.
+        """
+        if self._spool is not None:
+            await self._run_spool(self._spool.mark_failed, request_id)
+
+    def close(self):
+        if self._spool is not None:
+            # Lets queued spool writes finish before the segment file is closed
+            self._spool_executor.shutdown(wait=True)
+            self._spool.close()
+
+    def _hand_off(self, item: QueuedItem) -> bool:
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(item)
+                return True
+        return False
+
+    def _wake_next_waiter(self):
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                # None means "retry": the consumer goes back and pops from the queues itself
+                waiter.set_result(None)
+                return
+
+    @staticmethod
+    def _expire_waiter(waiter: asyncio.Future):
+        if not waiter.done():
+            waiter.set_result(_WAIT_TIMED_OUT)
+
     async def get_from_queue(self) -> Optional[QueuedItem]:
+        """
+        Non-blocking get. Returns None right away when both queues are empty.
+        """
         async with self._lock:
-            if self.priority_queue:
-                item = self.priority_queue.popleft()
-                logger.info(f"Retrieved item {item.request_id} from PRIORITY queue. Remaining: {len(self.priority_queue)}")
-                return item
-            elif self.normal_queue:
-                item = self.normal_queue.popleft()
-                logger.info(f"Retrieved item {item.request_id} from NORMAL queue. Remaining: {len(self.normal_queue)}")
-                return item
-            logger.info("No items in any queue to retrieve.")
+            item = self._pop_next()
+        if item is None:
+            logger.debug("No items in any queue to retrieve.")
             return None
+        return await self._read_spilled(item)
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[QueuedItem]:
+        """
+        Blocking get. Waits until an item is enqueued (priority queue first) and returns it.
+        Returns None only if `timeout` seconds pass without an item.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        while True:
+            async with self._lock:
+                item = self._pop_next()
+                if item is None:
+                    if deadline is not None and deadline - loop.time() <= 0:
+                        return None
+                    waiter = loop.create_future()
+                    self._waiters.append(waiter)
+            if item is not None:
+                return await self._read_spilled(item)
+
+            timer = loop.call_later(deadline - loop.time(), self._expire_waiter, waiter) if deadline is not None else None
+            try:
+                result = await waiter
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled() and isinstance(waiter.result(), QueuedItem):
+                    self._return_to_front(waiter.result())
+                raise
+            finally:
+                if timer is not None:
+                    timer.cancel()
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+
+            if isinstance(result, QueuedItem):
+                return result
+            if result is _WAIT_TIMED_OUT:
+                return None
+            # Woken without a handoff: loop and pop from the queues
+
+    async def get_many(self, n: int, timeout: Optional[float] = None) -> List[QueuedItem]:
+        """
+        Waits for at least one item (see get) and then takes up to `n` items in queue order without waiting further.
+        Returns an empty list on timeout.
+        """
+        first = await self.get(timeout=timeout)
+        if first is None:
+            return []
+        items = [first]
+        async with self._lock:
+            while len(items) < n:
+                item = self._pop_next()
+                if item is None:
+                    break
+                items.append(item)
+        for index in range(1, len(items)):
+            try:
+                items[index] = await self._read_spilled(items[index])
+            except asyncio.CancelledError:
+                # items[index] is already back in the queue; the rest of this batch goes back with it
+                for item in reversed(items[:index] + items[index + 1:]):
+                    self._return_to_front(item)
+                raise
+        return items
 
     async def get_queue_status(self) -> dict:
         async with self._lock:
             return {
                 "priority_queue_size": len(self.priority_queue),
                 "normal_queue_size": len(self.normal_queue),
-                "total_items": len(self.priority_queue) + len(self.normal_queue)
+                "total_items": len(self.priority_queue) + len(self.normal_queue),
+                "waiting_consumers": sum(1 for waiter in self._waiters if not waiter.done()),
+                "memory_bytes": self._memory_bytes,
+                "spilled_items": len(self._spilled),
+                "durable": self._spool is not None
             }
 
-    def get_all_items_snapshot(self) -> List[QueuedItem]: 
+    def get_position(self, request_id: str) -> Optional[int]:
+        """
+        1-based position of a waiting item in dequeue order (priority queue first); None if it is not queued.
+        """
+        for position, item in enumerate(chain(self.priority_queue, self.normal_queue), start=1):
+            if item.request_id == request_id:
+                return position
+        return None
+
+    def get_all_items_snapshot(self) -> List[QueuedItem]:
 
         all_items = list(self.priority_queue) + list(self.normal_queue)
         logger.info(f"Snapshot taken: {len(all_items)} items in total.")
@@ -0,0 +1,204 @@
+import json
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+import logging
+
+from ..models.schemas import QueuedItem
+
+# Configure basic logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Segment files are rotated once they grow past this size
+QUEUE_SEGMENT_MAX_BYTES = int(os.getenv("QUEUE_SEGMENT_MAX_BYTES", 4 * 1024 * 1024))
+# fsync every write; safer on power loss, slower on every enqueue
+QUEUE_SPOOL_FSYNC = os.getenv("QUEUE_SPOOL_FSYNC", "False").lower() == "true"
+# Times an item is queued (first enqueue plus replays after restarts) before recovery gives up on it,
+# so an image that crashes the process cannot crash-loop replay or pin the spool forever
+QUEUE_MAX_ATTEMPTS = int(os.getenv("QUEUE_MAX_ATTEMPTS", 5))
+
+class QueueSpool:
+    """
+    Disk storage behind SimpleQueueManager.
+
+    Image payloads are written to one file per request under payloads/ and read back in full when dequeued.
+    Item metadata goes to an append-only segment log under segments/: a "put" record (with its attempt
+    count) on enqueue, and a terminal "done" or "failed" record once the item has been processed or given up.
+    On startup, replaying the segments yields every item that was queued or in flight when the process stopped.
+    """
+    def __init__(self, directory: str, segment_max_bytes: int = QUEUE_SEGMENT_MAX_BYTES, fsync: bool = QUEUE_SPOOL_FSYNC,
+                 max_attempts: int = QUEUE_MAX_ATTEMPTS):
+        self.directory = directory
+        self.payload_dir = os.path.join(directory, "payloads")
+        self.segment_dir = os.path.join(directory, "segments")
+        self.segment_max_bytes = segment_max_bytes
+        self.fsync = fsync
+        self.max_attempts = max(1, max_attempts)
+        os.makedirs(self.payload_dir, exist_ok=True)
+        os.makedirs(self.segment_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        # New segments always get ids above anything already on disk
+        existing_segments = self._list_segments()
+        self._segment_id = existing_segments[-1] if existing_segments else 0
+        self._segment_file = None
+        # request_id -> segment holding its "put" record; segment_id -> number of unfinished puts
+        self._segment_of: Dict[str, int] = {}
+        self._segment_pending: Dict[int, int] = {}
+
+    # --- paths ---
+    def _payload_path(self, request_id: str) -> str:
+        return os.path.join(self.payload_dir, f"{request_id}.bin")
+
+    def _segment_path(self, segment_id: int) -> str:
+        return os.path.join(self.segment_dir, f"{segment_id:012d}.log")
+
+    def _list_segments(self) -> List[int]:
+        return sorted(int(name.split(".")[0]) for name in os.listdir(self.segment_dir) if name.endswith(".log"))
+
+    # --- writes ---
+    def _open_segment(self, segment_id: int):
+        if self._segment_file is not None:
+            self._segment_file.close()
+        self._segment_id = segment_id
+        self._segment_file = open(self._segment_path(segment_id), "ab")
+        self._segment_pending.setdefault(segment_id, 0)
+        self._drop_finished_segments()
+
+    def _drop_finished_segments(self):
+        """
+        Deletes finished segments oldest first, stopping at the first one with unfinished puts (or the open one).
+        A segment's terminal records can refer to puts in older segments, so it is only deleted once every older
+        segment is gone; otherwise a replay would bring back items that were already processed.
+        """
+        for segment_id in sorted(self._segment_pending):
+            if segment_id == self._segment_id or self._segment_pending[segment_id] > 0:
+                return
+            del self._segment_pending[segment_id]
+            try:
+                os.remove(self._segment_path(segment_id))
+            except FileNotFoundError:
+                pass
+
+    def _append_record(self, record: dict):
+        if self._segment_file is None or self._segment_file.tell() >= self.segment_max_bytes:
+            self._open_segment(self._segment_id + 1)
+        self._segment_file.write(json.dumps(record).encode("utf-8") + b"\n")
+        self._segment_file.flush()
+        if self.fsync:
+            os.fsync(self._segment_file.fileno())
+
+    def append(self, item: QueuedItem):
+        """
+        Persists the payload and a "put" record for a newly queued item.
+        """
+        with self._lock:
+            with open(self._payload_path(item.request_id), "wb") as payload_file:
+                payload_file.write(item.image_bytes)
+                payload_file.flush()
+                if self.fsync:
+                    os.fsync(payload_file.fileno())
+            metadata = item.model_dump(mode="json", exclude={"image_bytes"})
+            metadata["payload_size"] = len(item.image_bytes)
+            self._append_record({"op": "put", "item": metadata, "attempts": 1})
+            self._segment_of[item.request_id] = self._segment_id
+            self._segment_pending[self._segment_id] = self._segment_pending.get(self._segment_id, 0) + 1
+
+    def mark_done(self, request_id: str):
+        """
+        Records that an item finished processing, removes its payload and drops finished segments.
+        """
+        self._finish(request_id, "done")
+
+    def mark_failed(self, request_id: str):
+        """
+        Records that processing an item failed for good; like mark_done, it will not be replayed.
+        """
+        self._finish(request_id, "failed")
+
+    def _finish(self, request_id: str, op: str):
+        with self._lock:
+            segment_id = self._segment_of.pop(request_id, None)
+            if segment_id is None:
+                return
+            self._append_record({"op": op, "request_id": request_id})
+            try:
+                os.remove(self._payload_path(request_id))
+            except FileNotFoundError:
+                pass
+            self._segment_pending[segment_id] -= 1
+            self._drop_finished_segments()
+
+    # --- reads ---
+    def read_payload(self, request_id: str) -> bytes:
+        # The payload is handed on as bytes (model calls, hashing), so it is read plainly rather than mapped
+        with open(self._payload_path(request_id), "rb") as payload_file:
+            return payload_file.read()
+
+    def recover(self) -> List[QueuedItem]:
+        """
+        Replays the segment log and returns the unfinished items (without payload bytes) in enqueue order.
+        Each replay counts as an attempt; items already queued max_attempts times are dropped instead.
+        The log is then compacted into a single fresh segment and orphaned payload files are removed.
+        """
+        with self._lock:
+            # request_id -> (item metadata, attempts so far)
+            pending: Dict[str, Tuple[dict, int]] = {}
+            for segment_id in self._list_segments():
+                with open(self._segment_path(segment_id), "rb") as segment_file:
+                    for line in segment_file:
+                        try:
+                            record = json.loads(line)
+                        except ValueError:
+                            # A torn last line from a crash mid-write
+                            logger.warning(f"Skipping unreadable record in queue segment {segment_id}.")
+                            continue
+                        if record.get("op") == "put":
+                            pending[record["item"]["request_id"]] = (record["item"], record.get("attempts", 1))
+                        elif record.get("op") in ("done", "failed"):
+                            pending.pop(record.get("request_id"), None)
+
+            items = []
+            attempts: Dict[str, int] = {}
+            for request_id, (metadata, item_attempts) in pending.items():
+                if not os.path.exists(self._payload_path(request_id)):
+                    logger.error(f"Queue spool: payload for {request_id} is missing; dropping the item.")
+                    continue
+                if item_attempts >= self.max_attempts:
+                    # Left unfinished max_attempts times (e.g. it takes the process down): not replayed again
+                    logger.error(f"Queue spool: {request_id} was queued {item_attempts} times without finishing; dropping the item.")
+                    continue
+                metadata = {key: value for key, value in metadata.items() if key != "payload_size"}
+                items.append(QueuedItem(image_bytes=b"", **metadata))
+                attempts[request_id] = item_attempts + 1
+
+            # Compact: rewrite surviving puts into one new segment and remove everything else
+            old_segments = self._list_segments()
+            if self._segment_file is not None:
+                self._segment_file.close()
+                self._segment_file = None
+            self._segment_of = {}
+            self._segment_pending = {}
+            self._segment_id = (old_segments[-1] if old_segments else 0)
+            self._open_segment(self._segment_id + 1)
+            for item in items:
+                metadata = item.model_dump(mode="json", exclude={"image_bytes"})
+                self._append_record({"op": "put", "item": metadata, "attempts": attempts[item.request_id]})
+                self._segment_of[item.request_id] = self._segment_id
+                self._segment_pending[self._segment_id] += 1
+            for segment_id in old_segments:
+                os.remove(self._segment_path(segment_id))
+
+            known = set(self._segment_of)
+            for name in os.listdir(self.payload_dir):
+                if name.endswith(".bin") and name[:-4] not in known:
+                    os.remove(os.path.join(self.payload_dir, name))
+
+            logger.info(f"Queue spool recovered {len(items)} unfinished item(s) from {self.directory}.")
+            return items
+
+    def close(self):
+        with self._lock:
+            if self._segment_file is not None:
+                self._segment_file.close()
+                self._segment_file = None
@@ -0,0 +1,184 @@
+import asyncio
+import os
+from collections import defaultdict
+from typing import Dict, Optional, Tuple
+import logging
+
+from .database import mongo_repository
+from ..utils.dates import utc_date_str
+
+# Configure basic logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+MAX_SUMMARIES_PER_DAY = int(os.getenv("MAX_SUMMARIES_PER_DAY", 20))
+MAX_PARTICIPATION_WITH_SHARES = int(os.getenv("MAX_PARTICIPATION_WITH_SHARES", 4))
+
+# How often pending counter changes are written back to MongoDB
+QUOTA_FLUSH_INTERVAL_SECONDS = float(os.getenv("QUOTA_FLUSH_INTERVAL_SECONDS", 1.0))
+
+class QuotaEngine:
+    """
+    Keeps today's global and per-customer usage counters in process memory.
+
+    try_reserve() checks and reserves a slot without awaiting anything, so concurrent uploads
+    cannot over-admit. Changes are persisted to MongoDB in batches by a background flusher
+    (write-behind) and the counters are rebuilt from MongoDB at startup.
+    This assumes a single business server process owns the counters. Days are UTC (see utc_date_str).
+    """
+    def __init__(self, max_summaries_per_day: int = MAX_SUMMARIES_PER_DAY,
+                 max_participation: int = MAX_PARTICIPATION_WITH_SHARES,
+                 flush_interval: float = QUOTA_FLUSH_INTERVAL_SECONDS):
+        self.max_summaries_per_day = max_summaries_per_day
+        self.max_participation = max_participation
+        self.flush_interval = flush_interval
+        self._date: Optional[str] = None
+        self._total_today = 0
+        # customer_id -> {"summary_count": n, "participation_count": n}
+        self._usage: Dict[str, Dict[str, int]] = {}
+        # request_id -> (customer_id, date) of reservations that can still be released
+        self._reservations: Dict[str, Tuple[str, str]] = {}
+        # Changes not yet written to MongoDB, keyed by date so a flush after midnight still hits the right day
+        self._pending_totals: Dict[str, int] = defaultdict(int)
+        self._pending_usage: Dict[Tuple[str, str], Dict[str, int]] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+
+    async def start(self):
+        # Created here so the lock belongs to the running event loop
+        self._flush_lock = asyncio.Lock()
+        await self.load()
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_loop())
+        logger.info(f"Quota engine started (flush interval: {self.flush_interval}s).")
+
+    async def stop(self):
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        await self.flush()
+
+    async def load(self):
+        """
+        Rebuilds today's counters from MongoDB.
+        """
+        today_str = utc_date_str()
+        self._date = today_str
+        self._total_today = 0
+        self._usage = {}
+        if not mongo_repository.available:
+            logger.warning("Quota engine started without MongoDB; counters start from zero.")
+            return
+        self._total_today = await mongo_repository.get_daily_total(today_str)
+        for doc in await mongo_repository.find_daily_usage_for_date(today_str):
+            self._usage[doc["customer_id"]] = {
+                "summary_count": doc.get("summary_count", 0),
+                "participation_count": doc.get("participation_count", 0)
+            }
+        logger.info(f"Quota engine loaded {today_str}: total={self._total_today}, customers={len(self._usage)}.")
+
+    def _roll_day(self) -> str:
+        today_str = utc_date_str()
+        if today_str != self._date:
+            logger.info(f"Quota engine rolling over from {self._date} to {today_str}.")
+            # Yesterday's reservations stay releasable until the next rollover
+            self._reservations = {request_id: reservation for request_id, reservation in self._reservations.items() if reservation[1] == self._date}
+            self._date = today_str
+            self._total_today = 0
+            self._usage = {}
+        return today_str
+
+    def _record_change(self, date_str: str, customer_id: str, amount: int):
+        self._pending_totals[date_str] += amount
+        pending = self._pending_usage.setdefault((date_str, customer_id), {"summary_count": 0, "participation_count": 0})
+        pending["summary_count"] += amount
+        pending["participation_count"] += amount
+
+    def try_reserve(self, customer_id: str, request_id: str) -> Tuple[bool, str, bool, Optional[str]]:
+        """
+        Atomically checks the daily limits and reserves one summary for the customer.
+        Returns: (allowed, message, is_first_participation_today, reservation_date)
+        release(request_id) gives the reservation back if the request is rejected later on.
+        """
+        today_str = self._roll_day()
+
+        # 전체 합산 제한
+        if self._total_today >= self.max_summaries_per_day:
+            return False, f"Total daily summary limit ({self.max_summaries_per_day}) reached for today.", False, None
+
+        usage = self._usage.setdefault(customer_id, {"summary_count": 0, "participation_count": 0})
+        if usage["participation_count"] >= self.max_participation:
+            return False, f"Maximum participation limit ({self.max_participation}), including shares, reached.", False, None
+
+        is_first_participation = usage["participation_count"] == 0
+        self._total_today += 1
+        usage["summary_count"] += 1
+        usage["participation_count"] += 1
+        self._record_change(today_str, customer_id, 1)
+        self._reservations[request_id] = (customer_id, today_str)
+        return True, "Participation allowed.", is_first_participation, today_str
+
+    def release(self, request_id: str) -> bool:
+        """
+        Gives back a reservation made by try_reserve (e.g. the request could not be queued).
+        Safe to call more than once; returns False when there is nothing (left) to release.
+        """
+        reservation = self._reservations.pop(request_id, None)
+        if reservation is None:
+            return False
+        customer_id, reservation_date = reservation
+        if reservation_date == self._date:
+            self._total_today = max(0, self._total_today - 1)
+            usage = self._usage.get(customer_id)
+            if usage:
+                usage["summary_count"] = max(0, usage["summary_count"] - 1)
+                usage["participation_count"] = max(0, usage["participation_count"] - 1)
+        self._record_change(reservation_date, customer_id, -1)
+        return True
+
+    def get_status(self) -> dict:
+        return {
+            "date": self._date,
+            "total_today": self._total_today,
+            "max_summaries_per_day": self.max_summaries_per_day,
+            "customers_today": len(self._usage),
+            "pending_writes": len(self._pending_usage)
+        }
+
+    async def flush(self):
+        """
+        Writes pending counter changes to MongoDB in one batch per collection.
+        On failure the changes are merged back and retried on the next flush.
+        """
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            if not self._pending_totals and not self._pending_usage:
+                return
+            totals, self._pending_totals = self._pending_totals, defaultdict(int)
+            usage, self._pending_usage = self._pending_usage, {}
+            try:
+                await mongo_repository.apply_usage_increments(
+                    {date_str: amount for date_str, amount in totals.items() if amount},
+                    {key: changes for key, changes in usage.items() if any(changes.values())}
+                )
+            except Exception as e:
+                logger.error(f"Quota engine flush failed, will retry: {e}")
+                for date_str, amount in totals.items():
+                    self._pending_totals[date_str] += amount
+                for key, changes in usage.items():
+                    pending = self._pending_usage.setdefault(key, {"summary_count": 0, "participation_count": 0})
+                    for field, amount in changes.items():
+                        pending[field] += amount
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+# Global instance of the quota engine
+quota_engine = QuotaEngine()
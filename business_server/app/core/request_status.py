@@ -0,0 +1,179 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import AsyncIterator, Dict, Iterable, Optional, Set
+import logging
+
+from ..models.schemas import RequestStatus
+from .queue_manager import queue_manager
+from .admission import admission_controller
+
+# Configure basic logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Finished (done/failed) requests are kept this long for status lookups, and at most this many of them
+REQUEST_STATUS_TTL_SECONDS = float(os.getenv("REQUEST_STATUS_TTL_SECONDS", 3600))
+REQUEST_STATUS_MAX_FINISHED = int(os.getenv("REQUEST_STATUS_MAX_FINISHED", 50000))
+# An SSE/WebSocket stream sends a keepalive (or the new queue position) after this long without a state change
+REQUEST_STATUS_KEEPALIVE_SECONDS = float(os.getenv("REQUEST_STATUS_KEEPALIVE_SECONDS", 15))
+
+TERMINAL_STATES = ("done", "failed")
+# Undelivered updates kept per subscriber; a slow client only needs the latest state
+SUBSCRIBER_QUEUE_SIZE = 8
+
+class RequestStatusStore:
+    """
+    In-memory status of recent requests by request_id: queued -> processing -> done | failed.
+    Status lookups and the SSE/WebSocket streams are served from here, so a client waiting for its result
+    never queries MongoDB. Unfinished requests are bounded by admission control; finished ones expire after
+    the TTL (oldest first). All methods are synchronous (except stream()) and run on the event loop.
+    """
+    def __init__(self, ttl_seconds: float = REQUEST_STATUS_TTL_SECONDS, max_finished: int = REQUEST_STATUS_MAX_FINISHED):
+        self.ttl_seconds = ttl_seconds
+        self.max_finished = max(1, max_finished)
+        self._active: Dict[str, RequestStatus] = {}
+        # request_id -> (status, monotonic finish time), oldest first
+        self._finished: "OrderedDict[str, tuple]" = OrderedDict()
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self._stats = {"lookups": 0, "misses": 0, "published": 0}
+
+    # --- State transitions (called by the processing stages) ---
+    def queued(self, item):
+        self._update(item, "queued")
+
+    def register_backlog(self, items: Iterable):
+        """
+        Registers items recovered from the queue spool after a restart.
+        """
+        for item in items:
+            self._update(item, "queued")
+
+    def processing(self, item):
+        self._update(item, "processing")
+
+    def done(self, result, sequence_number: int):
+        self._update(
+            result, "done",
+            sequence_number=sequence_number,
+            text_summary=result.text_summary,
+            failed_stages=list(result.failed_stages)
+        )
+
+    def failed(self, item, error: str):
+        self._update(item, "failed", error=error)
+
+    def _update(self, item, state: str, **fields):
+        # QueuedItem and ProcessingResult both carry the request metadata
+        status = self._active.get(item.request_id)
+        if status is None:
+            status = RequestStatus(
+                request_id=item.request_id,
+                customer_id=item.customer_id,
+                file_name=item.file_name,
+                status=state,
+                received_at=item.received_at
+            )
+        status = status.model_copy(update={"status": state, "updated_at": datetime.utcnow(), **fields})
+        if state in TERMINAL_STATES:
+            self._active.pop(item.request_id, None)
+            self._finished[item.request_id] = (status, time.monotonic())
+            self._finished.move_to_end(item.request_id)
+            self._prune()
+        else:
+            self._active[item.request_id] = status
+        self._publish(status)
+
+    def _prune(self):
+        expire_before = time.monotonic() - self.ttl_seconds
+        while self._finished:
+            _, finished_at = next(iter(self._finished.values()))
+            if len(self._finished) <= self.max_finished and finished_at >= expire_before:
+                break
+            self._finished.popitem(last=False)
+
+    # --- Lookups ---
+    def _with_position(self, status: RequestStatus) -> RequestStatus:
+        if status.status != "queued":
+            return status
+        position = queue_manager.get_position(status.request_id)
+        if position is None:
+            # Already taken off the queue and waiting for a free analysis worker
+            return status
+        return status.model_copy(update={
+            "queue_position": position,
+            "estimated_wait_seconds": round(admission_controller.estimate_wait(position), 1)
+        })
+
+    def get(self, request_id: str) -> Optional[RequestStatus]:
+        self._stats["lookups"] += 1
+        status = self._active.get(request_id)
+        if status is None:
+            self._prune()
+            entry = self._finished.get(request_id)
+            status = entry[0] if entry is not None else None
+        if status is None:
+            self._stats["misses"] += 1
+            return None
+        return self._with_position(status)
+
+    # --- Push ---
+    def _publish(self, status: RequestStatus):
+        subscribers = self._subscribers.get(status.request_id)
+        if not subscribers:
+            return
+        self._stats["published"] += 1
+        for queue in subscribers:
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(status)
+
+    def _subscribe(self, request_id: str) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self._subscribers.setdefault(request_id, set()).add(queue)
+        return queue
+
+    def _unsubscribe(self, request_id: str, queue: asyncio.Queue):
+        subscribers = self._subscribers.get(request_id)
+        if subscribers is not None:
+            subscribers.discard(queue)
+            if not subscribers:
+                del self._subscribers[request_id]
+
+    async def stream(self, initial: RequestStatus, keepalive: float = REQUEST_STATUS_KEEPALIVE_SECONDS) -> AsyncIterator[Optional[RequestStatus]]:
+        """
+        Yields the current status (`initial` if it is no longer in the store), then every state change until the request is done or failed.
+        Yields None after `keepalive` seconds without news, or the status again if the queue position moved.
+        """
+        request_id = initial.request_id
+        queue = self._subscribe(request_id)
+        try:
+            # Re-read after subscribing: the request may have moved on since `initial` was looked up
+            last = self.get(request_id) or initial
+            yield last
+            while last.status not in TERMINAL_STATES:
+                try:
+                    update = self._with_position(await asyncio.wait_for(queue.get(), timeout=keepalive))
+                except asyncio.TimeoutError:
+                    current = self.get(request_id)
+                    if current is None:  # Expired while the client was listening
+                        return
+                    update = current if current.queue_position != last.queue_position or current.status != last.status else None
+                if update is not None:
+                    last = update
+                yield update
+        finally:
+            self._unsubscribe(request_id, queue)
+
+    def get_status(self) -> Dict[str, int]:
+        return {
+            "active": len(self._active),
+            "finished": len(self._finished),
+            "streams": sum(len(subscribers) for subscribers in self._subscribers.values()),
+            **self._stats
+        }
+
+# Global instance of the request status store
+request_status_store = RequestStatusStore()
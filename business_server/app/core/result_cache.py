@@ -0,0 +1,111 @@
+import asyncio
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+import logging
+
+from ..models.schemas import CachedResult
+from .database import mongo_repository
+
+# Configure basic logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE_ENABLED", "True").lower() == "true"
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", 10000))
+RESULT_CACHE_TTL_SECONDS = float(os.getenv("RESULT_CACHE_TTL_SECONDS", 24 * 3600))
+# Optional second tier in MongoDB (result_cache collection, expired by a TTL index)
+RESULT_CACHE_MONGO_ENABLED = os.getenv("RESULT_CACHE_MONGO_ENABLED", "False").lower() == "true"
+
+def compute_content_hash(image_bytes: bytes) -> str:
+    return hashlib.sha256(image_bytes).hexdigest()
+
+class ResultCache:
+    """
+    Content-addressed cache of caption, detected objects and summary, keyed by the SHA-256 of the image bytes.
+    Tier 1 is an in-memory LRU bounded by max_entries; tier 2 (optional) is MongoDB.
+    Both tiers drop entries older than ttl_seconds.
+    """
+    def __init__(self, enabled: bool = RESULT_CACHE_ENABLED, max_entries: int = RESULT_CACHE_MAX_ENTRIES,
+                 ttl_seconds: float = RESULT_CACHE_TTL_SECONDS, mongo_enabled: bool = RESULT_CACHE_MONGO_ENABLED):
+        self.enabled = enabled
+        self.max_entries = max(1, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self.mongo_enabled = mongo_enabled
+        # content_hash -> (stored_at monotonic time, result); most recently used last
+        self._entries: "OrderedDict[str, Tuple[float, CachedResult]]" = OrderedDict()
+        self._stats: Dict[str, int] = {
+            "memory_hits": 0, "mongo_hits": 0, "misses": 0,
+            "stores": 0, "evictions": 0, "expirations": 0
+        }
+
+    async def content_hash(self, image_bytes: bytes) -> str:
+        # hashlib releases the GIL on large buffers, so hashing a big upload off the loop is worth it
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, compute_content_hash, image_bytes)
+
+    async def get(self, key: str) -> Optional[CachedResult]:
+        if not self.enabled:
+            return None
+        entry = self._entries.get(key)
+        if entry is not None:
+            stored_at, result = entry
+            if time.monotonic() - stored_at <= self.ttl_seconds:
+                self._entries.move_to_end(key)
+                self._stats["memory_hits"] += 1
+                return result
+            del self._entries[key]
+            self._stats["expirations"] += 1
+
+        if self.mongo_enabled and mongo_repository.available:
+            try:
+                doc = await mongo_repository.find_cached_result(key)
+            except Exception as e:
+                logger.error(f"Result cache lookup in MongoDB failed for {key[:12]}: {e}")
+                doc = None
+            if doc and doc.get("expires_at", datetime.utcnow()) > datetime.utcnow():
+                result = CachedResult(**doc)
+                self._store_in_memory(key, result)
+                self._stats["mongo_hits"] += 1
+                return result
+
+        self._stats["misses"] += 1
+        return None
+
+    async def put(self, key: str, result: CachedResult):
+        if not self.enabled:
+            return
+        self._store_in_memory(key, result)
+        self._stats["stores"] += 1
+        if self.mongo_enabled and mongo_repository.available:
+            try:
+                expires_at = datetime.utcnow() + timedelta(seconds=self.ttl_seconds)
+                await mongo_repository.upsert_cached_result(key, result.model_dump(), expires_at)
+            except Exception as e:
+                logger.error(f"Result cache write to MongoDB failed for {key[:12]}: {e}")
+
+    def _store_in_memory(self, key: str, result: CachedResult):
+        self._entries[key] = (time.monotonic(), result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def get_stats(self) -> dict:
+        lookups = self._stats["memory_hits"] + self._stats["mongo_hits"] + self._stats["misses"]
+        hits = self._stats["memory_hits"] + self._stats["mongo_hits"]
+        return {
+            "enabled": self.enabled,
+            "mongo_tier_enabled": self.mongo_enabled,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            **self._stats,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0
+        }
+
+# Global instance of the result cache
+result_cache = ResultCache()
@@ -1,193 +1,187 @@
-import httpx 
 import aiohttp 
 import os
-from datetime import datetime, date
-from typing import Optional, Tuple, Dict, Any, List
+from datetime import datetime
+from typing import Optional, Tuple, Dict, Any, List, Union, BinaryIO
 import uuid
 import asyncio 
 import logging
+from urllib.parse import quote
 
 from ..models.schemas import (
-    QueuedItem, ImageSummaryRecord, DailyUsage,
-    CaptionData, DetectedObjectsData, TextSummarizationInput
+    QueuedItem, ImageSummaryRecord,
+    CaptionData, ObjectData, DetectedObjectsData, TextSummarizationInput,
+    ProcessingResult, CachedResult, RequestStatus
 )
 from .queue_manager import queue_manager
-from pymongo import MongoClient, ReturnDocument
-from pymongo.errors import ConnectionFailure, OperationFailure
+from .pipeline import PipelineStage, ProcessingPipeline
+from .http_client import model_server_client
+from .database import (
+    mongo_repository, db,
+    image_summaries_collection
+)
+from .quota import quota_engine
+from .result_cache import result_cache
+from .admission import admission_controller, AdmissionRejected
+from .request_status import request_status_store
+from .daily_stats import daily_stats
+from .summary_reads import (
+    summary_read_cache, SummaryPage, SUMMARY_SORT,
+    parse_fields, keyset_query, projection_for, build_page
+)
+from .model_endpoints import model_endpoints, ModelEndpointPool
+from .inference import in_process_inference
+from .model_transport import model_transport, read_model_response, pack, MSGPACK_MEDIA_TYPE, RAW_ACCEPT
+from .metrics import QUEUE_WAIT_SECONDS, MODEL_SERVER_ERRORS, observe_stage
+from ..utils.image_processing import prepare_image, ImageValidationError
+from ..utils.dates import utc_date_str
+from pymongo.errors import OperationFailure
 
 # Configure basic logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Environment variables for service URLs and DB config
+# Each URL may list several comma-separated replicas; calls only go to replicas that report ready
 IMAGE_CAPTIONING_URL = os.getenv("IMAGE_CAPTIONING_URL", "http://localhost:8001/caption/")
 OBJECT_DETECTION_URL = os.getenv("OBJECT_DETECTION_URL", "http://localhost:8002/detect/")
 TEXT_SUMMARIZATION_URL = os.getenv("TEXT_SUMMARIZATION_URL", "http://localhost:8003/generate/")
 
-MONGO_HOST = os.getenv("MONGO_HOST", "localhost")
-MONGO_PORT = int(os.getenv("MONGO_PORT", 27017))
-MONGO_DB_NAME = os.getenv("MONGO_DB_NAME", "image_summary_db")
-MONGO_USER = os.getenv("MONGO_INITDB_ROOT_USERNAME", "mongoadmin")
-MONGO_PASS = os.getenv("MONGO_INITDB_ROOT_PASSWORD", "secret")
-
-MAX_SUMMARIES_PER_DAY = int(os.getenv("MAX_SUMMARIES_PER_DAY", 20))
-MAX_PARTICIPATION_WITH_SHARES = int(os.getenv("MAX_PARTICIPATION_WITH_SHARES", 4))
-
-# MongoDB Client Setup
-# Construct the MongoDB URI
-mongo_uri = f"mongodb://{MONGO_HOST}:{MONGO_PORT}/"
-try:
-    client = MongoClient(mongo_uri, serverSelectionTimeoutMS=5000)
-    client.admin.command('ping') # Verify connection
-    db = client[MONGO_DB_NAME]
-    image_summaries_collection = db["image_summaries"]
-    daily_usage_collection = db["daily_usage"]
-    # Create indexes if they don't exist for faster queries
-    image_summaries_collection.create_index([("customer_id", 1), ("created_at", -1)])
-    image_summaries_collection.create_index([("sequence_number", 1)], unique=True)
-    daily_usage_collection.create_index([("customer_id", 1), ("date", 1)], unique=True)
-    logger.info(f"Successfully connected to MongoDB: {MONGO_HOST}:{MONGO_PORT}")
-except ConnectionFailure:
-    logger.error(f"Failed to connect to MongoDB: {MONGO_HOST}:{MONGO_PORT}. Check connection settings and Docker service.")
-    db = None # Indicate DB is not available
-    image_summaries_collection = None
-    daily_usage_collection = None
+caption_endpoints = model_endpoints.register("captioning", IMAGE_CAPTIONING_URL)
+detection_endpoints = model_endpoints.register("detection", OBJECT_DETECTION_URL)
+generation_endpoints = model_endpoints.register("generation", TEXT_SUMMARIZATION_URL)
 
-async def get_next_sequence_number() -> int:
-    if db is None:
-        raise OperationFailure("MongoDB not connected.")
-    counter_collection = db["counters"]
-    sequence_doc = counter_collection.find_one_and_update(
-        {"_id": "summary_sequence"},
-        {"$inc": {"sequence_value": 1}},
-        upsert=True,
-        return_document=ReturnDocument.AFTER
-    )
-    return sequence_doc["sequence_value"]
-
-def increment_and_check_total_summaries_today() -> bool:
-    today_str = date.today().isoformat()
-    counter_collection = db["counters"]
-    result = counter_collection.find_one_and_update(
-        {"_id": f"summary_total_{today_str}"},
-        {"$inc": {"count": 1}},
-        upsert=True,
-        return_document=ReturnDocument.AFTER
-    )
-    if result["count"] > MAX_SUMMARIES_PER_DAY:
-        # 이미 20회를 넘었으니 롤백
-        counter_collection.update_one(
-            {"_id": f"summary_total_{today_str}"},
-            {"$inc": {"count": -1}}
-        )
-        return False
-    return True
+# Per-stage timeouts (seconds) for the model server calls made while processing a queue item
+IMAGE_CAPTIONING_TIMEOUT = float(os.getenv("IMAGE_CAPTIONING_TIMEOUT", 30))
+OBJECT_DETECTION_TIMEOUT = float(os.getenv("OBJECT_DETECTION_TIMEOUT", 30))
+TEXT_SUMMARIZATION_TIMEOUT = float(os.getenv("TEXT_SUMMARIZATION_TIMEOUT", 60))
 
-async def check_user_limits(customer_id: str) -> Tuple[bool, str, bool]:
-    """
-    Checks if the user can participate based on daily limits and shared attempts.
-    Returns: (can_participate, message, is_first_time_today_or_shared_opportunity)
-    """
-    if daily_usage_collection is None or db is None:
-        return False, "Database service not available.", False
-
-    # 전체 합산 20회 제한 
-    if not increment_and_check_total_summaries_today():
-        return False, f"Total daily summary limit ({MAX_SUMMARIES_PER_DAY}) reached for today.", False
-
-    today_str = date.today().isoformat()
-    usage = daily_usage_collection.find_one({"customer_id": customer_id, "date": today_str})
-
-    is_first_time = True
-    can_participate_overall = True
-
-    if usage:
-        is_first_time = False
-        if usage["participation_count"] >= MAX_PARTICIPATION_WITH_SHARES:
-            # 참여 제한에 걸리면 카운터 롤백
-            counter_collection = db["counters"]
-            counter_collection.update_one(
-                {"_id": f"summary_total_{today_str}"},
-                {"$inc": {"count": -1}}
-            )
-            return False, f"Maximum participation limit ({MAX_PARTICIPATION_WITH_SHARES}), including shares, reached.", False
+# Tokens generated after the prompt; generation also stops at the first sentence end
+TEXT_SUMMARY_MAX_NEW_TOKENS = int(os.getenv("TEXT_SUMMARY_MAX_NEW_TOKENS", 40))
 
-    current_participation_count = usage["participation_count"] if usage else 0
-    prioritize_in_queue = (current_participation_count == 0)
+CAPTION_FALLBACK_TEXT = "Captioning failed or not available."
 
-    return can_participate_overall, "Participation allowed.", prioritize_in_queue
+# Staged processing pipeline: worker count per stage and bounded queue size between stages
+PIPELINE_ANALYSIS_WORKERS = int(os.getenv("PIPELINE_ANALYSIS_WORKERS", 2))
+PIPELINE_GENERATION_WORKERS = int(os.getenv("PIPELINE_GENERATION_WORKERS", 2))
+PIPELINE_PERSIST_WORKERS = int(os.getenv("PIPELINE_PERSIST_WORKERS", 1))
+PIPELINE_STAGE_QUEUE_SIZE = int(os.getenv("PIPELINE_STAGE_QUEUE_SIZE", 16))
 
-async def update_user_usage(customer_id: str, is_new_participation_slot: bool):
+async def get_next_sequence_number() -> int:
+    return await mongo_repository.next_sequence_number()
+
+async def check_user_limits(customer_id: str, request_id: str) -> Tuple[bool, str, bool, Optional[str]]:
     """
-    Updates the user's daily summary count and participation count.
-    is_new_participation_slot: True if this usage consumes one of the MAX_PARTICIPATION_WITH_SHARES slots.
-                                 Set to False if it's just an additional summary within an existing participation slot (not strictly needed by current rules but good for clarity).
-                                 The problem statement implies each accepted photo counts as a participation towards MAX_PARTICIPATION_WITH_SHARES.
+    Checks if the user can participate based on daily limits and shared attempts, and reserves a slot if so.
+    The check runs against the in-memory quota engine; MongoDB is updated in the background.
+    quota_engine.release(request_id) gives the slot back.
+    Returns: (can_participate, message, is_first_time_today_or_shared_opportunity, reservation_date)
     """
-    if daily_usage_collection is None:
-        logger.warning("Cannot update user usage, DB not available.")
-        return
-
-    today_str = date.today().isoformat()
-    update_doc = {"$inc": {"summary_count": 1}}
-    if is_new_participation_slot:
-        update_doc["$inc"]["participation_count"] = 1
-    
-    result = daily_usage_collection.update_one(
-        {"customer_id": customer_id, "date": today_str},
-        update_doc,
-        upsert=True
-    )
-    if result.upserted_id or result.modified_count > 0:
-        logger.info(f"Updated usage for customer {customer_id} on {today_str}.")
-    else:
-        logger.warning(f"Failed to update usage for customer {customer_id} on {today_str} or no change needed.")
+    if not mongo_repository.available:
+        return False, "Database service not available.", False, None
+    return quota_engine.try_reserve(customer_id, request_id)
 
-
-async def process_image_submission(customer_id: str, file_name: str, image_bytes: bytes) -> Tuple[bool, str, Optional[str]]:
+async def process_image_submission(customer_id: str, file_name: str, image_source: Union[bytes, BinaryIO], image_size: Optional[int] = None) -> Tuple[bool, str, Optional[str], Dict[str, Any]]:
     """
     Handles the image submission, adds to queue after validation.
-    Returns: (success, message, request_id)
+    `image_source` is raw bytes or the spooled upload file; only the preprocessed payload is kept in memory.
+    Admission control runs first, so overload is shed before any decoding work or quota reservation.
+    A duplicate of an image already in the result cache is saved right away instead of being queued.
+    Raises AdmissionRejected when the upload is shed.
+    Returns: (success, message, request_id, details) where details holds the wait estimate for accepted requests.
     """
+    if isinstance(image_source, (bytes, bytearray)):
+        image_size = len(image_source)
+    if not image_size:
+        return False, "Image data is empty.", None, {}
+
+    request_id = str(uuid.uuid4())
+    estimated_wait, customer_in_flight = admission_controller.admit(request_id, customer_id)
+    queued = False
     try:
-        if not image_bytes:
-            return False, "Image data is empty.", None
-        
-        can_participate, message, is_priority_user = await check_user_limits(customer_id)
+        # Decode, validate and downscale once; both model servers receive the same compact payload.
+        # Done before the quota check so an invalid image never consumes a slot.
+        loop = asyncio.get_running_loop()
+        try:
+            payload_bytes, content_type = await loop.run_in_executor(None, prepare_image, image_source)
+        except ImageValidationError as e:
+            logger.warning(f"Rejected image {file_name} from customer {customer_id}: {e}")
+            return False, f"Invalid image: {e}", None, {}
+        logger.info(f"Prepared image {file_name} for customer {customer_id}: {image_size} -> {len(payload_bytes)} bytes.")
+
+        can_participate, message, is_priority_user, _ = await check_user_limits(customer_id, request_id)
         if not can_participate:
-            return False, message, None
+            return False, message, None, {}
 
-        request_id = str(uuid.uuid4())
         queued_item = QueuedItem(
             request_id=request_id,
             customer_id=customer_id,
             file_name=file_name,
-            image_bytes=image_bytes, # Store bytes directly
-            is_first_time_user=is_priority_user 
+            image_bytes=payload_bytes, # Preprocessed payload, not the original upload
+            content_type=content_type,
+            is_first_time_user=is_priority_user
         )
-        
+
+        content_hash = await result_cache.content_hash(payload_bytes)
+        cached = await result_cache.get(content_hash)
+        if cached is not None:
+            logger.info(f"Request {request_id}: Result cache hit ({content_hash[:12]}), answered without queueing.")
+            # Never queued: the admission slot is given back without counting towards the processing rate
+            admission_controller.release(request_id)
+            await save_item_summary(cached_processing_result(queued_item, content_hash, cached, {}))
+            status = request_status_store.get(request_id)
+            if status is not None and status.status == "failed":
+                quota_engine.release(request_id)
+                return False, status.error or "Failed to save the summary.", None, {}
+            return True, "Duplicate image: summary served from the result cache.", request_id, {"estimated_wait_seconds": 0.0}
+
         await queue_manager.add_to_queue(queued_item)
+        queued = True
+        request_status_store.queued(queued_item)
         logger.info(f"Request {request_id} for customer {customer_id} added to queue.")
-        
-        await update_user_usage(customer_id, is_new_participation_slot=True)
 
-        return True, "Request accepted and queued for processing.", request_id
+        return True, "Request accepted and queued for processing.", request_id, {
+            "estimated_wait_seconds": estimated_wait,
+            "customer_in_flight": customer_in_flight
+        }
     except OperationFailure as e:
         logger.error(f"MongoDB operation failed during image submission: {e}")
-        return False, "Database error during submission.", None
+        quota_engine.release(request_id)
+        return False, "Database error during submission.", None, {}
     except Exception as e:
         logger.error(f"Error processing image submission for customer {customer_id}: {e}")
-        return False, f"An unexpected error occurred: {str(e)}", None
+        quota_engine.release(request_id)
+        return False, f"An unexpected error occurred: {str(e)}", None, {}
+    finally:
+        # Anything that did not reach the queue gives its admission slot back
+        if not queued:
+            admission_controller.release(request_id)
 
 
-async def call_model_server(client_session: aiohttp.ClientSession, url: str, data: Optional[Dict[str, Any]] = None, files: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+async def call_model_server(url: str, data: Optional[Dict[str, Any]] = None, files: Optional[Dict[str, Any]] = None, client_session: Optional[aiohttp.ClientSession] = None) -> Optional[Dict[str, Any]]:
     """
     Helper function to call a model server.
     `data` is for JSON payload (like for text generation).
     `files` is for multipart/form-data (like for image uploads).
+    Uses the shared pooled session from model_server_client unless `client_session` is given.
+    The server's raw-body "/raw" variant (image or msgpack body, msgpack reply) is tried first;
+    servers without it get the multipart/JSON request instead.
     """
     try:
+        if client_session is None:
+            client_session = await model_server_client.get_session()
         if files: # For image captioning and object detection
+            if len(files) == 1 and model_transport.should_try_raw(url):
+                (filename, file_bytes, content_type), = files.values()
+                headers = {
+                    "Content-Type": "application/octet-stream",
+                    "X-Content-Type": content_type,
+                    "X-Filename": quote(filename, safe=""),
+                    "Accept": RAW_ACCEPT
+                }
+                async with client_session.post(model_transport.raw_url(url), data=file_bytes, headers=headers) as response:
+                    if not model_transport.is_unsupported_response(url, response.status):
+                        response.raise_for_status()
+                        return await read_model_response(response)
             form = aiohttp.FormData()
             for key, (filename, file_bytes, content_type) in files.items():
                 form.add_field(key, file_bytes, filename=filename, content_type=content_type)
@@ -195,6 +189,12 @@ async def call_model_server(client_session: aiohttp.ClientSession, url: str, dat
                 response.raise_for_status()
                 return await response.json()
         elif data: # For text generation
+            if model_transport.should_try_raw(url):
+                headers = {"Content-Type": MSGPACK_MEDIA_TYPE, "Accept": RAW_ACCEPT}
+                async with client_session.post(model_transport.raw_url(url), data=pack(data), headers=headers) as response:
+                    if not model_transport.is_unsupported_response(url, response.status):
+                        response.raise_for_status()
+                        return await read_model_response(response)
             async with client_session.post(url, json=data) as response:
                 response.raise_for_status()
                 return await response.json()
@@ -202,116 +202,340 @@ async def call_model_server(client_session: aiohttp.ClientSession, url: str, dat
             logger.warning(f"call_model_server called with no data or files for URL: {url}")
             return None
     except aiohttp.ClientResponseError as e:
+        MODEL_SERVER_ERRORS.labels(target=url, reason=f"http_{e.status}").inc()
+        if e.status == 503:
+            # Model still loading or inference queue full: send the next calls to other replicas
+            model_endpoints.mark_unavailable(url, "http_503")
         logger.error(f"HTTP error calling {url}: {e.status} {e.message} - Response: {await e.response.text() if e.response else 'No response text'}")
-    except aiohttp.ClientConnectionError as e:
+    except aiohttp.ClientConnectorError as e:
+        # Could not connect at all (refused, unreachable, DNS): send the next calls to other replicas
+        MODEL_SERVER_ERRORS.labels(target=url, reason="connection").inc()
+        model_endpoints.mark_unavailable(url, "connection_error")
         logger.error(f"Connection error calling {url}: {e}")
-    except asyncio.TimeoutError:
+    except aiohttp.ConnectionTimeoutError:
+        MODEL_SERVER_ERRORS.labels(target=url, reason="timeout").inc()
+        model_endpoints.mark_unavailable(url, "connect_timeout")
+        logger.error(f"Connect timeout calling {url}")
+    except (aiohttp.ServerTimeoutError, asyncio.TimeoutError):
+        # Before ClientConnectionError: aiohttp's sock_read timeout (ServerTimeoutError) subclasses it.
+        # A slow reply does not mean the replica is down, so it stays in the pool.
+        MODEL_SERVER_ERRORS.labels(target=url, reason="timeout").inc()
         logger.error(f"Timeout error calling {url}")
+    except aiohttp.ClientConnectionError as e:
+        # Connected, but the connection broke (e.g. server disconnected mid-reply); the readiness probe decides
+        MODEL_SERVER_ERRORS.labels(target=url, reason="connection").inc()
+        logger.error(f"Connection error calling {url}: {e}")
+    except asyncio.CancelledError:
+        # The per-stage timeout in call_model_stage cancels the call
+        MODEL_SERVER_ERRORS.labels(target=url, reason="cancelled").inc()
+        raise
     except Exception as e:
+        MODEL_SERVER_ERRORS.labels(target=url, reason="other").inc()
         logger.error(f"Generic error calling {url}: {e}")
     return None
 
-async def process_single_item_from_queue(item: QueuedItem):
+async def call_model_pool(pool: ModelEndpointPool, data: Optional[Dict[str, Any]] = None, files: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
     """
-    Processes a single item from the queue: calls models, generates summary, saves to DB.
+    Calls one ready replica of a model server (see call_model_server).
+    Returns None without calling anything when no replica became ready in time.
+    """
+    url = await pool.acquire()
+    if url is None:
+        MODEL_SERVER_ERRORS.labels(target=pool.name, reason="not_ready").inc()
+        logger.error(f"No {pool.name} server is ready: {pool.get_status()}")
+        return None
+    return await call_model_server(url, data=data, files=files)
+
+async def call_model_stage(stage_name: str, request_id: str, timeout: float, call) -> Optional[Any]:
+    """
+    Awaits a single model server call with a per-stage timeout.
+    Returns None when the stage times out or fails, so the caller can continue with partial results.
     """
-    logger.info(f"Processing item {item.request_id} for customer {item.customer_id}...")
     try:
-        async with aiohttp.ClientSession() as session:
-            # 1. Image Captioning
-            caption_files = {'file': (item.file_name, item.image_bytes, 'image/jpeg')} # Assuming jpeg, can be more dynamic
-            caption_response_json = await call_model_server(session, IMAGE_CAPTIONING_URL, files=caption_files)
-            caption_data = CaptionData(**caption_response_json) if caption_response_json and "caption" in caption_response_json else None
-            image_caption = caption_data.caption if caption_data else "Captioning failed or not available."
-            logger.info(f"Item {item.request_id}: Caption - '{image_caption}'")
-
-            # 2. Object Detection
-            detection_files = {'file': (item.file_name, item.image_bytes, 'image/jpeg')}
-            detection_response_json = await call_model_server(session, OBJECT_DETECTION_URL, files=detection_files)
-            detected_objects_data = DetectedObjectsData(**detection_response_json) if detection_response_json and "objects" in detection_response_json else None
-            objects_list = detected_objects_data.objects if detected_objects_data else []
-            logger.info(f"Item {item.request_id}: Detected {len(objects_list)} objects.")
-
-            # 3. Text Generation (Summary)
-            prompt = f"Summarize this image. Caption: '{image_caption}'. Objects detected: "
-            if objects_list:
-                prompt += ", ".join([obj.label for obj in objects_list[:5]]) # Limit to 5 objects for prompt brevity
-            else:
-                prompt += "None."
-            
-            text_gen_payload = TextSummarizationInput(prompt=prompt, max_length=100).model_dump()
-            summary_response_list = await call_model_server(session, TEXT_SUMMARIZATION_URL, data=text_gen_payload)
-            generated_summary = summary_response_list[0] if summary_response_list and isinstance(summary_response_list, list) and summary_response_list[0] else "Summary generation failed."
-            
-            if generated_summary.startswith(prompt[:50]): 
-                if len(generated_summary) < len(prompt) + 20 : 
-                     generated_summary = f"Summary based on: {image_caption}"
-            logger.info(f"Item {item.request_id}: Generated summary - '{generated_summary}'")
-
-            # 4. Save to Database
-            if image_summaries_collection is None:
-                logger.error(f"Item {item.request_id}: Cannot save summary, DB not available.")
-                return
+        return await asyncio.wait_for(call, timeout=timeout)
+    except asyncio.TimeoutError:
+        logger.error(f"Item {request_id}: {stage_name} timed out after {timeout}s.")
+    except Exception as e:
+        logger.error(f"Item {request_id}: {stage_name} failed: {e}")
+    return None
 
+async def run_image_captioning(item: QueuedItem, image=None, timings: Optional[Dict[str, float]] = None) -> Optional[str]:
+    """
+    `image` is the already decoded image in fused mode (PIPELINE_MODE=fused); remote mode uploads the bytes.
+    `timings` receives the stage's seconds.
+    """
+    if in_process_inference is not None:
+        call = in_process_inference.caption(image, item.file_name)
+    else:
+        call = call_model_pool(caption_endpoints, files={'file': (item.file_name, item.image_bytes, item.content_type)})
+    with observe_stage("caption", timings):
+        caption_response_json = await call_model_stage("Image captioning", item.request_id, IMAGE_CAPTIONING_TIMEOUT, call)
+    caption_data = CaptionData(**caption_response_json) if caption_response_json and "caption" in caption_response_json else None
+    return caption_data.caption if caption_data else None
+
+async def run_object_detection(item: QueuedItem, image=None, timings: Optional[Dict[str, float]] = None) -> Optional[List[ObjectData]]:
+    if in_process_inference is not None:
+        call = in_process_inference.detect(image, item.file_name)
+    else:
+        call = call_model_pool(detection_endpoints, files={'file': (item.file_name, item.image_bytes, item.content_type)})
+    with observe_stage("detection", timings):
+        detection_response_json = await call_model_stage("Object detection", item.request_id, OBJECT_DETECTION_TIMEOUT, call)
+    detected_objects_data = DetectedObjectsData(**detection_response_json) if detection_response_json and "objects" in detection_response_json else None
+    return detected_objects_data.objects if detected_objects_data else None
+
+def cached_processing_result(item: QueuedItem, content_hash: str, cached: CachedResult, stage_seconds: Dict[str, float]) -> ProcessingResult:
+    return ProcessingResult(
+        request_id=item.request_id,
+        customer_id=item.customer_id,
+        file_name=item.file_name,
+        received_at=item.received_at,
+        caption=cached.caption,
+        detected_objects=cached.detected_objects,
+        text_summary=cached.text_summary,
+        content_hash=content_hash,
+        from_cache=True,
+        stage_seconds=stage_seconds
+    )
+
+# --- Processing stages (each one runs as a stage of processing_pipeline) ---
+async def analyze_queued_item(item: QueuedItem) -> Optional[ProcessingResult]:
+    """
+    Stage 1: image captioning and object detection.
+    Both calls are independent and run concurrently; a failed stage falls back to partial results.
+    An image found in the result cache by now (a duplicate of one that was still being processed when it
+    was submitted) skips every model call and is saved right away (returns None).
+    """
+    logger.info(f"Processing item {item.request_id} for customer {item.customer_id}...")
+    request_status_store.processing(item)
+    queue_wait = max(0.0, (datetime.utcnow() - item.received_at).total_seconds())
+    QUEUE_WAIT_SECONDS.observe(queue_wait)
+    stage_seconds = {"queue_wait": queue_wait}
+    content_hash = await result_cache.content_hash(item.image_bytes)
+    cached = await result_cache.get(content_hash)
+    if cached is not None:
+        logger.info(f"Item {item.request_id}: Result cache hit ({content_hash[:12]}), skipping model calls.")
+        await save_item_summary(cached_processing_result(item, content_hash, cached, stage_seconds))
+        return None
+
+    image = None
+    if in_process_inference is not None:
+        # Fused mode: decode once (uploads were already validated) and hand the same image to both models
+        image = await in_process_inference.decode_image(item.image_bytes)
+    caption_result, detection_result = await asyncio.gather(
+        run_image_captioning(item, image, stage_seconds),
+        run_object_detection(item, image, stage_seconds)
+    )
+    if caption_result is None and detection_result is None:
+        logger.warning(f"Item {item.request_id}: Both captioning and object detection failed.")
+    elif caption_result is None or detection_result is None:
+        failed_stage = "captioning" if caption_result is None else "object detection"
+        logger.warning(f"Item {item.request_id}: Continuing with partial results ({failed_stage} failed).")
+
+    image_caption = caption_result if caption_result is not None else CAPTION_FALLBACK_TEXT
+    objects_list = detection_result if detection_result is not None else []
+    logger.info(f"Item {item.request_id}: Caption - '{image_caption}'")
+    logger.info(f"Item {item.request_id}: Detected {len(objects_list)} objects.")
+
+    failed_stages = []
+    if caption_result is None:
+        failed_stages.append("captioning")
+    if detection_result is None:
+        failed_stages.append("detection")
+
+    # The image bytes are not carried past this stage
+    return ProcessingResult(
+        request_id=item.request_id,
+        customer_id=item.customer_id,
+        file_name=item.file_name,
+        received_at=item.received_at,
+        caption=image_caption,
+        detected_objects=objects_list,
+        content_hash=content_hash,
+        failed_stages=failed_stages,
+        stage_seconds=stage_seconds
+    )
+
+async def generate_item_summary(result: ProcessingResult) -> ProcessingResult:
+    """
+    Stage 2: text generation (summary) from the caption and detected objects.
+    """
+    image_caption = result.caption
+    objects_list = result.detected_objects
+    prompt = f"Summarize this image. Caption: '{image_caption}'. Objects detected: "
+    if objects_list:
+        prompt += ", ".join([obj.label for obj in objects_list[:5]]) # Limit to 5 objects for prompt brevity
+    else:
+        prompt += "None."
+
+    text_gen_payload = TextSummarizationInput(prompt=prompt, max_length=100, max_new_tokens=TEXT_SUMMARY_MAX_NEW_TOKENS).model_dump()
+    if in_process_inference is not None:
+        call = in_process_inference.generate(text_gen_payload)
+    else:
+        call = call_model_pool(generation_endpoints, data=text_gen_payload)
+    with observe_stage("generation", result.stage_seconds):
+        summary_response_list = await call_model_stage("Text generation", result.request_id, TEXT_SUMMARIZATION_TIMEOUT, call)
+    generated_summary = summary_response_list[0] if summary_response_list and isinstance(summary_response_list, list) and summary_response_list[0] else None
+    if generated_summary is None:
+        result.failed_stages.append("generation")
+        generated_summary = "Summary generation failed."
+
+    if generated_summary.startswith(prompt[:50]):
+        if len(generated_summary) < len(prompt) + 20 :
+             generated_summary = f"Summary based on: {image_caption}"
+    logger.info(f"Item {result.request_id}: Generated summary - '{generated_summary}'")
+
+    result.text_summary = generated_summary
+    # Only complete results are reused for duplicate images
+    if result.content_hash and not result.failed_stages:
+        await result_cache.put(result.content_hash, CachedResult(
+            caption=result.caption,
+            detected_objects=result.detected_objects,
+            text_summary=generated_summary
+        ))
+    return result
+
+async def save_item_summary(result: ProcessingResult) -> None:
+    """
+    Stage 3: persists the summary record to the database.
+    """
+    try:
+        if image_summaries_collection is None:
+            logger.error(f"Item {result.request_id}: Cannot save summary, DB not available.")
+            request_status_store.failed(result, "Database not available.")
+            daily_stats.record_failure(result)
+            await queue_manager.mark_failed(result.request_id)
+            return
+        created_at = datetime.utcnow()
+        with observe_stage("mongo", result.stage_seconds):
             sequence_num = await get_next_sequence_number()
             summary_record = ImageSummaryRecord(
                 sequence_number=sequence_num,
-                customer_id=item.customer_id,
-                original_file_name=item.file_name,
-                text_summary=generated_summary,
-                caption=image_caption,
-                detected_objects=objects_list,
-                created_at=datetime.utcnow()
+                customer_id=result.customer_id,
+                original_file_name=result.file_name,
+                text_summary=result.text_summary,
+                caption=result.caption,
+                detected_objects=result.detected_objects,
+                created_at=created_at,
+                request_id=result.request_id
             )
-            image_summaries_collection.insert_one(summary_record.model_dump(by_alias=True))
-            logger.info(f"Item {item.request_id} processed and summary saved for customer {item.customer_id} with sequence {sequence_num}.")
-
+            await mongo_repository.insert_summary(summary_record.model_dump(by_alias=True))
+        # A saved item leaves the durable spool; failed ones leave it through mark_failed
+        await queue_manager.mark_done(result.request_id)
+        summary_read_cache.invalidate(result.customer_id)
+        daily_stats.record_summary(result, created_at)
+        request_status_store.done(result, sequence_num)
+        logger.info(f"Item {result.request_id} processed and summary saved for customer {result.customer_id} with sequence {sequence_num}.")
     except OperationFailure as e:
-        logger.error(f"MongoDB operation failed while processing item {item.request_id}: {e}")
+        logger.error(f"MongoDB operation failed while processing item {result.request_id}: {e}")
+        request_status_store.failed(result, "Database error while saving the summary.")
+        daily_stats.record_failure(result)
+        await queue_manager.mark_failed(result.request_id)
+    finally:
+        # The item has left the system either way; frees the customer's in-flight slot
+        admission_controller.complete(result.request_id)
+
+async def process_single_item_from_queue(item: QueuedItem):
+    """
+    Processes a single item from the queue: calls models, generates summary, saves to DB.
+    Runs all stages back to back; the background worker uses processing_pipeline instead.
+    """
+    try:
+        result = await analyze_queued_item(item)
+        if result is None: # Served from the result cache and already saved
+            return
+        result = await generate_item_summary(result)
+        await save_item_summary(result)
     except Exception as e:
         logger.error(f"Error processing item {item.request_id} from queue: {e}", exc_info=True)
-
-
-# Background task for processing the queue
+        request_status_store.failed(item, str(e))
+        daily_stats.record_failure(item)
+        await queue_manager.mark_failed(item.request_id)
+        admission_controller.complete(item.request_id)
+
+async def on_pipeline_item_dropped(item, error: Exception):
+    # QueuedItem and ProcessingResult both carry the request_id
+    request_status_store.failed(item, str(error))
+    daily_stats.record_failure(item)
+    await queue_manager.mark_failed(item.request_id)
+    admission_controller.complete(item.request_id)
+
+processing_pipeline = ProcessingPipeline([
+    PipelineStage("analysis", analyze_queued_item, workers=PIPELINE_ANALYSIS_WORKERS, queue_size=PIPELINE_STAGE_QUEUE_SIZE, on_error=on_pipeline_item_dropped),
+    PipelineStage("generation", generate_item_summary, workers=PIPELINE_GENERATION_WORKERS, queue_size=PIPELINE_STAGE_QUEUE_SIZE, on_error=on_pipeline_item_dropped),
+    PipelineStage("persistence", save_item_summary, workers=PIPELINE_PERSIST_WORKERS, queue_size=PIPELINE_STAGE_QUEUE_SIZE, on_error=on_pipeline_item_dropped),
+])
+
+# Background task that feeds the queue into the processing pipeline
 async def queue_processing_worker():
     logger.info("Queue processing worker started.")
     while True:
         try:
-            item = await queue_manager.get_from_queue()
-            if item:
-                await process_single_item_from_queue(item)
-            else:
-                await asyncio.sleep(1)
+            # Wakes up as soon as an item is enqueued; no polling while the queue is empty
+            item = await queue_manager.get()
+            # Blocks while the first stage is full, so pending items keep their priority order in queue_manager
+            await processing_pipeline.submit(item)
         except Exception as e:
             logger.error(f"Critical error in queue_processing_worker loop: {e}", exc_info=True)
-            await asyncio.sleep(5) 
+            await asyncio.sleep(5)
 
 # --- Functions for retrieving data (e.g., for user app) ---
 async def get_summary_by_customer_and_filename(customer_id: str, filename: str) -> Optional[ImageSummaryRecord]:
     if image_summaries_collection is None:
         logger.warning("Cannot retrieve summary, DB not available.")
         return None
-    doc = image_summaries_collection.find_one({"customer_id": customer_id, "original_file_name": filename}, sort=[("created_at", -1)])
+    doc = await mongo_repository.find_latest_summary(customer_id, filename)
     return ImageSummaryRecord(**doc) if doc else None
 
-async def get_summaries_by_customer(customer_id: str, limit: int = 10) -> List[ImageSummaryRecord]:
+async def get_summary_page(customer_id: Optional[str], limit: int, cursor: Optional[str] = None, fields: Optional[str] = None) -> SummaryPage:
+    """
+    One page of summaries, newest first (all customers when customer_id is None), serialized once and
+    served from the summary read cache until the customer's next record is saved.
+    `cursor` is the X-Next-Cursor of the previous page; `fields` a comma-separated projection.
+    Raises ValueError on an invalid cursor or field name.
+    Returns: (body, etag, next_cursor)
+    """
+    projected = parse_fields(fields)
+    query = keyset_query({"customer_id": customer_id} if customer_id is not None else {}, cursor)
+    page_key = (cursor, limit, projected)
+    page = summary_read_cache.get(customer_id, page_key)
+    if page is not None:
+        return page
     if image_summaries_collection is None:
         logger.warning("Cannot retrieve summaries, DB not available.")
-        return []
-    cursor = image_summaries_collection.find({"customer_id": customer_id}).sort("created_at", -1).limit(limit)
-    return [ImageSummaryRecord(**doc) for doc in await cursor.to_list(length=limit)]
+        return build_page([], projected, limit)
+    version = summary_read_cache.version(customer_id)
+    # One extra document tells whether there is a next page
+    docs = await mongo_repository.find_summary_page(query, projection_for(projected), SUMMARY_SORT, limit + 1)
+    page = build_page(docs, projected, limit)
+    summary_read_cache.put(customer_id, page_key, page, version)
+    return page
 
 
-async def get_all_summaries(limit: int = 100) -> List[ImageSummaryRecord]: # For debug
-    if image_summaries_collection is None:
-        return []
-    cursor = image_summaries_collection.find().sort("created_at", -1).limit(limit)
-    return [ImageSummaryRecord(**doc) for doc in await cursor.to_list(length=limit)] 
-
-def get_total_summaries_today() -> int:
-    today = date.today()
-    start = datetime.combine(today, datetime.min.time())
-    end = datetime.combine(today, datetime.max.time())
-    return image_summaries_collection.count_documents({
-        "created_at": {"$gte": start, "$lte": end}
-    }) 
\ No newline at end of file
+async def get_request_status(request_id: str) -> Optional[RequestStatus]:
+    """
+    Status of a request from the in-memory store. Requests finished before the last restart (or expired
+    from the store) are looked up once by request_id in MongoDB; unknown ids return None.
+    """
+    status = request_status_store.get(request_id)
+    if status is not None or image_summaries_collection is None:
+        return status
+    doc = await mongo_repository.find_summary_by_request_id(request_id)
+    if not doc:
+        return None
+    return RequestStatus(
+        request_id=request_id,
+        customer_id=doc["customer_id"],
+        file_name=doc["original_file_name"],
+        status="done",
+        received_at=doc["created_at"],
+        updated_at=doc["created_at"],
+        sequence_number=doc["sequence_number"],
+        text_summary=doc["text_summary"]
+    )
+
+async def get_total_summaries_today() -> int:
+    """
+    Summaries saved today (UTC, like created_at), read from the materialized daily stats.
+    """
+    stats = await daily_stats.get(utc_date_str())
+    return stats["summaries"]
\ No newline at end of file
@@ -0,0 +1,188 @@
+import base64
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+
+from ..models.schemas import ImageSummaryRecord
+
+# Configure basic logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SUMMARY_CACHE_ENABLED = os.getenv("SUMMARY_CACHE_ENABLED", "True").lower() == "true"
+# Customers whose pages are cached (least recently used dropped first), and distinct pages kept per customer
+SUMMARY_CACHE_MAX_CUSTOMERS = int(os.getenv("SUMMARY_CACHE_MAX_CUSTOMERS", 10000))
+SUMMARY_CACHE_MAX_PAGES_PER_CUSTOMER = int(os.getenv("SUMMARY_CACHE_MAX_PAGES_PER_CUSTOMER", 8))
+# Upper bound on staleness when another business server instance writes to the same database
+SUMMARY_CACHE_TTL_SECONDS = float(os.getenv("SUMMARY_CACHE_TTL_SECONDS", 60))
+
+SUMMARY_FIELDS = tuple(ImageSummaryRecord.model_fields)
+# Newest first; sequence_number breaks ties between records with the same created_at
+SUMMARY_SORT = [("created_at", -1), ("sequence_number", -1)]
+
+# (body, etag, next_cursor)
+SummaryPage = Tuple[bytes, str, Optional[str]]
+
+def parse_fields(fields: Optional[str]) -> Tuple[str, ...]:
+    """
+    Parses a comma-separated `fields` parameter; all ImageSummaryRecord fields when empty.
+    Raises ValueError on unknown field names.
+    """
+    if not fields:
+        return SUMMARY_FIELDS
+    requested = tuple(dict.fromkeys(name.strip() for name in fields.split(",") if name.strip()))
+    unknown = [name for name in requested if name not in SUMMARY_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown field(s): {', '.join(unknown)}. Available: {', '.join(SUMMARY_FIELDS)}.")
+    return requested or SUMMARY_FIELDS
+
+def encode_cursor(created_at: datetime, sequence_number: int) -> str:
+    raw = json.dumps([created_at.isoformat(), sequence_number]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """
+    Raises ValueError on a malformed cursor.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, sequence_number = json.loads(raw)
+        return datetime.fromisoformat(created_at), int(sequence_number)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+def keyset_query(query: Dict[str, Any], cursor: Optional[str]) -> Dict[str, Any]:
+    """
+    Restricts `query` to records after the cursor in SUMMARY_SORT order.
+    """
+    if not cursor:
+        return query
+    created_at, sequence_number = decode_cursor(cursor)
+    after = {"$or": [
+        {"created_at": {"$lt": created_at}},
+        {"created_at": created_at, "sequence_number": {"$lt": sequence_number}}
+    ]}
+    return {"$and": [query, after]} if query else after
+
+def projection_for(fields: Tuple[str, ...]) -> Dict[str, int]:
+    # The sort keys are always read so the next cursor can be built
+    return {"_id": 0, **{name: 1 for name in fields}, "created_at": 1, "sequence_number": 1}
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+def build_page(docs: List[Dict[str, Any]], fields: Tuple[str, ...], limit: int) -> SummaryPage:
+    """
+    Serializes a page once, straight from the MongoDB documents (fetched with limit + 1 to detect a next page).
+    """
+    has_more = len(docs) > limit
+    docs = docs[:limit]
+    body = json.dumps([{name: doc.get(name) for name in fields} for doc in docs], default=_json_default).encode()
+    etag = '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+    next_cursor = encode_cursor(docs[-1]["created_at"], docs[-1]["sequence_number"]) if has_more else None
+    return body, etag, next_cursor
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    # Weak comparison, as If-None-Match requires
+    return "*" in candidates or etag in (tag[2:] if tag.startswith("W/") else tag for tag in candidates)
+
+class _CustomerPages:
+    __slots__ = ("version", "pages")
+
+    def __init__(self):
+        self.version = 0
+        # page key -> (stored_at monotonic time, page); most recently used last
+        self.pages: "OrderedDict[tuple, Tuple[float, SummaryPage]]" = OrderedDict()
+
+class SummaryReadCache:
+    """
+    Read-through cache of serialized summary pages, grouped per customer (None for the admin listing over all customers).
+    save_item_summary invalidates the customer's group and the admin listing when it inserts a record.
+    Each invalidation bumps the group's version; a page read from MongoDB is only stored if the version
+    did not change while it was being read, so an insert racing with a read never leaves a stale page behind.
+    """
+    def __init__(self, enabled: bool = SUMMARY_CACHE_ENABLED, max_customers: int = SUMMARY_CACHE_MAX_CUSTOMERS,
+                 max_pages_per_customer: int = SUMMARY_CACHE_MAX_PAGES_PER_CUSTOMER, ttl_seconds: float = SUMMARY_CACHE_TTL_SECONDS):
+        self.enabled = enabled
+        self.max_customers = max(1, max_customers)
+        self.max_pages_per_customer = max(1, max_pages_per_customer)
+        self.ttl_seconds = ttl_seconds
+        self._customers: "OrderedDict[Optional[str], _CustomerPages]" = OrderedDict()
+        self._stats: Dict[str, int] = {"hits": 0, "misses": 0, "stores": 0, "stale_skipped": 0, "invalidations": 0}
+
+    def _group(self, customer_key: Optional[str], create: bool = False) -> Optional[_CustomerPages]:
+        group = self._customers.get(customer_key)
+        if group is None and create:
+            group = self._customers[customer_key] = _CustomerPages()
+            while len(self._customers) > self.max_customers:
+                self._customers.popitem(last=False)
+        if group is not None:
+            self._customers.move_to_end(customer_key)
+        return group
+
+    def version(self, customer_key: Optional[str]) -> int:
+        group = self._customers.get(customer_key)
+        return group.version if group is not None else 0
+
+    def get(self, customer_key: Optional[str], page_key: tuple) -> Optional[SummaryPage]:
+        if not self.enabled:
+            return None
+        group = self._group(customer_key)
+        entry = group.pages.get(page_key) if group is not None else None
+        if entry is not None and time.monotonic() - entry[0] <= self.ttl_seconds:
+            group.pages.move_to_end(page_key)
+            self._stats["hits"] += 1
+            return entry[1]
+        if entry is not None:
+            del group.pages[page_key]
+        self._stats["misses"] += 1
+        return None
+
+    def put(self, customer_key: Optional[str], page_key: tuple, page: SummaryPage, version: int):
+        """
+        `version` is self.version(customer_key) taken before the page was read from MongoDB.
+        """
+        if not self.enabled:
+            return
+        if self.version(customer_key) != version:
+            self._stats["stale_skipped"] += 1
+            return
+        group = self._group(customer_key, create=True)
+        group.pages[page_key] = (time.monotonic(), page)
+        group.pages.move_to_end(page_key)
+        while len(group.pages) > self.max_pages_per_customer:
+            group.pages.popitem(last=False)
+        self._stats["stores"] += 1
+
+    def invalidate(self, customer_id: str):
+        if not self.enabled:
+            return
+        for customer_key in (customer_id, None):
+            group = self._group(customer_key, create=True)
+            group.version += 1
+            group.pages.clear()
+        self._stats["invalidations"] += 1
+
+    def get_stats(self) -> dict:
+        lookups = self._stats["hits"] + self._stats["misses"]
+        return {
+            "enabled": self.enabled,
+            "customers": len(self._customers),
+            "pages": sum(len(group.pages) for group in self._customers.values()),
+            "ttl_seconds": self.ttl_seconds,
+            **self._stats,
+            "hit_rate": round(self._stats["hits"] / lookups, 4) if lookups else 0.0
+        }
+
+# Global instance of the summary read cache
+summary_read_cache = SummaryReadCache()
@@ -1,4 +1,4 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
 import asyncio 
 import os
@@ -10,6 +10,12 @@ load_dotenv()
 from .api import routes as api_routes
 from .core import services # To access queue_processing_worker
 from .core.queue_manager import queue_manager # For startup message
+from .core.http_client import model_server_client
+from .core.model_endpoints import model_endpoints
+from .core.inference import in_process_inference, PIPELINE_MODE
+from .core.model_transport import model_transport
+from .core.metrics import bind_queue_depth, render_metrics
+from .utils.upload_limit import UploadSizeLimitMiddleware
 
 # Configure basic logging
 logging.basicConfig(level=logging.INFO)
@@ -26,30 +32,76 @@ app.add_middleware(
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],
-    allow_headers=["*"]
+    allow_headers=["*"],
+    # Summary pages: revalidation and the next-page cursor
+    expose_headers=["ETag", "X-Next-Cursor"]
 )
 
+# Cuts oversized image uploads off before the multipart body is parsed
+app.add_middleware(UploadSizeLimitMiddleware, paths=["/upload_image/"])
+
+async def start_processing():
+    """
+    Starts the processing pipeline stages and the worker that feeds them from the queue.
+    """
+    if in_process_inference is not None:
+        logger.info("PIPELINE_MODE=fused: loading the models in-process...")
+        await in_process_inference.wait_until_loaded()
+    await services.processing_pipeline.start()
+    asyncio.create_task(services.queue_processing_worker())
+    logger.info(f"Background queue processing worker started (pipeline mode: {PIPELINE_MODE}).")
+
 @app.on_event("startup")
 async def startup_event():
     logger.info("Business Server starting up...")
-    # Verify DB connection on startup (optional, already done in services.py)
+    # Verify DB connection on startup (optional, already done in core/database.py)
     if services.db is None:
         logger.critical("MongoDB connection failed. Business logic dependent on DB will not work.")
     else:
         logger.info("MongoDB connection verified.")
     
-    # Start the background worker for queue processing
-    asyncio.create_task(services.queue_processing_worker())
-    logger.info("Background queue processing worker started.")
+    # Rebuild today's quota counters before accepting uploads
+    await services.quota_engine.start()
+    await services.daily_stats.start()
+
+    # Shared, pooled HTTP client for all model server calls
+    await model_server_client.start()
+    if in_process_inference is None:
+        # Poll the model servers' /ready so items are only sent to replicas that finished loading
+        await model_endpoints.start(model_server_client)
+
+    # Re-queue items left unfinished by the previous run (no-op without QUEUE_SPOOL_DIR)
+    recovered = await queue_manager.recover()
+    if recovered:
+        logger.info(f"Recovered {recovered} unfinished item(s) from the queue spool.")
+        # Recovered items count towards queue depth and the customers' in-flight limits, and can be looked up by request_id
+        backlog = queue_manager.get_all_items_snapshot()
+        services.admission_controller.register_backlog(backlog)
+        services.request_status_store.register_backlog(backlog)
+
+    if in_process_inference is None:
+        await start_processing()
+    else:
+        # Fused mode: uploads are accepted and queued while the models load; processing starts once they are loaded
+        asyncio.create_task(start_processing())
+    bind_queue_depth(queue_manager)
     initial_queue_status = await queue_manager.get_queue_status()
     logger.info(f"Initial queue status: {initial_queue_status}")
 
 @app.on_event("shutdown")
 async def shutdown_event():
     logger.info("Business Server shutting down...")
-    if services.client: # Pymongo client
-        services.client.close()
-        logger.info("MongoDB connection closed.")
+    await services.processing_pipeline.stop()
+    await model_endpoints.stop()
+    if in_process_inference is not None:
+        in_process_inference.stop()
+    await model_server_client.close()
+    # Write pending quota counters back before the DB client is closed
+    await services.quota_engine.stop()
+    await services.daily_stats.stop()
+    # Closes the pymongo client and its executor
+    services.mongo_repository.close()
+    queue_manager.close()
 
 # Include API routes
 app.include_router(api_routes.router, prefix="/api", tags=["Image Processing"])
@@ -57,15 +109,22 @@ app.include_router(api_routes.router, prefix="/api", tags=["Image Processing"])
 @app.get("/health", summary="Health check for Business Server")
 async def health_check():
     # Basic health check, can be expanded to check DB, queue status etc.
-    db_status = "connected" if services.db else "disconnected"
+    db_status = "connected" if services.db is not None else "disconnected"
     queue_status = await queue_manager.get_queue_status()
     return {
         "status": "ok", 
         "message": "Business Server is running", 
         "database_status": db_status,
-        "queue_items": queue_status.get("total_items", 0)
+        "queue_items": queue_status.get("total_items", 0),
+        "model_servers": in_process_inference.get_status() if in_process_inference is not None else model_endpoints.get_status(),
+        "model_transport": model_transport.get_status()
     }
 
+@app.get("/metrics", summary="Prometheus metrics", include_in_schema=False)
+async def metrics():
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
 if __name__ == "__main__":
 
     DEBUG_MODE = os.environ.get("DEBUG_MODE", "False").lower() == "true"
@@ -10,12 +10,17 @@ class ImageUploadResponse(BaseModel):
     message: str
     request_id: Optional[str] = None
     error_info: Optional[str] = None
+    # Admission control: smoothed wait estimate, the customer's unfinished requests, and the back-off when shed
+    estimated_wait_seconds: Optional[float] = None
+    customer_in_flight: Optional[int] = None
+    retry_after_seconds: Optional[int] = None
 
 class QueuedItem(BaseModel):
     request_id: str
     customer_id: str
     file_name: str
-    image_bytes: bytes 
+    image_bytes: bytes
+    content_type: str = "image/jpeg"
     received_at: datetime = Field(default_factory=datetime.utcnow)
     is_first_time_user: bool = True 
 
@@ -36,10 +41,50 @@ class DetectedObjectsData(BaseModel):
     filename: str
     objects: List[ObjectData]
 
+class ProcessingResult(BaseModel):
+    """Intermediate result handed between processing pipeline stages (no image bytes)."""
+    request_id: str
+    customer_id: str
+    file_name: str
+    received_at: datetime
+    caption: str
+    detected_objects: List[ObjectData] = []
+    text_summary: Optional[str] = None
+    content_hash: Optional[str] = None
+    failed_stages: List[str] = []
+    from_cache: bool = False
+    # Seconds spent per stage (queue_wait, caption, detection, generation, mongo), for the daily stats
+    stage_seconds: Dict[str, float] = {}
+
+class RequestStatus(BaseModel):
+    """Processing state of one upload, served by /api/requests/{request_id} and its SSE/WebSocket streams."""
+    request_id: str
+    customer_id: str
+    file_name: str
+    status: str # queued | processing | done | failed
+    received_at: datetime
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+    # While waiting in the queue: 1-based position and the admission controller's wait estimate
+    queue_position: Optional[int] = None
+    estimated_wait_seconds: Optional[float] = None
+    # Once done
+    sequence_number: Optional[int] = None
+    text_summary: Optional[str] = None
+    failed_stages: List[str] = []
+    error: Optional[str] = None
+
+class CachedResult(BaseModel):
+    """Model outputs stored in the result cache, keyed by image content hash."""
+    caption: str
+    detected_objects: List[ObjectData] = []
+    text_summary: str
+
 class TextSummarizationInput(BaseModel):
     prompt: str
-    max_length: int = 150 # Default length for summary
+    max_length: int = 150 # Default length for summary (counts prompt tokens; used only without max_new_tokens)
+    max_new_tokens: Optional[int] = None
     num_return_sequences: int = 1
+    stop_at_sentence: bool = True
 
 # --- Database Schema ---
 class ImageSummaryRecord(BaseModel):
@@ -51,6 +96,7 @@ class ImageSummaryRecord(BaseModel):
     caption: Optional[str] = None
     detected_objects: Optional[List[ObjectData]] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
+    request_id: Optional[str] = None # Absent on records saved before request status lookups existed
     
 
 class DailyUsage(BaseModel):
@@ -0,0 +1,9 @@
+from datetime import datetime
+from typing import Optional
+
+def utc_date_str(moment: Optional[datetime] = None) -> str:
+    """
+    YYYY-MM-DD of `moment` (a naive UTC datetime, like created_at), or of the current UTC time.
+    Every per-day key (quota counters, daily_usage, daily_stats) uses this, so all of them roll over together.
+    """
+    return (moment or datetime.utcnow()).date().isoformat()
@@ -0,0 +1,111 @@
+import io
+import os
+from typing import BinaryIO, Optional, Tuple
+import logging
+
+from PIL import Image, UnidentifiedImageError
+
+# Configure basic logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Longest side sent to the model servers. YOLO letterboxes to 640 and the ViT captioner resizes to 224,
+# so nothing above 640 is ever used by either model.
+PREPROCESS_MAX_SIDE = int(os.getenv("PREPROCESS_MAX_SIDE", 640))
+PREPROCESS_JPEG_QUALITY = int(os.getenv("PREPROCESS_JPEG_QUALITY", 90))
+# Rejects decompression bombs before any pixel data is decoded
+PREPROCESS_MAX_PIXELS = int(os.getenv("PREPROCESS_MAX_PIXELS", 50_000_000))
+# Largest accepted upload; bigger bodies are cut off while they are still being received
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", 20 * 1024 * 1024))
+
+# Leading bytes of the formats the models can read
+_IMAGE_SIGNATURES = (
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"BM", "image/bmp"),
+    (b"II*\x00", "image/tiff"),
+    (b"MM\x00*", "image/tiff"),
+)
+
+class ImageValidationError(ValueError):
+    status_code = 400
+
+class UploadTooLarge(ImageValidationError):
+    status_code = 413
+
+class UnsupportedImageType(ImageValidationError):
+    status_code = 415
+
+def sniff_image_type(header: bytes) -> Optional[str]:
+    """
+    Returns the MIME type matching the file's magic bytes, or None if it is not a supported image.
+    """
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return "image/webp"
+    for signature, mime_type in _IMAGE_SIGNATURES:
+        if header.startswith(signature):
+            return mime_type
+    return None
+
+def inspect_upload(file: BinaryIO, size: Optional[int] = None, max_bytes: int = MAX_UPLOAD_BYTES) -> Tuple[str, int]:
+    """
+    Checks an uploaded file without reading it into memory: its size against max_bytes and
+    its first bytes against the known image signatures. Leaves the file positioned at the start.
+    Returns: (sniffed_content_type, size_in_bytes)
+    """
+    if size is None:
+        file.seek(0, os.SEEK_END)
+        size = file.tell()
+    if size == 0:
+        raise ImageValidationError("Image file is empty.")
+    if size > max_bytes:
+        raise UploadTooLarge(f"Image file is too large ({size} bytes, limit {max_bytes}).")
+    file.seek(0)
+    header = file.read(16)
+    file.seek(0)
+    content_type = sniff_image_type(header)
+    if content_type is None:
+        raise UnsupportedImageType("File content is not a supported image (JPEG, PNG, GIF, BMP, TIFF or WebP).")
+    return content_type, size
+
+def prepare_image(image_source) -> Tuple[bytes, str]:
+    """
+    Decodes an uploaded image once, validates it and downscales it to PREPROCESS_MAX_SIDE.
+    `image_source` is raw bytes or a binary file object positioned at the start of the image.
+    Returns: (payload_bytes, content_type) to send to both the captioning and detection servers.
+    Blocking (CPU-bound); call it from an executor.
+    """
+    raw = io.BytesIO(image_source) if isinstance(image_source, (bytes, bytearray)) else image_source
+    try:
+        image = Image.open(raw)
+        width, height = image.size
+        if width * height > PREPROCESS_MAX_PIXELS:
+            raise ImageValidationError(f"Image is too large ({width}x{height}).")
+        source_format = image.format
+        # For JPEG, draft() lets the decoder skip straight to a reduced scale (much cheaper than a full decode)
+        image.draft("RGB", (PREPROCESS_MAX_SIDE, PREPROCESS_MAX_SIDE))
+        image.load()
+    except ImageValidationError:
+        raise
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError, SyntaxError) as e:
+        raise ImageValidationError(f"Could not decode image: {e}")
+
+    needs_resize = max(image.size) > PREPROCESS_MAX_SIDE
+    # Small RGB JPEGs are forwarded untouched; re-encoding them would only cost time and quality
+    if source_format == "JPEG" and image.mode == "RGB" and not needs_resize and image.size == (width, height):
+        if isinstance(image_source, (bytes, bytearray)):
+            return bytes(image_source), "image/jpeg"
+        raw.seek(0)
+        return raw.read(), "image/jpeg"
+
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    if needs_resize:
+        image.thumbnail((PREPROCESS_MAX_SIDE, PREPROCESS_MAX_SIDE), Image.BILINEAR)
+
+    output = io.BytesIO()
+    image.save(output, format="JPEG", quality=PREPROCESS_JPEG_QUALITY)
+    logger.debug(f"Prepared image {width}x{height} -> {image.size[0]}x{image.size[1]}, {output.tell()} bytes.")
+    return output.getvalue(), "image/jpeg"
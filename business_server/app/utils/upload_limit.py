@@ -0,0 +1,71 @@
+import os
+from typing import Iterable
+import logging
+
+from fastapi import HTTPException
+from starlette.responses import JSONResponse
+
+from .image_processing import MAX_UPLOAD_BYTES
+
+# Configure basic logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Allowance on top of MAX_UPLOAD_BYTES for the multipart boundaries and the other form fields
+UPLOAD_MULTIPART_OVERHEAD_BYTES = int(os.getenv("UPLOAD_MULTIPART_OVERHEAD_BYTES", 64 * 1024))
+
+class _BodyTooLarge(HTTPException):
+    # An HTTPException so the app's own handler turns it into a 413 if it surfaces while the form is parsed
+    def __init__(self, max_body_bytes: int):
+        super().__init__(status_code=413, detail=f"Request body is too large (limit {max_body_bytes} bytes).")
+
+class UploadSizeLimitMiddleware:
+    """
+    ASGI middleware that rejects oversized upload bodies with 413 before they are parsed.
+    A declared Content-Length is checked up front. Chunked bodies are counted as they stream in,
+    and the request is aborted as soon as the limit is passed. Only the given path suffixes are limited.
+    """
+    def __init__(self, app, paths: Iterable[str], max_body_bytes: int = MAX_UPLOAD_BYTES + UPLOAD_MULTIPART_OVERHEAD_BYTES):
+        self.app = app
+        self.paths = tuple(paths)
+        self.max_body_bytes = max_body_bytes
+
+    def _reject(self):
+        message = f"Request body is too large (limit {self.max_body_bytes} bytes)."
+        return JSONResponse(status_code=413, content={"success": False, "message": message, "error_info": message})
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].endswith(self.paths):
+            await self.app(scope, receive, send)
+            return
+
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > self.max_body_bytes:
+            logger.warning(f"Rejected upload to {scope['path']}: Content-Length {int(content_length)} exceeds {self.max_body_bytes}.")
+            await self._reject()(scope, receive, send)
+            return
+
+        received = 0
+        response_started = False
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body_bytes:
+                    raise _BodyTooLarge(self.max_body_bytes)
+            return message
+
+        async def tracking_send(message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, tracking_send)
+        except _BodyTooLarge:
+            logger.warning(f"Aborted upload to {scope['path']}: body exceeded {self.max_body_bytes} bytes while streaming.")
+            if not response_started:
+                await self._reject()(scope, receive, send)
@@ -0,0 +1,116 @@
+import asyncio
+import os
+from typing import List, Optional, Tuple
+
+from PIL import Image
+
+from .model_handler import ImageCaptioningHandler, captioning_handler
+from .inference_executor import InferenceExecutor, InferenceQueueFull, inference_executor
+
+CAPTION_MAX_BATCH_SIZE = int(os.environ.get("CAPTION_MAX_BATCH_SIZE", 8))
+CAPTION_BATCH_WINDOW_MS = float(os.environ.get("CAPTION_BATCH_WINDOW_MS", 10))
+
+class CaptionBatcher:
+    """
+    Gathers concurrent caption requests and runs them through the pipeline as a single batch.
+    A batch is flushed once it holds max_batch_size images or window_ms after its first image arrived.
+    Batches run on the inference executor; one collector per executor worker keeps every worker busy.
+    """
+    def __init__(self, handler: ImageCaptioningHandler, executor: InferenceExecutor, max_batch_size: int, window_ms: float):
+        self.handler = handler
+        self.executor = executor
+        self.max_batch_size = max(1, max_batch_size)
+        self.window_seconds = max(0.0, window_ms) / 1000.0
+        self._pending: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+
+    async def start(self):
+        if not self._tasks:
+            self._pending = asyncio.Queue()
+            self._tasks = [asyncio.create_task(self._run()) for _ in range(self.executor.workers)]
+            print(f"Caption batcher started (max_batch_size={self.max_batch_size}, window={self.window_seconds * 1000:.0f}ms, collectors={len(self._tasks)}).")
+
+    async def stop(self):
+        if not self._tasks:
+            return
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        # Anything still waiting would otherwise hang forever
+        while not self._pending.empty():
+            _, future = self._pending.get_nowait()
+            if not future.done():
+                future.set_result("Error: Server is shutting down.")
+
+    async def caption(self, image_bytes: bytes) -> str:
+        """
+        Decodes one image and waits for its caption from the next batch.
+        Decode failures are returned right away and never reach the pipeline.
+        """
+        return (await self.caption_many([image_bytes]))[0]
+
+    @property
+    def pending_count(self) -> int:
+        return self._pending.qsize() if self._pending is not None else 0
+
+    async def caption_many(self, images_bytes: List[bytes]) -> List[str]:
+        """
+        Raises InferenceQueueFull when the pending images would exceed the executor's max_queue.
+        """
+        await self.start()
+        if self.pending_count + len(images_bytes) > self.executor.max_queue * self.max_batch_size:
+            raise InferenceQueueFull(f"Caption queue is full ({self.pending_count} images pending).")
+        loop = asyncio.get_running_loop()
+        results: List[Optional[str]] = [None] * len(images_bytes)
+        futures = []
+        for index, image_bytes in enumerate(images_bytes):
+            try:
+                # Decoding is CPU work as well; keep it off the event loop
+                image = await loop.run_in_executor(None, self.handler.decode_image, image_bytes)
+            except Exception as e:
+                print(f"Error decoding image for captioning: {e}")
+                results[index] = f"Error processing image: {str(e)}"
+                continue
+            future = loop.create_future()
+            self._pending.put_nowait((image, future))
+            futures.append((index, future))
+        for index, future in futures:
+            results[index] = await future
+        return results
+
+    async def _collect_batch(self) -> List[Tuple[Image.Image, asyncio.Future]]:
+        loop = asyncio.get_running_loop()
+        batch = [await self._pending.get()]
+        deadline = loop.time() + self.window_seconds
+        while len(batch) < self.max_batch_size:
+            if not self._pending.empty():
+                batch.append(self._pending.get_nowait())
+                continue
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._pending.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect_batch()
+            # Requests whose client went away are dropped before inference
+            batch = [(image, future) for image, future in batch if not future.done()]
+            if not batch:
+                continue
+            images = [image for image, _ in batch]
+            try:
+                captions = await self.executor.run(self.handler.caption_images, images)
+            except Exception as e:
+                print(f"Error during batched image captioning ({len(images)} images): {e}")
+                captions = [f"Error processing image: {str(e)}"] * len(batch)
+            for (_, future), caption in zip(batch, captions):
+                if not future.done():
+                    future.set_result(caption)
+
+caption_batcher = CaptionBatcher(captioning_handler, inference_executor, CAPTION_MAX_BATCH_SIZE, CAPTION_BATCH_WINDOW_MS)
@@ -0,0 +1,46 @@
+from fastapi import HTTPException, Request
+from fastapi.responses import JSONResponse, Response
+from typing import Any, Tuple
+from urllib.parse import unquote
+import os
+
+import msgpack
+
+# Raw-body ("/raw") endpoints: the request body is the payload itself, metadata travels in headers,
+# and the reply is msgpack when the client accepts it (JSON otherwise). No multipart parsing or temp files.
+MSGPACK_MEDIA_TYPE = "application/x-msgpack"
+MAX_RAW_BODY_BYTES = int(os.environ.get("MAX_RAW_BODY_BYTES", 32 * 1024 * 1024))
+
+def _check_length(request: Request):
+    length = request.headers.get("content-length")
+    if length is not None and length.isdigit() and int(length) > MAX_RAW_BODY_BYTES:
+        raise HTTPException(status_code=413, detail=f"Body exceeds {MAX_RAW_BODY_BYTES} bytes.")
+
+async def read_raw_image(request: Request) -> Tuple[bytes, str, str]:
+    """
+    Body: the image bytes (Content-Type: application/octet-stream or image/*).
+    Headers: X-Filename (percent-encoded), X-Content-Type (the image's own type).
+    Returns: (image_bytes, filename, image_content_type)
+    """
+    _check_length(request)
+    content_type = request.headers.get("x-content-type") or request.headers.get("content-type", "application/octet-stream")
+    if not (content_type.startswith("image/") or content_type == "application/octet-stream"):
+        raise HTTPException(status_code=415, detail=f"Unsupported file type: {content_type}. Please upload an image.")
+    image_bytes = await request.body()
+    if not image_bytes:
+        raise HTTPException(status_code=400, detail="No image data received.")
+    return image_bytes, unquote(request.headers.get("x-filename", "image")), content_type
+
+async def read_msgpack(request: Request) -> Any:
+    _check_length(request)
+    if request.headers.get("content-type", "").split(";")[0].strip() != MSGPACK_MEDIA_TYPE:
+        raise HTTPException(status_code=415, detail=f"Expected a {MSGPACK_MEDIA_TYPE} body.")
+    try:
+        return msgpack.unpackb(await request.body(), raw=False)
+    except (ValueError, msgpack.UnpackException) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid msgpack body: {e}")
+
+def encode_response(request: Request, content: Any) -> Response:
+    if MSGPACK_MEDIA_TYPE in request.headers.get("accept", ""):
+        return Response(content=msgpack.packb(content, use_bin_type=True), media_type=MSGPACK_MEDIA_TYPE)
+    return JSONResponse(content=content)
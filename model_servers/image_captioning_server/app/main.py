@@ -1,8 +1,14 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, File, UploadFile, HTTPException, Request
+from fastapi.responses import JSONResponse, Response
+import asyncio
 import os
+from typing import List, Optional
 
 from .model_handler import captioning_handler
+from .batching import caption_batcher
+from .inference_executor import inference_executor, InferenceQueueFull
+from .metrics import record_timing, render_metrics
+from .binary_transport import read_raw_image, encode_response
 
 app = FastAPI(
     title="Image Captioning Server",
@@ -12,47 +18,161 @@ app = FastAPI(
 
 DEBUG_MODE = os.environ.get("DEBUG_MODE", "False").lower() == "true"
 
-@app.on_event("startup")
-async def startup_event():
+# Decode and inference timings from the handler feed the /metrics histograms
+captioning_handler.timing_hook = record_timing
+
+# Seconds a client is told to wait (Retry-After) while the model is still loading
+READY_RETRY_AFTER_SECONDS = 5
+
+_model_loader: Optional[asyncio.Task] = None
+
+async def load_model():
+    """
+    Loads and warms up the model on the inference thread, so the server accepts connections
+    (and answers /health, /ready with 503) while the weights are loading.
+    """
+    await inference_executor.run(captioning_handler.load)
     if captioning_handler.captioner is None:
         print("Model could not be loaded at startup. Captioning endpoint will fail.")
-    else:
+        return
+    await inference_executor.run(captioning_handler.warm_up)
+    if captioning_handler.is_ready:
+        await caption_batcher.start()
         print("Image Captioning Server started. Model is ready.")
 
+def require_ready():
+    if not captioning_handler.is_ready:
+        detail = "Model is not available. Please check server logs." if captioning_handler.state == "failed" else "Model is still loading."
+        raise HTTPException(status_code=503, detail=detail, headers={"Retry-After": str(READY_RETRY_AFTER_SECONDS)})
+
+@app.on_event("startup")
+async def startup_event():
+    global _model_loader
+    _model_loader = asyncio.create_task(load_model())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    if _model_loader is not None:
+        _model_loader.cancel()
+    await caption_batcher.stop()
+    inference_executor.shutdown()
+
 @app.post("/caption/", summary="Generate a caption for an image")
 async def generate_caption(file: UploadFile = File(...) ):
     """
     Receives an image file and returns a generated caption.
+    Concurrent requests are batched together before they reach the model.
     """
-    if captioning_handler.captioner is None:
-        raise HTTPException(status_code=503, detail="Model is not available. Please check server logs.")
+    require_ready()
 
     try:
         image_bytes = await file.read()
         if not image_bytes:
             raise HTTPException(status_code=400, detail="No image data received.")
-        
+
         if not file.content_type.startswith("image/"):
             raise HTTPException(status_code=400, detail=f"Unsupported file type: {file.content_type}. Please upload an image.")
 
-        caption = await captioning_handler.get_caption(image_bytes)
-        
-        if caption.startswith("Error:"):
+        caption = await caption_batcher.caption(image_bytes)
+
+        if caption.startswith("Error"):
              raise HTTPException(status_code=500, detail=caption)
         return JSONResponse(content={"filename": file.filename, "caption": caption})
-    except HTTPException as e: 
+    except HTTPException as e:
         raise e
+    except InferenceQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         print(f"Unexpected error in /caption/ endpoint: {e}")
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}")
 
+@app.post("/caption/raw", summary="Generate a caption for an image sent as the raw request body")
+async def generate_caption_raw(request: Request):
+    """
+    Same as /caption/ without multipart: the body is the image, the file name is in X-Filename.
+    Replies with msgpack when the client accepts application/x-msgpack.
+    """
+    require_ready()
+
+    image_bytes, filename, _ = await read_raw_image(request)
+    try:
+        caption = await caption_batcher.caption(image_bytes)
+    except InferenceQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        print(f"Unexpected error in /caption/raw endpoint: {e}")
+        raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}")
+    if caption.startswith("Error"):
+        raise HTTPException(status_code=500, detail=caption)
+    return encode_response(request, {"filename": filename, "caption": caption})
+
+@app.post("/caption/batch", summary="Generate captions for several images in one call")
+async def generate_captions_batch(files: List[UploadFile] = File(...)):
+    """
+    Receives several image files and returns one result per file, in order.
+    A failed image is reported in its own result and does not fail the rest of the batch.
+    """
+    require_ready()
+
+    try:
+        images_bytes = []
+        for file in files:
+            if not file.content_type.startswith("image/"):
+                raise HTTPException(status_code=400, detail=f"Unsupported file type for {file.filename}: {file.content_type}. Please upload images only.")
+            image_bytes = await file.read()
+            if not image_bytes:
+                raise HTTPException(status_code=400, detail=f"No image data received for {file.filename}.")
+            images_bytes.append(image_bytes)
+
+        captions = await caption_batcher.caption_many(images_bytes)
+
+        results = []
+        for file, caption in zip(files, captions):
+            if caption.startswith("Error"):
+                results.append({"filename": file.filename, "caption": None, "error": caption})
+            else:
+                results.append({"filename": file.filename, "caption": caption})
+        return JSONResponse(content={"results": results})
+    except HTTPException as e:
+        raise e
+    except InferenceQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        print(f"Unexpected error in /caption/batch endpoint: {e}")
+        raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}")
+
 @app.get("/health", summary="Health check endpoint")
 async def health_check():
     """
-    Simple health check endpoint.
+    Liveness check; answers as soon as the process is up. Use /ready to know whether requests can be served.
     """
-    return {"status": "ok", "model_loaded": captioning_handler.captioner is not None}
+    return {
+        "status": "ok",
+        "model_loaded": captioning_handler.captioner is not None,
+        "model_state": captioning_handler.state,
+        "backend": captioning_handler.backend,
+        "pending_images": caption_batcher.pending_count,
+        "inference": inference_executor.get_status()
+    }
+
+@app.get("/ready", summary="Readiness check endpoint")
+async def readiness_check():
+    """
+    200 once the model is loaded and warmed up, 503 before that (or if loading failed).
+    """
+    if captioning_handler.is_ready:
+        return {"ready": True, "backend": captioning_handler.backend}
+    return JSONResponse(
+        status_code=503,
+        content={"ready": False, "state": captioning_handler.state},
+        headers={"Retry-After": str(READY_RETRY_AFTER_SECONDS)}
+    )
+
+@app.get("/metrics", summary="Prometheus metrics", include_in_schema=False)
+async def metrics():
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000) 
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=8000)
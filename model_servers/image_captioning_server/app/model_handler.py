@@ -1,28 +1,167 @@
-from transformers import pipeline
+from transformers import pipeline, AutoImageProcessor, AutoModelForVision2Seq, AutoTokenizer
 from PIL import Image
+from typing import Callable, List, Optional
 import io
+import os
+import time
+import torch
+
+CAPTION_MODEL = os.environ.get("CAPTION_MODEL", "nlpconnect/vit-gpt2-image-captioning")
+# Inference backend: "torch" (fp32), "int8" (dynamic int8 quantization of the linear layers) or "onnx" (ONNX Runtime)
+CAPTION_BACKEND = os.environ.get("CAPTION_BACKEND", "torch").strip().lower()
+# Directory written by scripts/export_onnx.py; when it does not exist the ONNX graph is exported at startup
+CAPTION_ONNX_DIR = os.environ.get("CAPTION_ONNX_DIR", "")
+CAPTION_BACKENDS = ("torch", "int8", "onnx")
+# Dummy inferences run after loading, so the first real request does not pay for lazy kernel initialization
+MODEL_WARMUP_RUNS = int(os.environ.get("MODEL_WARMUP_RUNS", 2))
+
+def _from_cache_first(loader: Callable, model_id: str, **kwargs):
+    """
+    Loads from the local Hugging Face cache without any hub request; only a cache miss goes to the network.
+    """
+    try:
+        return loader(model_id, local_files_only=True, **kwargs)
+    except OSError:
+        return loader(model_id, **kwargs)
+
+def _conv1d_to_linear(module: torch.nn.Module) -> int:
+    """
+    GPT-2 keeps its attention/MLP projections in transformers' Conv1D, which dynamic quantization skips.
+    Swaps every Conv1D for an equivalent nn.Linear (transposed weight) so the decoder gets quantized too.
+    Returns the number of replaced layers.
+    """
+    from transformers.pytorch_utils import Conv1D
+
+    replaced = 0
+    for name, child in module.named_children():
+        if isinstance(child, Conv1D):
+            in_features, out_features = child.weight.shape
+            linear = torch.nn.Linear(in_features, out_features)
+            linear.weight = torch.nn.Parameter(child.weight.detach().t().contiguous())
+            linear.bias = torch.nn.Parameter(child.bias.detach().clone())
+            setattr(module, name, linear)
+            replaced += 1
+        else:
+            replaced += _conv1d_to_linear(child)
+    return replaced
 
 class ImageCaptioningHandler:
-    def __init__(self):
-        # Load the model
+    """
+    The model is not loaded on construction: the server calls load() and warm_up() in the background
+    and only reports ready (state "ready") once both finished.
+    """
+    def __init__(self, backend: str = CAPTION_BACKEND):
+        # Optional callback(phase, seconds, batch_size) used by the server to record "decode"/"inference" timings
+        self.timing_hook: Optional[Callable[[str, float, int], None]] = None
+        if backend not in CAPTION_BACKENDS:
+            print(f"Unknown CAPTION_BACKEND '{backend}', using 'torch'.")
+            backend = "torch"
+        self.backend = backend
+        self.captioner = None
+        # not_loaded -> loading -> warming_up -> ready, or failed
+        self.state = "not_loaded"
+
+    @property
+    def is_ready(self) -> bool:
+        return self.state == "ready"
+
+    def load(self):
+        self.state = "loading"
+        started = time.perf_counter()
         try:
-            self.captioner = pipeline("image-to-text", model="nlpconnect/vit-gpt2-image-captioning", device=-1)
-            print("Image captioning model loaded successfully.")
+            self.captioner = self._load(self.backend)
+            self.state = "warming_up"
+            print(f"Image captioning model loaded successfully in {time.perf_counter() - started:.1f}s (backend={self.backend}).")
         except Exception as e:
             print(f"Error loading image captioning model: {e}")
             self.captioner = None
+            self.state = "failed"
+
+    def warm_up(self, runs: int = MODEL_WARMUP_RUNS):
+        if self.captioner is None:
+            return
+        try:
+            image = Image.new("RGB", (224, 224), (127, 127, 127))
+            for _ in range(runs):
+                self.caption_images([image])
+            self.state = "ready"
+        except Exception as e:
+            print(f"Image captioning warm-up failed: {e}")
+            self.state = "failed"
+
+    def _load(self, backend: str):
+        if backend == "onnx":
+            try:
+                return self._load_onnx()
+            except Exception as e:
+                # A missing optimum/onnxruntime install or a failed export must not take the server down
+                print(f"ONNX Runtime backend unavailable ({e}); falling back to the PyTorch backend.")
+                self.backend = "torch"
+        # low_cpu_mem_usage skips the random initialization; safetensors weights are memory-mapped by from_pretrained
+        captioner = pipeline(
+            "image-to-text",
+            model=_from_cache_first(AutoModelForVision2Seq.from_pretrained, CAPTION_MODEL, low_cpu_mem_usage=True),
+            tokenizer=_from_cache_first(AutoTokenizer.from_pretrained, CAPTION_MODEL),
+            image_processor=_from_cache_first(AutoImageProcessor.from_pretrained, CAPTION_MODEL),
+            device=-1
+        )
+        if self.backend == "int8":
+            model = captioner.model.eval()
+            converted = _conv1d_to_linear(model)
+            captioner.model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+            print(f"Captioning model quantized to int8 ({converted} GPT-2 Conv1D layers converted to Linear).")
+        return captioner
+
+    def _load_onnx(self):
+        # Optional dependencies: pip install -r requirements-onnx.txt
+        from optimum.onnxruntime import ORTModelForVision2Seq
+
+        exported = bool(CAPTION_ONNX_DIR) and os.path.isdir(CAPTION_ONNX_DIR)
+        source = CAPTION_ONNX_DIR if exported else CAPTION_MODEL
+        # use_cache keeps past key/values between decoding steps instead of re-running the whole prefix
+        model = ORTModelForVision2Seq.from_pretrained(source, export=not exported, use_cache=True)
+        if not exported and CAPTION_ONNX_DIR:
+            model.save_pretrained(CAPTION_ONNX_DIR)
+            print(f"Exported ONNX captioning model to {CAPTION_ONNX_DIR}.")
+        return pipeline(
+            "image-to-text",
+            model=model,
+            tokenizer=_from_cache_first(AutoTokenizer.from_pretrained, source),
+            image_processor=_from_cache_first(AutoImageProcessor.from_pretrained, source),
+            device=-1
+        )
+
+    def _record(self, phase: str, started: float, batch_size: int = 1):
+        if self.timing_hook is not None:
+            self.timing_hook(phase, time.perf_counter() - started, batch_size)
+
+    def decode_image(self, image_bytes: bytes) -> Image.Image:
+        started = time.perf_counter()
+        image = Image.open(io.BytesIO(image_bytes))
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        self._record("decode", started)
+        return image
+
+    def caption_images(self, images: List[Image.Image]) -> List[str]:
+        """
+        Runs one batched pipeline call over already decoded images.
+        Returns one caption per image, in the same order.
+        """
+        started = time.perf_counter()
+        with torch.inference_mode():
+            caption_results = self.captioner(images, batch_size=len(images))
+        self._record("inference", started, len(images))
+        return [result[0]["generated_text"] for result in caption_results]
 
-    async def get_caption(self, image_bytes: bytes) -> str:
+    def get_caption(self, image_bytes: bytes) -> str:
         if not self.captioner:
             return "Error: Model not loaded."
         try:
-            image = Image.open(io.BytesIO(image_bytes))
-            if image.mode != "RGB":
-                image = image.convert("RGB")
-            caption_result = self.captioner(image)
-            return caption_result[0]["generated_text"]
+            image = self.decode_image(image_bytes)
+            return self.caption_images([image])[0]
         except Exception as e:
             print(f"Error during image captioning: {e}")
             return f"Error processing image: {str(e)}"
 
-captioning_handler = ImageCaptioningHandler() 
\ No newline at end of file
+captioning_handler = ImageCaptioningHandler()
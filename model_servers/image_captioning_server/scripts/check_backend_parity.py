@@ -0,0 +1,129 @@
+"""
+Captions the same images with every CAPTION_BACKEND and compares them against the PyTorch fp32 output.
+Each backend runs in its own process so that load time and peak resident memory are measured in isolation.
+
+    python scripts/check_backend_parity.py ../../tests/sample_images --backends torch int8 onnx
+
+Exits with status 1 when a backend's mean word overlap with the torch captions is below --min-overlap.
+"""
+import argparse
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+SERVER_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".gif", ".bmp", ".webp")
+
+def find_images(paths: List[str]) -> List[str]:
+    images = []
+    for path in paths:
+        if os.path.isdir(path):
+            images.extend(
+                os.path.join(path, name) for name in sorted(os.listdir(path))
+                if name.lower().endswith(IMAGE_EXTENSIONS)
+            )
+        else:
+            images.append(path)
+    return images
+
+def run_worker(images: List[str], repeats: int) -> Dict:
+    # CAPTION_BACKEND is already set in the environment by the parent process
+    started = time.perf_counter()
+    sys.path.insert(0, SERVER_DIR)
+    from app.model_handler import captioning_handler
+
+    captioning_handler.load()
+    load_seconds = time.perf_counter() - started
+    if captioning_handler.captioner is None:
+        return {"error": "model not loaded"}
+    captions, latencies = [], []
+    for path in images:
+        with open(path, "rb") as f:
+            image = captioning_handler.decode_image(f.read())
+        captioning_handler.caption_images([image])  # warm-up
+        for _ in range(repeats):
+            started = time.perf_counter()
+            caption = captioning_handler.caption_images([image])[0]
+            latencies.append(time.perf_counter() - started)
+        captions.append(caption)
+    return {
+        "backend": captioning_handler.backend,
+        "load_seconds": load_seconds,
+        "captions": captions,
+        "latencies": latencies,
+        # ru_maxrss is KiB on Linux
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0,
+    }
+
+def word_overlap(a: str, b: str) -> float:
+    words_a, words_b = set(a.lower().split()), set(b.lower().split())
+    if not words_a and not words_b:
+        return 1.0
+    return len(words_a & words_b) / len(words_a | words_b)
+
+def run_backend(backend: str, images: List[str], repeats: int) -> Dict:
+    env = dict(os.environ, CAPTION_BACKEND=backend)
+    command = [sys.executable, os.path.abspath(__file__), "--worker", "--repeats", str(repeats), *images]
+    completed = subprocess.run(command, env=env, cwd=SERVER_DIR, capture_output=True, text=True)
+    lines = completed.stdout.strip().splitlines()
+    if completed.returncode != 0 or not lines:
+        return {"error": completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else "worker failed"}
+    return json.loads(lines[-1])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare captions, latency and memory across captioning backends.")
+    parser.add_argument("images", nargs="+", help="Image files or directories of images.")
+    parser.add_argument("--backends", nargs="+", default=["torch", "int8", "onnx"])
+    parser.add_argument("--repeats", type=int, default=3, help="Timed runs per image (after one warm-up).")
+    parser.add_argument("--min-overlap", type=float, default=0.5, help="Minimum mean word overlap with the torch captions.")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    images = find_images(args.images)
+    if args.worker:
+        print(json.dumps(run_worker(images, args.repeats)))
+        sys.exit(0)
+    if not images:
+        sys.exit("No images found.")
+
+    backends = ["torch"] + [backend for backend in args.backends if backend != "torch"]
+    results = {}
+    for backend in backends:
+        print(f"Running backend '{backend}' on {len(images)} images...")
+        results[backend] = run_backend(backend, images, args.repeats)
+    reference = results["torch"]
+    if "error" in reference:
+        sys.exit(f"torch backend failed: {reference['error']}")
+
+    failed = False
+    print(f"\n{'backend':<8} {'loaded as':<10} {'load s':>7} {'p50 ms':>8} {'mean ms':>8} {'speedup':>8} {'peak MB':>8} {'exact':>6} {'overlap':>8}")
+    reference_mean = statistics.mean(reference["latencies"])
+    for backend in backends:
+        result = results[backend]
+        if "error" in result:
+            print(f"{backend:<8} error: {result['error']}")
+            failed = True
+            continue
+        mean = statistics.mean(result["latencies"])
+        exact = sum(a == b for a, b in zip(result["captions"], reference["captions"])) / len(images)
+        overlap = statistics.mean(word_overlap(a, b) for a, b in zip(result["captions"], reference["captions"]))
+        failed = failed or overlap < args.min_overlap
+        print(f"{backend:<8} {result['backend']:<10} {result['load_seconds']:>7.1f} {statistics.median(result['latencies']) * 1000:>8.1f} "
+              f"{mean * 1000:>8.1f} {reference_mean / mean:>7.2f}x {result['peak_rss_mb']:>8.0f} {exact:>6.0%} {overlap:>8.2f}")
+
+    print("\nCaptions that differ from torch:")
+    for index, path in enumerate(images):
+        differing = {
+            backend: results[backend]["captions"][index] for backend in backends[1:]
+            if "error" not in results[backend] and results[backend]["captions"][index] != reference["captions"][index]
+        }
+        if differing:
+            print(f"  {os.path.basename(path)}\n    torch: {reference['captions'][index]}")
+            for backend, caption in differing.items():
+                print(f"    {backend}: {caption}")
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,27 @@
+"""
+Exports the captioning model to an ONNX Runtime encoder-decoder graph (with KV cache) for CAPTION_BACKEND=onnx.
+
+    python scripts/export_onnx.py --output /models/caption-onnx
+    CAPTION_BACKEND=onnx CAPTION_ONNX_DIR=/models/caption-onnx uvicorn app.main:app
+
+Requires the optional dependencies in requirements-onnx.txt.
+"""
+import argparse
+import os
+
+from optimum.onnxruntime import ORTModelForVision2Seq
+from transformers import AutoImageProcessor, AutoTokenizer
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the image captioning model to ONNX.")
+    parser.add_argument("--model", default=os.environ.get("CAPTION_MODEL", "nlpconnect/vit-gpt2-image-captioning"))
+    parser.add_argument("--output", required=True, help="Directory to write the ONNX graphs, tokenizer and image processor to.")
+    args = parser.parse_args()
+
+    model = ORTModelForVision2Seq.from_pretrained(args.model, export=True, use_cache=True)
+    model.save_pretrained(args.output)
+    AutoTokenizer.from_pretrained(args.model).save_pretrained(args.output)
+    AutoImageProcessor.from_pretrained(args.model).save_pretrained(args.output)
+    print(f"Exported {args.model} to {args.output}:")
+    for name in sorted(os.listdir(args.output)):
+        print(f"  {name}")
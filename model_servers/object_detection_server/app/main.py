@@ -1,8 +1,13 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, File, UploadFile, HTTPException, Request
+from fastapi.responses import JSONResponse, Response
+import asyncio
 import os
+from typing import List, Optional
 
 from .model_handler import object_detection_handler
+from .inference_executor import inference_executor, InferenceQueueFull
+from .metrics import record_timing, render_metrics
+from .binary_transport import read_raw_image, encode_response
 
 app = FastAPI(
     title="Object Detection Server",
@@ -11,21 +16,51 @@ app = FastAPI(
 )
 
 DEBUG_MODE = os.environ.get("DEBUG_MODE", "False").lower() == "true"
+DETECTION_MAX_BATCH_SIZE = int(os.environ.get("DETECTION_MAX_BATCH_SIZE", 16))
 
-@app.on_event("startup")
-async def startup_event():
+# Decode and inference timings from the handler feed the /metrics histograms
+object_detection_handler.timing_hook = record_timing
+
+# Seconds a client is told to wait (Retry-After) while the model is still loading
+READY_RETRY_AFTER_SECONDS = 5
+
+_model_loader: Optional[asyncio.Task] = None
+
+async def load_model():
+    """
+    Loads and warms up the model on the inference thread, so the server accepts connections
+    (and answers /health, /ready with 503) while the weights are loading.
+    """
+    await inference_executor.run(object_detection_handler.load)
     if object_detection_handler.model is None:
         print("Model could not be loaded at startup. Detection endpoint will fail.")
-    else:
+        return
+    await inference_executor.run(object_detection_handler.warm_up)
+    if object_detection_handler.is_ready:
         print("Object Detection Server started. Model is ready.")
 
+def require_ready():
+    if not object_detection_handler.is_ready:
+        detail = "Model is not available. Please check server logs." if object_detection_handler.state == "failed" else "Model is still loading."
+        raise HTTPException(status_code=503, detail=detail, headers={"Retry-After": str(READY_RETRY_AFTER_SECONDS)})
+
+@app.on_event("startup")
+async def startup_event():
+    global _model_loader
+    _model_loader = asyncio.create_task(load_model())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    if _model_loader is not None:
+        _model_loader.cancel()
+    inference_executor.shutdown()
+
 @app.post("/detect/", summary="Detect objects in an image")
 async def run_object_detection(file: UploadFile = File(...) ):
     """
     Receives an image file and returns detected objects with their scores and bounding boxes.
     """
-    if object_detection_handler.model is None:
-        raise HTTPException(status_code=503, detail="Model is not available. Please check server logs.")
+    require_ready()
 
     try:
         image_bytes = await file.read()
@@ -35,7 +70,7 @@ async def run_object_detection(file: UploadFile = File(...) ):
         if not file.content_type.startswith("image/"):
             raise HTTPException(status_code=400, detail=f"Unsupported file type: {file.content_type}. Please upload an image.")
 
-        detected_objects = await object_detection_handler.detect_objects(image_bytes)
+        detected_objects = await inference_executor.run(object_detection_handler.detect_objects, image_bytes)
         
         if detected_objects and isinstance(detected_objects[0], dict) and detected_objects[0].get("error"):
             raise HTTPException(status_code=500, detail=detected_objects[0]["error"])
@@ -43,13 +78,97 @@ async def run_object_detection(file: UploadFile = File(...) ):
         return JSONResponse(content={"filename": file.filename, "objects": detected_objects})
     except HTTPException as e:
         raise e
+    except InferenceQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         print(f"Unexpected error in /detect/ endpoint: {e}")
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}")
 
+@app.post("/detect/raw", summary="Detect objects in an image sent as the raw request body")
+async def run_object_detection_raw(request: Request):
+    """
+    Same as /detect/ without multipart: the body is the image, the file name is in X-Filename.
+    Replies with msgpack when the client accepts application/x-msgpack.
+    """
+    require_ready()
+
+    image_bytes, filename, _ = await read_raw_image(request)
+    try:
+        detected_objects = await inference_executor.run(object_detection_handler.detect_objects, image_bytes)
+    except InferenceQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        print(f"Unexpected error in /detect/raw endpoint: {e}")
+        raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}")
+    if detected_objects and isinstance(detected_objects[0], dict) and detected_objects[0].get("error"):
+        raise HTTPException(status_code=500, detail=detected_objects[0]["error"])
+    return encode_response(request, {"filename": filename, "objects": detected_objects})
+
+@app.post("/detect/batch", summary="Detect objects in several images in one forward pass")
+async def run_object_detection_batch(files: List[UploadFile] = File(...)):
+    """
+    Receives several image files and returns detected objects for each file, in order.
+    A failed image is reported in its own result and does not fail the rest of the batch.
+    """
+    require_ready()
+
+    try:
+        images_bytes = []
+        for file in files:
+            if not file.content_type.startswith("image/"):
+                raise HTTPException(status_code=400, detail=f"Unsupported file type for {file.filename}: {file.content_type}. Please upload images only.")
+            image_bytes = await file.read()
+            if not image_bytes:
+                raise HTTPException(status_code=400, detail=f"No image data received for {file.filename}.")
+            images_bytes.append(image_bytes)
+
+        batch_objects = await inference_executor.run(object_detection_handler.detect_objects_batch, images_bytes, max_batch_size=DETECTION_MAX_BATCH_SIZE)
+
+        results = []
+        for file, detected_objects in zip(files, batch_objects):
+            if detected_objects and isinstance(detected_objects[0], dict) and detected_objects[0].get("error"):
+                results.append({"filename": file.filename, "objects": [], "error": detected_objects[0]["error"]})
+            else:
+                results.append({"filename": file.filename, "objects": detected_objects})
+        return JSONResponse(content={"results": results})
+    except HTTPException as e:
+        raise e
+    except InferenceQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        print(f"Unexpected error in /detect/batch endpoint: {e}")
+        raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}")
+
 @app.get("/health", summary="Health check endpoint")
 async def health_check():
-    return {"status": "ok", "model_loaded": object_detection_handler.model is not None}
+    """
+    Liveness check; answers as soon as the process is up. Use /ready to know whether requests can be served.
+    """
+    return {
+        "status": "ok",
+        "model_loaded": object_detection_handler.model is not None,
+        "model_state": object_detection_handler.state,
+        "backend": object_detection_handler.backend,
+        "inference": inference_executor.get_status()
+    }
+
+@app.get("/ready", summary="Readiness check endpoint")
+async def readiness_check():
+    """
+    200 once the model is loaded and warmed up, 503 before that (or if loading failed).
+    """
+    if object_detection_handler.is_ready:
+        return {"ready": True, "backend": object_detection_handler.backend}
+    return JSONResponse(
+        status_code=503,
+        content={"ready": False, "state": object_detection_handler.state},
+        headers={"Retry-After": str(READY_RETRY_AFTER_SECONDS)}
+    )
+
+@app.get("/metrics", summary="Prometheus metrics", include_in_schema=False)
+async def metrics():
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,37 @@
+from prometheus_client import Gauge, Histogram, CONTENT_TYPE_LATEST, generate_latest
+
+from .inference_executor import inference_executor
+
+# Seconds; CPU inference of a batch can take several seconds
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+
+DECODE_SECONDS = Histogram(
+    "model_decode_seconds", "Time spent decoding one input before inference.", buckets=LATENCY_BUCKETS
+)
+INFERENCE_SECONDS = Histogram(
+    "model_inference_seconds", "Time spent in one model call (one batch).", buckets=LATENCY_BUCKETS
+)
+BATCH_SIZE = Histogram(
+    "model_batch_size", "Inputs per model call.", buckets=BATCH_SIZE_BUCKETS
+)
+INFERENCE_QUEUED = Gauge("inference_queued", "Calls waiting for an inference worker.")
+INFERENCE_IN_FLIGHT = Gauge("inference_in_flight", "Calls currently running on an inference worker.")
+INFERENCE_QUEUED.set_function(lambda: inference_executor.queued)
+INFERENCE_IN_FLIGHT.set_function(lambda: inference_executor.in_flight)
+
+def record_timing(phase: str, seconds: float, batch_size: int = 1):
+    """
+    Timing hook for the model handler. phase is "decode" or "inference".
+    """
+    if phase == "decode":
+        DECODE_SECONDS.observe(seconds)
+    elif phase == "inference":
+        INFERENCE_SECONDS.observe(seconds)
+        BATCH_SIZE.observe(batch_size)
+
+def render_metrics():
+    """
+    Returns: (body, content_type) in the Prometheus text exposition format.
+    """
+    return generate_latest(), CONTENT_TYPE_LATEST
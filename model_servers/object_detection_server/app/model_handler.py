@@ -1,52 +1,255 @@
 from ultralytics import YOLO
+import ultralytics
 from PIL import Image
+from typing import Callable, Dict, List, Optional
+from datetime import datetime, timezone
+import hashlib
 import io
+import json
 import numpy as np
 import os
+import shutil
+import time
+
+# yolov12n.pt 가중치 파일이 컨테이너 내부에 있어야 한다. 그리고 ultralytics에서 제공하는 모델이 아닌 yolov12 기텁에서 제공하는 모델을 사용
+DETECTION_WEIGHTS = os.environ.get("DETECTION_WEIGHTS", os.path.join(os.path.dirname(__file__), "yolov12n.pt"))
+# "pytorch" (eager .pt weights), "onnx" or "openvino" (artifacts written by scripts/export_model.py)
+DETECTION_BACKEND = os.environ.get("DETECTION_BACKEND", "pytorch").strip().lower()
+DETECTION_EXPORT_DIR = os.environ.get("DETECTION_EXPORT_DIR", os.path.join(os.path.dirname(__file__), "exports"))
+DETECTION_BACKENDS = ("pytorch", "onnx", "openvino")
+# Dummy inferences run after loading, so the first real request does not pay for lazy kernel/graph initialization
+MODEL_WARMUP_RUNS = int(os.environ.get("MODEL_WARMUP_RUNS", 2))
+
+def _sha256_path(path: str) -> str:
+    """
+    SHA-256 of a file, or of every file in a directory (relative names and contents, in sorted order).
+    """
+    digest = hashlib.sha256()
+    if os.path.isdir(path):
+        files = sorted(
+            os.path.relpath(os.path.join(root, name), path)
+            for root, _, names in os.walk(path) for name in names
+        )
+    else:
+        files = [""]
+    for relative in files:
+        if relative:
+            digest.update(relative.encode("utf-8"))
+        with open(os.path.join(path, relative) if relative else path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+    return digest.hexdigest()
+
+def _manifest_path(export_dir: str, backend: str) -> str:
+    return os.path.join(export_dir, f"{backend}.json")
 
 class ObjectDetectionHandler:
-    def __init__(self):
+    """
+    The model is not loaded on construction: the server calls load() and warm_up() in the background
+    and only reports ready (state "ready") once both finished.
+    """
+    def __init__(self, backend: str = DETECTION_BACKEND, weights_path: str = DETECTION_WEIGHTS, export_dir: str = DETECTION_EXPORT_DIR):
+        # Optional callback(phase, seconds, batch_size) used by the server to record "decode"/"inference" timings
+        self.timing_hook: Optional[Callable[[str, float, int], None]] = None
+        self.weights_path = weights_path
+        self.export_dir = export_dir
+        self.requested_backend = backend
+        self.backend = "pytorch"
+        # Extra predict() arguments; exported graphs are run at the image size they were exported with
+        self.predict_args: Dict = {"device": "cpu"}
+        self.model = None
+        # not_loaded -> loading -> warming_up -> ready, or failed
+        self.state = "not_loaded"
+
+    @property
+    def is_ready(self) -> bool:
+        return self.state == "ready"
+
+    def load(self):
+        self.state = "loading"
+        backend = self.requested_backend
+        if backend not in DETECTION_BACKENDS:
+            print(f"Unknown DETECTION_BACKEND '{backend}', using 'pytorch'.")
+        elif backend != "pytorch":
+            try:
+                self._load_exported(backend)
+            except Exception as e:
+                print(f"Exported {backend} model not used ({e}); falling back to {os.path.basename(self.weights_path)}.")
+                self.model = None
+        if self.model is None:
+            try:
+                self.model = YOLO(self.weights_path)
+                self.backend = "pytorch"
+                self.predict_args = {"device": "cpu"}
+                print(f"YOLOv12 model ({os.path.basename(self.weights_path)}) loaded successfully.")
+            except Exception as e:
+                print(f"Error loading YOLOv12 model: {e}")
+                self.model = None
+        self.state = "warming_up" if self.model is not None else "failed"
+
+    def warm_up(self, runs: int = MODEL_WARMUP_RUNS):
+        if self.model is None:
+            return
         try:
-            # yolov12n.pt 가중치 파일이 컨테이너 내부에 있어야 한다. 그리고 ultralytics에서 제공하는 모델이 아닌 yolov12 기텁에서 제공하는 모델을 사용
-            model_path = os.path.join(os.path.dirname(__file__), "yolov12n.pt")
-            self.model = YOLO(model_path)
-            print("YOLOv12 model (yolov12n.pt) loaded successfully.")
+            image_np = np.zeros((480, 640, 3), dtype=np.uint8)
+            for _ in range(runs):
+                self.detect_images([image_np])
+            self.state = "ready"
         except Exception as e:
-            print(f"Error loading YOLOv12 model: {e}")
-            self.model = None
+            print(f"YOLOv12 warm-up failed: {e}")
+            self.state = "failed"
+
+    def _load_exported(self, backend: str):
+        """
+        Loads the artifact described by <export_dir>/<backend>.json.
+        Raises ValueError when the manifest is missing or the artifact was not exported from the current weights,
+        so a stale export is never served after the .pt file changes.
+        """
+        manifest_path = _manifest_path(self.export_dir, backend)
+        if not os.path.exists(manifest_path):
+            raise ValueError(f"no export manifest at {manifest_path}")
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        source_sha256 = _sha256_path(self.weights_path)
+        if manifest.get("source_sha256") != source_sha256:
+            raise ValueError(f"exported from different weights (sha256 {manifest.get('source_sha256', '?')[:12]}, current {source_sha256[:12]})")
+        artifact = os.path.join(self.export_dir, manifest["artifact"])
+        if not os.path.exists(artifact):
+            raise ValueError(f"artifact {artifact} is missing")
+        if manifest.get("artifact_sha256") != _sha256_path(artifact):
+            raise ValueError(f"artifact {artifact} does not match its manifest (partial copy or re-export?)")
+        self.model = YOLO(artifact, task="detect")
+        self.backend = backend
+        self.predict_args = {"device": "cpu", "imgsz": manifest.get("imgsz", 640)}
+        print(f"YOLOv12 {backend}{' int8' if manifest.get('int8') else ''} model ({manifest['artifact']}) loaded successfully.")
+
+    def export(self, backend: str, imgsz: int = 640, int8: bool = False, data: Optional[str] = None) -> str:
+        """
+        Exports the .pt weights to an ONNX or OpenVINO artifact in export_dir and writes its manifest.
+        int8 is only supported for OpenVINO (post-training quantization calibrated on `data`).
+        Returns the manifest path.
+        """
+        if backend not in ("onnx", "openvino"):
+            raise ValueError(f"Cannot export to '{backend}' (use onnx or openvino).")
+        if int8 and backend != "openvino":
+            raise ValueError("int8 export is only supported for openvino.")
+        export_args = {"format": backend, "imgsz": imgsz, "dynamic": True, "int8": int8}
+        if int8 and data:
+            export_args["data"] = data
+        # Export from a fresh model so the serving model (possibly an exported one) is not touched
+        exported = YOLO(self.weights_path).export(**export_args)
+
+        os.makedirs(self.export_dir, exist_ok=True)
+        artifact_name = os.path.basename(os.path.normpath(exported))
+        target = os.path.join(self.export_dir, artifact_name)
+        if os.path.abspath(exported) != os.path.abspath(target):
+            if os.path.isdir(target):
+                shutil.rmtree(target)
+            elif os.path.exists(target):
+                os.remove(target)
+            shutil.move(exported, target)
 
-    async def detect_objects(self, image_bytes: bytes) -> list:
+        manifest = {
+            "format": backend,
+            "artifact": artifact_name,
+            "int8": int8,
+            "imgsz": imgsz,
+            "source_weights": os.path.basename(self.weights_path),
+            "source_sha256": _sha256_path(self.weights_path),
+            "artifact_sha256": _sha256_path(target),
+            "ultralytics_version": ultralytics.__version__,
+            "exported_at": datetime.now(timezone.utc).isoformat(),
+        }
+        manifest_path = _manifest_path(self.export_dir, backend)
+        # Write-then-rename so a crashed export never leaves a half-written manifest behind
+        with open(manifest_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(manifest_path + ".tmp", manifest_path)
+        return manifest_path
+
+    def _record(self, phase: str, started: float, batch_size: int = 1):
+        if self.timing_hook is not None:
+            self.timing_hook(phase, time.perf_counter() - started, batch_size)
+
+    def decode_image(self, image_bytes: bytes) -> np.ndarray:
+        started = time.perf_counter()
+        image = Image.open(io.BytesIO(image_bytes))
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        image_np = np.array(image)
+        self._record("decode", started)
+        return image_np
+
+    def extract_objects(self, result) -> list:
+        """
+        Builds the response objects for one ultralytics result (same schema for every backend).
+        Box, score and class tensors are converted to NumPy once instead of per box.
+        """
+        boxes = result.boxes
+        if boxes is None or len(boxes) == 0:
+            return []
+        # results[0].names는 클래스 이름 딕셔너리 (예: {0: 'person', 1: 'car', ...})
+        names = result.names if hasattr(result, 'names') and result.names else {}
+        # astype(int) truncates toward zero, same as the previous int(tensor) calls
+        coords = boxes.xyxy.cpu().numpy().astype(int).tolist()
+        scores = boxes.conf.cpu().numpy().tolist()
+        class_ids = boxes.cls.cpu().numpy().astype(int).tolist()
+        return [
+            {
+                "label": names.get(class_id, str(class_id)),
+                "score": score,
+                "box": {"xmin": xmin, "ymin": ymin, "xmax": xmax, "ymax": ymax}
+            }
+            for class_id, score, (xmin, ymin, xmax, ymax) in zip(class_ids, scores, coords)
+        ]
+
+    def detect_images(self, images: List[np.ndarray]) -> List[list]:
+        """
+        Runs one forward pass over a list of decoded RGB images.
+        Returns one list of detected objects per image, in the same order.
+        """
+        started = time.perf_counter()
+        results = self.model(images, **self.predict_args) # 추론 실행
+        self._record("inference", started, len(images))
+        return [self.extract_objects(result) for result in results]
+
+    def detect_objects(self, image_bytes: bytes) -> list:
         if not self.model:
             return [{"error": "Model not loaded."}]
         try:
-            image = Image.open(io.BytesIO(image_bytes))
-            if image.mode != "RGB":
-                image = image.convert("RGB")
-            
-            image_np = np.array(image)
-            
-            results = self.model(image_np, device="cpu") # 추론 실행
-            
-            detected_objects = []
-            # results[0].boxes에서 탐지된 객체 정보 추출
-            # results[0].names는 클래스 이름 딕셔너리 (예: {0: 'person', 1: 'car', ...})
-            names = results[0].names if hasattr(results[0], 'names') else {}
-            for box in results[0].boxes:
-                label = names[int(box.cls)] if names and int(box.cls) in names else str(int(box.cls))
-                detected_objects.append({
-                    "label": label,
-                    "score": float(box.conf), 
-                    "box": { 
-                        "xmin": int(box.xyxy[0][0]),
-                        "ymin": int(box.xyxy[0][1]),
-                        "xmax": int(box.xyxy[0][2]),
-                        "ymax": int(box.xyxy[0][3])
-                    }
-                })
-            return detected_objects
+            image_np = self.decode_image(image_bytes)
+            return self.detect_images([image_np])[0]
         except Exception as e:
             print(f"Error during YOLOv12 detection: {e}")
             return [{"error": f"Error processing image: {str(e)}"}]
 
-# 핸들러 인스턴스 생성 (서버 시작 시 모델 로드)
-object_detection_handler = ObjectDetectionHandler() 
\ No newline at end of file
+    def detect_objects_batch(self, images_bytes: List[bytes], max_batch_size: int = 16) -> List[list]:
+        """
+        Detects objects in several images with batched forward passes of up to max_batch_size images.
+        An image that cannot be decoded gets an error entry without failing the others.
+        """
+        if not self.model:
+            return [[{"error": "Model not loaded."}] for _ in images_bytes]
+
+        results: List[list] = [[] for _ in images_bytes]
+        decoded = []
+        for index, image_bytes in enumerate(images_bytes):
+            try:
+                decoded.append((index, self.decode_image(image_bytes)))
+            except Exception as e:
+                print(f"Error decoding image for YOLOv12 detection: {e}")
+                results[index] = [{"error": f"Error processing image: {str(e)}"}]
+
+        for start in range(0, len(decoded), max(1, max_batch_size)):
+            chunk = decoded[start:start + max_batch_size]
+            try:
+                chunk_objects = self.detect_images([image_np for _, image_np in chunk])
+            except Exception as e:
+                print(f"Error during batched YOLOv12 detection ({len(chunk)} images): {e}")
+                chunk_objects = [[{"error": f"Error processing image: {str(e)}"}] for _ in chunk]
+            for (index, _), objects in zip(chunk, chunk_objects):
+                results[index] = objects
+        return results
+
+# 핸들러 인스턴스 생성 (모델은 서버 시작 후 백그라운드에서 load()로 로드)
+object_detection_handler = ObjectDetectionHandler()
@@ -0,0 +1,56 @@
+"""
+One-time export of the YOLOv12 weights to an optimized CPU artifact for DETECTION_BACKEND=onnx|openvino.
+
+    python scripts/export_model.py --format openvino --int8
+    DETECTION_BACKEND=openvino uvicorn app.main:app
+
+Writes the artifact and <format>.json (source weights sha256, image size, int8) to DETECTION_EXPORT_DIR.
+The server only loads the artifact while the sha256 still matches the .pt file; otherwise it falls back to the .pt weights.
+With --compare, the exported model is run next to the .pt model on the given images and the detections are compared.
+"""
+import argparse
+import os
+import sys
+
+SERVER_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+def compare(reference, exported, image_paths):
+    for path in image_paths:
+        with open(path, "rb") as f:
+            image_bytes = f.read()
+        expected = reference.detect_objects(image_bytes)
+        actual = exported.detect_objects(image_bytes)
+        expected_labels = sorted(obj.get("label", "?") for obj in expected)
+        actual_labels = sorted(obj.get("label", "?") for obj in actual)
+        status = "same labels" if expected_labels == actual_labels else "DIFFERENT labels"
+        print(f"{os.path.basename(path)}: pytorch {len(expected)} objects, {exported.backend} {len(actual)} objects ({status})")
+        for obj in actual:
+            if "error" not in obj:
+                print(f"    {obj['label']:<16} {obj['score']:.2f} {obj['box']}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the YOLOv12 detection model for CPU inference.")
+    parser.add_argument("--format", choices=["onnx", "openvino"], default="onnx")
+    parser.add_argument("--int8", action="store_true", help="Post-training int8 quantization (openvino only, needs nncf).")
+    parser.add_argument("--data", default=None, help="Calibration dataset yaml for --int8 (ultralytics default: coco8.yaml).")
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument("--compare", nargs="*", default=None, metavar="IMAGE", help="Images to run through both models after export.")
+    args = parser.parse_args()
+
+    # The module-level handler is the reference model; keep it on the plain weights
+    os.environ["DETECTION_BACKEND"] = "pytorch"
+    sys.path.insert(0, SERVER_DIR)
+    from app.model_handler import ObjectDetectionHandler, object_detection_handler
+
+    object_detection_handler.load()
+    if object_detection_handler.model is None:
+        sys.exit(f"Could not load {object_detection_handler.weights_path}.")
+    manifest_path = object_detection_handler.export(args.format, imgsz=args.imgsz, int8=args.int8, data=args.data)
+    print(f"Export manifest written to {manifest_path}")
+
+    exported = ObjectDetectionHandler(backend=args.format)
+    exported.load()
+    if exported.backend != args.format:
+        sys.exit("The exported model failed verification or could not be loaded.")
+    if args.compare:
+        compare(object_detection_handler, exported, args.compare)
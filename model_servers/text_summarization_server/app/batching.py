@@ -0,0 +1,106 @@
+import asyncio
+import os
+from typing import Dict, List, Optional, Tuple
+
+from .model_handler import TextSummarizationHandler, TextSummarizationRequest, text_summarization_handler
+from .inference_executor import InferenceExecutor, InferenceQueueFull, inference_executor
+
+TEXT_MAX_BATCH_SIZE = int(os.environ.get("TEXT_MAX_BATCH_SIZE", 8))
+TEXT_BATCH_WINDOW_MS = float(os.environ.get("TEXT_BATCH_WINDOW_MS", 10))
+
+class GenerationBatcher:
+    """
+    Gathers concurrent generation requests and runs them through the model as padded batches.
+    A batch is flushed once it holds max_batch_size prompts or window_ms after its first prompt arrived.
+    Prompts with different generation settings cannot share a forward pass, so a batch is split by settings.
+    """
+    def __init__(self, handler: TextSummarizationHandler, executor: InferenceExecutor, max_batch_size: int, window_ms: float):
+        self.handler = handler
+        self.executor = executor
+        self.max_batch_size = max(1, max_batch_size)
+        self.window_seconds = max(0.0, window_ms) / 1000.0
+        self._pending: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+
+    async def start(self):
+        if not self._tasks:
+            self._pending = asyncio.Queue()
+            self._tasks = [asyncio.create_task(self._run()) for _ in range(self.executor.workers)]
+            print(f"Generation batcher started (max_batch_size={self.max_batch_size}, window={self.window_seconds * 1000:.0f}ms, collectors={len(self._tasks)}).")
+
+    async def stop(self):
+        if not self._tasks:
+            return
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        while not self._pending.empty():
+            _, future = self._pending.get_nowait()
+            if not future.done():
+                future.set_result(["Error: Server is shutting down."])
+
+    @property
+    def pending_count(self) -> int:
+        return self._pending.qsize() if self._pending is not None else 0
+
+    async def generate(self, request: TextSummarizationRequest) -> List[str]:
+        return (await self.generate_many([request]))[0]
+
+    async def generate_many(self, requests: List[TextSummarizationRequest]) -> List[List[str]]:
+        """
+        Raises InferenceQueueFull when the pending prompts would exceed the executor's max_queue.
+        """
+        await self.start()
+        if self.pending_count + len(requests) > self.executor.max_queue * self.max_batch_size:
+            raise InferenceQueueFull(f"Generation queue is full ({self.pending_count} prompts pending).")
+        loop = asyncio.get_running_loop()
+        futures = []
+        for request in requests:
+            future = loop.create_future()
+            self._pending.put_nowait((request, future))
+            futures.append(future)
+        return [await future for future in futures]
+
+    async def _collect_batch(self) -> List[Tuple[TextSummarizationRequest, asyncio.Future]]:
+        loop = asyncio.get_running_loop()
+        batch = [await self._pending.get()]
+        deadline = loop.time() + self.window_seconds
+        while len(batch) < self.max_batch_size:
+            if not self._pending.empty():
+                batch.append(self._pending.get_nowait())
+                continue
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._pending.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    @staticmethod
+    def _settings_key(request: TextSummarizationRequest) -> tuple:
+        budget = ("new", request.max_new_tokens) if request.max_new_tokens is not None else ("total", request.max_length)
+        return budget, request.num_return_sequences, request.stop_at_sentence
+
+    async def _run(self):
+        while True:
+            batch = await self._collect_batch()
+            # Requests whose client went away are dropped before inference
+            groups: Dict[tuple, List[Tuple[TextSummarizationRequest, asyncio.Future]]] = {}
+            for request, future in batch:
+                if not future.done():
+                    groups.setdefault(self._settings_key(request), []).append((request, future))
+            for group in groups.values():
+                requests = [request for request, _ in group]
+                try:
+                    outputs = await self.executor.run(self.handler.generate_batch, requests)
+                except Exception as e:
+                    print(f"Error during batched text generation ({len(requests)} prompts): {e}")
+                    outputs = [[f"Error generating text: {str(e)}"]] * len(group)
+                for (_, future), texts in zip(group, outputs):
+                    if not future.done():
+                        future.set_result(texts)
+
+generation_batcher = GenerationBatcher(text_summarization_handler, inference_executor, TEXT_MAX_BATCH_SIZE, TEXT_BATCH_WINDOW_MS)
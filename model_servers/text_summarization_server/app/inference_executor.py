@@ -0,0 +1,52 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Optional
+
+INFERENCE_WORKERS = int(os.environ.get("INFERENCE_WORKERS", 1))
+INFERENCE_MAX_QUEUE = int(os.environ.get("INFERENCE_MAX_QUEUE", 32))
+
+class InferenceQueueFull(Exception):
+    pass
+
+class InferenceExecutor:
+    """
+    Runs blocking model calls on a bounded thread pool so the event loop stays free
+    to accept connections and answer /health while inference is running.
+    At most `workers` calls run at once; at most `max_queue` more may wait, beyond that run() raises InferenceQueueFull.
+    """
+    def __init__(self, workers: int = INFERENCE_WORKERS, max_queue: int = INFERENCE_MAX_QUEUE):
+        self.workers = max(1, workers)
+        self.max_queue = max(0, max_queue)
+        self.queued = 0
+        self.in_flight = 0
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="inference")
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        if self._slots is None:
+            # Created on first use so it belongs to the server's event loop
+            self._slots = asyncio.Semaphore(self.workers)
+        if self.queued >= self.max_queue and self._slots.locked():
+            raise InferenceQueueFull(f"Inference queue is full ({self.queued} waiting).")
+        self.queued += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.queued -= 1
+        self.in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, partial(fn, *args, **kwargs))
+        finally:
+            self.in_flight -= 1
+            self._slots.release()
+
+    def get_status(self) -> dict:
+        return {"workers": self.workers, "in_flight": self.in_flight, "queue_depth": self.queued, "max_queue": self.max_queue}
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+inference_executor = InferenceExecutor()
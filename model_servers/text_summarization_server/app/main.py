@@ -1,9 +1,15 @@
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, Response
+from pydantic import ValidationError
+import asyncio
 import os
-from typing import List
+from typing import List, Optional
 
-from .model_handler import text_summarization_handler, TextSummarizationRequest
+from .model_handler import text_summarization_handler, TextSummarizationRequest, TextSummarizationBatchRequest
+from .batching import generation_batcher
+from .inference_executor import inference_executor, InferenceQueueFull
+from .metrics import record_timing, render_metrics
+from .binary_transport import read_msgpack, encode_response
 
 app = FastAPI(
     title="Text Summarization Server",
@@ -13,23 +19,55 @@ app = FastAPI(
 
 DEBUG_MODE = os.environ.get("DEBUG_MODE", "False").lower() == "true"
 
-@app.on_event("startup")
-async def startup_event():
+# Inference timings from the handler feed the /metrics histograms
+text_summarization_handler.timing_hook = record_timing
+
+# Seconds a client is told to wait (Retry-After) while the model is still loading
+READY_RETRY_AFTER_SECONDS = 5
+
+_model_loader: Optional[asyncio.Task] = None
+
+async def load_model():
+    """
+    Loads and warms up the model on the inference thread, so the server accepts connections
+    (and answers /health, /ready with 503) while the weights are loading.
+    """
+    await inference_executor.run(text_summarization_handler.load)
     if text_summarization_handler.generator is None:
         print("Model could not be loaded at startup. Generation endpoint will fail.")
-    else:
+        return
+    await inference_executor.run(text_summarization_handler.warm_up)
+    if text_summarization_handler.is_ready:
+        await generation_batcher.start()
         print("Text Summarization Server started. Model is ready.")
 
+def require_ready():
+    if not text_summarization_handler.is_ready:
+        detail = "Model is not available. Please check server logs." if text_summarization_handler.state == "failed" else "Model is still loading."
+        raise HTTPException(status_code=503, detail=detail, headers={"Retry-After": str(READY_RETRY_AFTER_SECONDS)})
+
+@app.on_event("startup")
+async def startup_event():
+    global _model_loader
+    _model_loader = asyncio.create_task(load_model())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    if _model_loader is not None:
+        _model_loader.cancel()
+    await generation_batcher.stop()
+    inference_executor.shutdown()
+
 @app.post("/generate/", summary="Generate text based on a prompt", response_model=List[str])
 async def run_text_summarization(request: TextSummarizationRequest):
     """
     Receives a prompt and other parameters, returns generated text sequences.
+    Concurrent requests are batched together before they reach the model.
     """
-    if text_summarization_handler.generator is None:
-        raise HTTPException(status_code=503, detail="Model is not available. Please check server logs.")
+    require_ready()
 
     try:
-        generated_texts = await text_summarization_handler.generate_text(request)
+        generated_texts = await generation_batcher.generate(request)
         
         if generated_texts and generated_texts[0].startswith("Error:"):
             raise HTTPException(status_code=500, detail=generated_texts[0])
@@ -37,13 +75,90 @@ async def run_text_summarization(request: TextSummarizationRequest):
         return generated_texts 
     except HTTPException as e:
         raise e
+    except InferenceQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         print(f"Unexpected error in /generate/ endpoint: {e}")
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}")
 
+@app.post("/generate/raw", summary="Generate text from a msgpack-encoded request")
+async def run_text_summarization_raw(request: Request):
+    """
+    Same as /generate/ with a msgpack body (the fields of TextSummarizationRequest).
+    Replies with msgpack when the client accepts application/x-msgpack.
+    """
+    require_ready()
+
+    payload = await read_msgpack(request)
+    try:
+        generation_request = TextSummarizationRequest(**payload)
+    except (TypeError, ValidationError) as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    try:
+        generated_texts = await generation_batcher.generate(generation_request)
+    except InferenceQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        print(f"Unexpected error in /generate/raw endpoint: {e}")
+        raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}")
+    if generated_texts and generated_texts[0].startswith("Error:"):
+        raise HTTPException(status_code=500, detail=generated_texts[0])
+    return encode_response(request, generated_texts)
+
+@app.post("/generate/batch", summary="Generate text for several prompts in one call")
+async def run_text_summarization_batch(request: TextSummarizationBatchRequest):
+    """
+    Receives several prompts sharing the same generation settings and returns one result per prompt, in order.
+    A failed prompt is reported in its own result and does not fail the rest of the batch.
+    """
+    require_ready()
+
+    try:
+        outputs = await generation_batcher.generate_many([request.for_prompt(prompt) for prompt in request.prompts])
+
+        results = []
+        for prompt, generated_texts in zip(request.prompts, outputs):
+            if generated_texts and generated_texts[0].startswith("Error"):
+                results.append({"prompt": prompt, "generated": [], "error": generated_texts[0]})
+            else:
+                results.append({"prompt": prompt, "generated": generated_texts})
+        return JSONResponse(content={"results": results})
+    except InferenceQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        print(f"Unexpected error in /generate/batch endpoint: {e}")
+        raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}")
+
 @app.get("/health", summary="Health check endpoint")
 async def health_check():
-    return {"status": "ok", "model_loaded": text_summarization_handler.generator is not None}
+    """
+    Liveness check; answers as soon as the process is up. Use /ready to know whether requests can be served.
+    """
+    return {
+        "status": "ok",
+        "model_loaded": text_summarization_handler.generator is not None,
+        "model_state": text_summarization_handler.state,
+        "pending_prompts": generation_batcher.pending_count,
+        "inference": inference_executor.get_status()
+    }
+
+@app.get("/ready", summary="Readiness check endpoint")
+async def readiness_check():
+    """
+    200 once the model is loaded and warmed up, 503 before that (or if loading failed).
+    """
+    if text_summarization_handler.is_ready:
+        return {"ready": True}
+    return JSONResponse(
+        status_code=503,
+        content={"ready": False, "state": text_summarization_handler.state},
+        headers={"Retry-After": str(READY_RETRY_AFTER_SECONDS)}
+    )
+
+@app.get("/metrics", summary="Prometheus metrics", include_in_schema=False)
+async def metrics():
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
 
 if __name__ == "__main__":
     import uvicorn
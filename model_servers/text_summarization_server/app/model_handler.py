@@ -1,34 +1,187 @@
-from transformers import pipeline, set_seed
+from transformers import pipeline, set_seed, AutoModelForCausalLM, AutoTokenizer, StoppingCriteria, StoppingCriteriaList
 from pydantic import BaseModel, Field
-from typing import List
+from typing import Callable, List, Optional
+import os
+import time
+import torch
+
+TEXT_MODEL = os.environ.get("TEXT_MODEL", "distilbert/distilgpt2")
+# Dummy generations run after loading, so the first real request does not pay for lazy kernel initialization
+MODEL_WARMUP_RUNS = int(os.environ.get("MODEL_WARMUP_RUNS", 2))
+# With stop_at_sentence, generation may only stop at a sentence end after this many new tokens
+SENTENCE_STOP_MIN_NEW_TOKENS = int(os.environ.get("SENTENCE_STOP_MIN_NEW_TOKENS", 8))
+SENTENCE_END_CHARS = (".", "!", "?")
+
+def _from_cache_first(loader: Callable, model_id: str, **kwargs):
+    """
+    Loads from the local Hugging Face cache without any hub request; only a cache miss goes to the network.
+    """
+    try:
+        return loader(model_id, local_files_only=True, **kwargs)
+    except OSError:
+        return loader(model_id, **kwargs)
 
 class TextSummarizationRequest(BaseModel):
     prompt: str = Field(..., example="A picture of a cat sitting on a table. Objects found: cat, table.")
+    # Legacy budget that counts the prompt tokens too; only used when max_new_tokens is not given
+    max_length: int = Field(default=100, gt=0, le=500)
+    max_new_tokens: Optional[int] = Field(default=None, gt=0, le=500)
+    num_return_sequences: int = Field(default=1, gt=0, le=5)
+    # Stop each sequence at its first sentence end (after a few tokens) instead of spending the whole budget
+    stop_at_sentence: bool = True
+
+class TextSummarizationBatchRequest(BaseModel):
+    prompts: List[str] = Field(..., min_length=1, max_length=64)
     max_length: int = Field(default=100, gt=0, le=500)
+    max_new_tokens: Optional[int] = Field(default=None, gt=0, le=500)
     num_return_sequences: int = Field(default=1, gt=0, le=5)
+    stop_at_sentence: bool = True
+
+    def for_prompt(self, prompt: str) -> TextSummarizationRequest:
+        return TextSummarizationRequest(
+            prompt=prompt,
+            max_length=self.max_length,
+            max_new_tokens=self.max_new_tokens,
+            num_return_sequences=self.num_return_sequences,
+            stop_at_sentence=self.stop_at_sentence
+        )
+
+class SentenceEndCriteria(StoppingCriteria):
+    """
+    Per-sequence stop once the last generated token ends a sentence and at least min_new_tokens were generated.
+    Sequences that are done are padded by generate() while the rest of the batch continues.
+    """
+    def __init__(self, sentence_end_ids: torch.Tensor, prompt_length: int, min_new_tokens: int):
+        self.sentence_end_ids = sentence_end_ids
+        self.prompt_length = prompt_length
+        self.min_new_tokens = min_new_tokens
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs) -> torch.BoolTensor:
+        if input_ids.shape[1] - self.prompt_length < self.min_new_tokens:
+            return torch.zeros(input_ids.shape[0], dtype=torch.bool, device=input_ids.device)
+        return torch.isin(input_ids[:, -1], self.sentence_end_ids.to(input_ids.device))
 
 class TextSummarizationHandler:
+    """
+    The model is not loaded on construction: the server calls load() and warm_up() in the background
+    and only reports ready (state "ready") once both finished.
+    """
     def __init__(self):
+        # Optional callback(phase, seconds, batch_size) used by the server to record "inference" timings
+        self.timing_hook: Optional[Callable[[str, float, int], None]] = None
+        self.sentence_end_ids: Optional[torch.Tensor] = None
+        self.generator = None
+        # not_loaded -> loading -> warming_up -> ready, or failed
+        self.state = "not_loaded"
+
+    @property
+    def is_ready(self) -> bool:
+        return self.state == "ready"
+
+    def load(self):
+        self.state = "loading"
+        started = time.perf_counter()
         try:
-            self.generator = pipeline("text-generation", model="distilbert/distilgpt2", device=-1)
+            # low_cpu_mem_usage skips the random initialization; safetensors weights are memory-mapped by from_pretrained
+            self.generator = pipeline(
+                "text-generation",
+                model=_from_cache_first(AutoModelForCausalLM.from_pretrained, TEXT_MODEL, low_cpu_mem_usage=True),
+                tokenizer=_from_cache_first(AutoTokenizer.from_pretrained, TEXT_MODEL),
+                device=-1
+            )
+            tokenizer = self.generator.tokenizer
+            # GPT-2 has no pad token; pad on the left with EOS so every prompt ends at the same position
+            tokenizer.pad_token = tokenizer.eos_token
+            tokenizer.padding_side = "left"
+            self.sentence_end_ids = self._find_sentence_end_ids()
             set_seed(42) # For reproducibility
-            print("Text summarization model (distilbert/distilgpt2) loaded successfully.")
+            self.state = "warming_up"
+            print(f"Text summarization model ({TEXT_MODEL}) loaded successfully in {time.perf_counter() - started:.1f}s.")
         except Exception as e:
             print(f"Error loading text summarization model: {e}")
             self.generator = None
+            self.state = "failed"
+
+    def warm_up(self, runs: int = MODEL_WARMUP_RUNS):
+        if self.generator is None:
+            return
+        request = TextSummarizationRequest(prompt="Summarize this image. Caption: 'a cat'.", max_new_tokens=8, stop_at_sentence=False)
+        for _ in range(runs):
+            texts = self.generate_batch([request])[0]
+            if texts and texts[0].startswith("Error"):
+                print(f"Text summarization warm-up failed: {texts[0]}")
+                self.state = "failed"
+                return
+        self.state = "ready"
+
+    def _find_sentence_end_ids(self) -> torch.Tensor:
+        tokenizer = self.generator.tokenizer
+        tokens = tokenizer.convert_ids_to_tokens(list(range(len(tokenizer))))
+        ids = [token_id for token_id, token in enumerate(tokens) if token and token.rstrip().endswith(SENTENCE_END_CHARS)]
+        return torch.tensor(ids, dtype=torch.long)
 
-    async def generate_text(self, request: TextSummarizationRequest) -> List[str]:
+    @staticmethod
+    def _trim_to_sentence(text: str) -> str:
+        # Used when the budget ran out mid-sentence: drop the unfinished tail if a full sentence exists
+        cut = max(text.rfind(char) for char in SENTENCE_END_CHARS)
+        return text[:cut + 1] if cut > 0 else text
+
+    def generate_batch(self, requests: List[TextSummarizationRequest]) -> List[List[str]]:
+        """
+        Generates for several prompts in one padded forward pass per step.
+        All requests must share max_new_tokens/max_length, num_return_sequences and stop_at_sentence.
+        Returns, per request, its generated texts (prompt + continuation, like the pipeline output).
+        """
         if not self.generator:
-            return ["Error: Model not loaded."]
+            return [["Error: Model not loaded."] for _ in requests]
         try:
-            generated_outputs = self.generator(
-                request.prompt,
-                max_length=request.max_length,
-                num_return_sequences=request.num_return_sequences
-            )
-            return [output["generated_text"] for output in generated_outputs]
+            tokenizer = self.generator.tokenizer
+            model = self.generator.model
+            first = requests[0]
+            prompts = [request.prompt for request in requests]
+            encoded = tokenizer(prompts, return_tensors="pt", padding=True)
+            prompt_length = encoded["input_ids"].shape[1]
+            if first.max_new_tokens is not None:
+                max_new_tokens = first.max_new_tokens
+            else:
+                # Same budget the old max_length call gave the longest prompt
+                longest = int(encoded["attention_mask"].sum(dim=1).max())
+                max_new_tokens = max(1, first.max_length - longest)
+
+            stopping_criteria = None
+            if first.stop_at_sentence and self.sentence_end_ids is not None:
+                stopping_criteria = StoppingCriteriaList([
+                    SentenceEndCriteria(self.sentence_end_ids, prompt_length, SENTENCE_STOP_MIN_NEW_TOKENS)
+                ])
+
+            started = time.perf_counter()
+            with torch.no_grad():
+                outputs = model.generate(
+                    **encoded,
+                    max_new_tokens=max_new_tokens,
+                    num_return_sequences=first.num_return_sequences,
+                    do_sample=True,
+                    pad_token_id=tokenizer.eos_token_id,
+                    stopping_criteria=stopping_criteria
+                )
+            if self.timing_hook is not None:
+                self.timing_hook("inference", time.perf_counter() - started, len(prompts))
+
+            results = []
+            for index, prompt in enumerate(prompts):
+                texts = []
+                for row in range(index * first.num_return_sequences, (index + 1) * first.num_return_sequences):
+                    continuation = tokenizer.decode(outputs[row, prompt_length:], skip_special_tokens=True)
+                    if first.stop_at_sentence:
+                        continuation = self._trim_to_sentence(continuation)
+                    texts.append(prompt + continuation)
+                results.append(texts)
+            return results
         except Exception as e:
-            print(f"Error during text summarization: {e}")
-            return [f"Error generating text: {str(e)}"]
+            print(f"Error during text summarization ({len(requests)} prompts): {e}")
+            return [[f"Error generating text: {str(e)}"] for _ in requests]
+
+    def generate_text(self, request: TextSummarizationRequest) -> List[str]:
+        return self.generate_batch([request])[0]
 
-text_summarization_handler = TextSummarizationHandler() 
\ No newline at end of file
+text_summarization_handler = TextSummarizationHandler()
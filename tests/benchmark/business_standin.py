@@ -0,0 +1,44 @@
+"""
+Runs the business server against an in-memory MongoDB stand-in (mongomock), for benchmarking on a laptop.
+The model server URLs and every other setting come from the environment, exactly as in docker-compose.
+"""
+import argparse
+import logging
+import os
+import sys
+
+import mongomock
+import pymongo
+from mongomock.collection import BulkOperationBuilder
+
+BUSINESS_SERVER_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "business_server"))
+
+def install_mongo_standin():
+    """
+    Points pymongo.MongoClient at mongomock before app.core.database creates its client.
+    """
+    # pymongo 4.x passes sort= to UpdateOne bulk operations; mongomock does not accept it yet
+    original_add_update = BulkOperationBuilder.add_update
+
+    def add_update(self, *args, sort=None, **kwargs):
+        return original_add_update(self, *args, **kwargs)
+
+    BulkOperationBuilder.add_update = add_update
+    pymongo.MongoClient = mongomock.MongoClient
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Business server with an in-memory MongoDB stand-in.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--log-level", default="warning", help="Application log level (INFO logs every item and skews results).")
+    args = parser.parse_args()
+
+    install_mongo_standin()
+    sys.path.insert(0, BUSINESS_SERVER_DIR)
+    from app.main import app  # noqa: E402  (must come after the stand-in is installed)
+
+    # The app modules configure INFO logging on the root logger at import; quiet it down for the run
+    logging.getLogger().setLevel(args.log_level.upper())
+
+    import uvicorn
+    uvicorn.run(app, host=args.host, port=args.port, log_level=args.log_level, access_log=False)
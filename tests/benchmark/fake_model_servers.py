@@ -0,0 +1,223 @@
+import argparse
+import asyncio
+import random
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+from urllib.parse import unquote
+
+import msgpack
+from aiohttp import web
+
+# Canned responses; shaped like the real model servers' JSON
+FAKE_CAPTION = "a cat sitting on a wooden table"
+FAKE_OBJECTS = [
+    {"label": "cat", "score": 0.91, "box": {"xmin": 12, "ymin": 30, "xmax": 210, "ymax": 190}},
+    {"label": "dining table", "score": 0.77, "box": {"xmin": 0, "ymin": 120, "xmax": 320, "ymax": 240}},
+]
+FAKE_SUMMARY_SUFFIX = " A cat is resting on a wooden table in a bright room."
+
+@dataclass
+class LatencyProfile:
+    """
+    Service-time distribution of a fake model server, in milliseconds.
+    Spec strings: "fixed:50", "uniform:20-80", "lognormal:120,0.4" (median ms, sigma).
+    """
+    kind: str = "fixed"
+    a: float = 0.0
+    b: float = 0.0
+
+    @classmethod
+    def parse(cls, spec: str) -> "LatencyProfile":
+        kind, _, params = spec.partition(":")
+        kind = kind.strip().lower()
+        if kind == "fixed":
+            return cls("fixed", float(params or 0))
+        if kind == "uniform":
+            low, _, high = params.partition("-")
+            return cls("uniform", float(low), float(high or low))
+        if kind == "lognormal":
+            median, _, sigma = params.partition(",")
+            return cls("lognormal", float(median), float(sigma or 0.5))
+        raise ValueError(f"Unknown latency distribution '{spec}' (use fixed, uniform or lognormal).")
+
+    def sample_seconds(self, rng: random.Random) -> float:
+        if self.kind == "uniform":
+            value = rng.uniform(self.a, self.b)
+        elif self.kind == "lognormal":
+            value = rng.lognormvariate(0.0, self.b) * self.a
+        else:
+            value = self.a
+        return max(0.0, value) / 1000.0
+
+@dataclass
+class FakeServerConfig:
+    latency: LatencyProfile
+    # Fraction of requests answered with HTTP 500
+    error_rate: float = 0.0
+    # Fraction of requests that never answer within hang_seconds (exercises the business server's stage timeouts)
+    hang_rate: float = 0.0
+    hang_seconds: float = 300.0
+    # Requests served at once; the real servers run one CPU-bound inference worker
+    concurrency: int = 1
+    # /ready answers 503 (and calls are refused) for this long after start, like a server loading its model
+    ready_after_seconds: float = 0.0
+    # Serve the raw-body "/raw" endpoints; without them the business server falls back to multipart/JSON
+    raw_endpoints: bool = True
+
+class FakeModelServer:
+    """
+    Stand-in for one model server: same path and response shape, configurable service time and failures.
+    Service time is spent while holding one of `concurrency` slots, so requests queue like they do on a real CPU worker.
+    """
+    def __init__(self, kind: str, config: FakeServerConfig, seed: Optional[int] = None):
+        self.kind = kind
+        self.config = config
+        self.rng = random.Random(seed)
+        self._slots: Optional[asyncio.Semaphore] = None
+        self.stats = {"requests": 0, "errors": 0, "hangs": 0, "not_ready": 0}
+        self.started_at = time.monotonic()
+
+    @property
+    def is_ready(self) -> bool:
+        return time.monotonic() - self.started_at >= self.config.ready_after_seconds
+
+    async def _serve(self) -> Optional[web.Response]:
+        if not self.is_ready:
+            self.stats["not_ready"] += 1
+            return web.json_response({"detail": "Model is still loading."}, status=503)
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(max(1, self.config.concurrency))
+        self.stats["requests"] += 1
+        roll = self.rng.random()
+        async with self._slots:
+            if roll < self.config.hang_rate:
+                self.stats["hangs"] += 1
+                await asyncio.sleep(self.config.hang_seconds)
+            else:
+                await asyncio.sleep(self.config.latency.sample_seconds(self.rng))
+        if roll < self.config.hang_rate + self.config.error_rate:
+            self.stats["errors"] += 1
+            return web.json_response({"detail": f"Injected {self.kind} failure."}, status=500)
+        return None
+
+    async def handle_caption(self, request: web.Request) -> web.Response:
+        form = await request.post()
+        error = await self._serve()
+        return error or web.json_response({"filename": form["file"].filename, "caption": FAKE_CAPTION})
+
+    async def handle_detect(self, request: web.Request) -> web.Response:
+        form = await request.post()
+        error = await self._serve()
+        return error or web.json_response({"filename": form["file"].filename, "objects": FAKE_OBJECTS})
+
+    async def handle_generate(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        error = await self._serve()
+        return error or web.json_response([body.get("prompt", "") + FAKE_SUMMARY_SUFFIX])
+
+    def _raw_reply(self, request: web.Request, content) -> web.Response:
+        if "application/x-msgpack" in request.headers.get("Accept", ""):
+            return web.Response(body=msgpack.packb(content, use_bin_type=True), content_type="application/x-msgpack")
+        return web.json_response(content)
+
+    async def handle_caption_raw(self, request: web.Request) -> web.Response:
+        await request.read()
+        error = await self._serve()
+        return error or self._raw_reply(request, {"filename": unquote(request.headers.get("X-Filename", "image")), "caption": FAKE_CAPTION})
+
+    async def handle_detect_raw(self, request: web.Request) -> web.Response:
+        await request.read()
+        error = await self._serve()
+        return error or self._raw_reply(request, {"filename": unquote(request.headers.get("X-Filename", "image")), "objects": FAKE_OBJECTS})
+
+    async def handle_generate_raw(self, request: web.Request) -> web.Response:
+        body = msgpack.unpackb(await request.read(), raw=False)
+        error = await self._serve()
+        return error or self._raw_reply(request, [body.get("prompt", "") + FAKE_SUMMARY_SUFFIX])
+
+    async def handle_health(self, request: web.Request) -> web.Response:
+        return web.json_response({"status": "ok", "model_loaded": True, "fake": True, **self.stats})
+
+    async def handle_ready(self, request: web.Request) -> web.Response:
+        if self.is_ready:
+            return web.json_response({"ready": True})
+        return web.json_response({"ready": False, "state": "loading"}, status=503)
+
+    def build_app(self) -> web.Application:
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        path, handler, raw_handler = {
+            "caption": ("/caption/", self.handle_caption, self.handle_caption_raw),
+            "detect": ("/detect/", self.handle_detect, self.handle_detect_raw),
+            "generate": ("/generate/", self.handle_generate, self.handle_generate_raw),
+        }[self.kind]
+        app.router.add_post(path, handler)
+        if self.config.raw_endpoints:
+            app.router.add_post(path.rstrip("/") + "/raw", raw_handler)
+        app.router.add_get("/health", self.handle_health)
+        app.router.add_get("/ready", self.handle_ready)
+        return app
+
+SERVER_PATHS = {"caption": "/caption/", "detect": "/detect/", "generate": "/generate/"}
+
+async def start_fake_model_servers(configs: Dict[str, FakeServerConfig], host: str = "127.0.0.1", base_port: int = 9101,
+                                   seed: Optional[int] = None):
+    """
+    Starts one fake server per kind on consecutive ports (caption, detect, generate).
+    Returns: (runners, servers, urls) where urls maps kind -> full endpoint URL.
+    """
+    runners: List[web.AppRunner] = []
+    servers: Dict[str, FakeModelServer] = {}
+    urls: Dict[str, str] = {}
+    for offset, kind in enumerate(("caption", "detect", "generate")):
+        server = FakeModelServer(kind, configs[kind], seed=None if seed is None else seed + offset)
+        server.started_at = time.monotonic()
+        runner = web.AppRunner(server.build_app(), access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, host, base_port + offset).start()
+        runners.append(runner)
+        servers[kind] = server
+        urls[kind] = f"http://{host}:{base_port + offset}{SERVER_PATHS[kind]}"
+    return runners, servers, urls
+
+def add_fake_server_arguments(parser: argparse.ArgumentParser):
+    defaults = {"caption": "lognormal:150,0.35", "detect": "lognormal:80,0.3", "generate": "lognormal:400,0.4"}
+    for kind, latency in defaults.items():
+        parser.add_argument(f"--{kind}-latency", default=latency, help=f"Service time of the fake {kind} server (default {latency}).")
+        parser.add_argument(f"--{kind}-error-rate", type=float, default=0.0, help=f"Fraction of {kind} calls answered with 500.")
+        parser.add_argument(f"--{kind}-hang-rate", type=float, default=0.0, help=f"Fraction of {kind} calls that never answer in time.")
+        parser.add_argument(f"--{kind}-concurrency", type=int, default=1, help=f"Concurrent {kind} requests served (default 1).")
+    parser.add_argument("--hang-seconds", type=float, default=300.0, help="How long a hanging call stalls.")
+    parser.add_argument("--no-raw-endpoints", action="store_true", help="Only serve the multipart/JSON endpoints (older servers).")
+    parser.add_argument("--ready-after", type=float, default=0.0, help="Seconds the fake servers report not ready after start (model loading).")
+
+def configs_from_arguments(args: argparse.Namespace) -> Dict[str, FakeServerConfig]:
+    return {
+        kind: FakeServerConfig(
+            latency=LatencyProfile.parse(getattr(args, f"{kind}_latency")),
+            error_rate=getattr(args, f"{kind}_error_rate"),
+            hang_rate=getattr(args, f"{kind}_hang_rate"),
+            hang_seconds=args.hang_seconds,
+            concurrency=getattr(args, f"{kind}_concurrency"),
+            ready_after_seconds=args.ready_after,
+            raw_endpoints=not args.no_raw_endpoints,
+        )
+        for kind in ("caption", "detect", "generate")
+    }
+
+async def _serve_forever(args: argparse.Namespace):
+    _, _, urls = await start_fake_model_servers(configs_from_arguments(args), args.host, args.base_port, args.seed)
+    for kind, url in urls.items():
+        print(f"Fake {kind} server listening on {url}")
+    await asyncio.Event().wait()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run fake captioning/detection/generation servers for local benchmarking.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--base-port", type=int, default=9101)
+    parser.add_argument("--seed", type=int, default=None)
+    add_fake_server_arguments(parser)
+    try:
+        asyncio.run(_serve_forever(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
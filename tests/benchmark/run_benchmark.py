@@ -0,0 +1,370 @@
+"""
+End-to-end load benchmark for the business server, with no models and no network.
+
+Starts fake captioning/detection/generation servers in this process, the business server in a subprocess
+(against an in-memory MongoDB stand-in), then drives open-loop upload traffic at a target RPS and reports
+throughput, upload and end-to-end latency percentiles, queue wait and memory.
+
+    python tests/benchmark/run_benchmark.py --rps 20 --duration 60
+"""
+import argparse
+import asyncio
+import glob
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import aiohttp
+from prometheus_client.parser import text_string_to_metric_families
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from fake_model_servers import add_fake_server_arguments, configs_from_arguments, start_fake_model_servers  # noqa: E402
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+SAMPLE_IMAGES_DIR = os.path.join(BENCHMARK_DIR, "..", "sample_images")
+
+def percentile(sorted_values: List[float], pct: float) -> Optional[float]:
+    """
+    Nearest-rank percentile of an already sorted list.
+    """
+    if not sorted_values:
+        return None
+    rank = max(1, int(round(pct / 100.0 * len(sorted_values) + 0.5)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+def summarize(values: List[float]) -> Dict[str, Optional[float]]:
+    values = sorted(values)
+    return {
+        "count": len(values),
+        "mean": round(sum(values) / len(values), 4) if values else None,
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": values[-1] if values else None,
+    }
+
+def histogram_quantile(buckets: List[tuple], q: float) -> Optional[float]:
+    """
+    Estimates a quantile from cumulative Prometheus buckets [(upper_bound, count)] by linear interpolation.
+    """
+    if not buckets or buckets[-1][1] == 0:
+        return None
+    target = q * buckets[-1][1]
+    previous_bound, previous_count = 0.0, 0.0
+    for bound, count in buckets:
+        if count >= target:
+            if bound == float("inf"):
+                return previous_bound
+            span = count - previous_count
+            fraction = (target - previous_count) / span if span else 0.0
+            return round(previous_bound + (bound - previous_bound) * fraction, 4)
+        previous_bound, previous_count = bound, count
+    return previous_bound
+
+def parse_histograms(metrics_text: str, names: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Returns count, mean and estimated p50/p95/p99 for each histogram (and label set) in `names`.
+    """
+    raw: Dict[str, Dict[str, Any]] = {}
+    for family in text_string_to_metric_families(metrics_text):
+        if family.name not in names:
+            continue
+        for sample in family.samples:
+            labels = {k: v for k, v in sample.labels.items() if k != "le"}
+            key = family.name + ("{" + ",".join(f"{k}={v}" for k, v in sorted(labels.items())) + "}" if labels else "")
+            entry = raw.setdefault(key, {"buckets": [], "sum": 0.0, "count": 0.0})
+            if sample.name.endswith("_bucket"):
+                entry["buckets"].append((float(sample.labels["le"]), sample.value))
+            elif sample.name.endswith("_sum"):
+                entry["sum"] = sample.value
+            elif sample.name.endswith("_count"):
+                entry["count"] = sample.value
+    result = {}
+    for key, entry in raw.items():
+        buckets = sorted(entry["buckets"])
+        result[key] = {
+            "count": int(entry["count"]),
+            "mean": round(entry["sum"] / entry["count"], 4) if entry["count"] else None,
+            "p50": histogram_quantile(buckets, 0.50),
+            "p95": histogram_quantile(buckets, 0.95),
+            "p99": histogram_quantile(buckets, 0.99),
+        }
+    return result
+
+def read_rss_mb(pid: int) -> Optional[float]:
+    """
+    Resident set size of a process in MB (/proc on Linux, ps elsewhere).
+    """
+    try:
+        with open(f"/proc/{pid}/status") as status_file:
+            for line in status_file:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    try:
+        output = subprocess.run(["ps", "-o", "rss=", "-p", str(pid)], capture_output=True, text=True, timeout=5).stdout
+        return int(output.strip()) / 1024.0 if output.strip() else None
+    except (OSError, ValueError, subprocess.SubprocessError):
+        return None
+
+class BenchmarkRun:
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.base_url = f"http://127.0.0.1:{args.port}"
+        self.images = self._load_images(args.images)
+        # file_name -> send metadata; file names are unique per request so summaries can be matched back
+        self.sent: Dict[str, Dict[str, Any]] = {}
+        self.status_counts: Dict[str, int] = {}
+        self.upload_latencies: List[float] = []
+        self.rss_samples: List[float] = []
+        self.process: Optional[subprocess.Popen] = None
+
+    @staticmethod
+    def _load_images(pattern_dir: str) -> List[tuple]:
+        paths = sorted(glob.glob(os.path.join(pattern_dir, "*.png")) + glob.glob(os.path.join(pattern_dir, "*.jp*g")))
+        if not paths:
+            raise SystemExit(f"No images found in {pattern_dir}.")
+        images = []
+        for path in paths:
+            with open(path, "rb") as image_file:
+                content_type = "image/png" if path.endswith(".png") else "image/jpeg"
+                images.append((os.path.splitext(path)[1], image_file.read(), content_type))
+        return images
+
+    def _business_env(self, urls: Dict[str, str]) -> Dict[str, str]:
+        env = dict(os.environ)
+        env.update({
+            "MONGO_HOST": "localhost",
+            "IMAGE_CAPTIONING_URL": urls["caption"],
+            "OBJECT_DETECTION_URL": urls["detect"],
+            "TEXT_SUMMARIZATION_URL": urls["generate"],
+        })
+        # Quotas would otherwise cut the run short; anything set explicitly in the environment wins
+        env.setdefault("MAX_SUMMARIES_PER_DAY", "100000000")
+        env.setdefault("MAX_PARTICIPATION_WITH_SHARES", "100000000")
+        # Repeated sample images would otherwise be served from the result cache without touching the models
+        env.setdefault("RESULT_CACHE_ENABLED", "True" if self.args.result_cache else "False")
+        return env
+
+    async def start_business_server(self, urls: Dict[str, str]):
+        command = [sys.executable, os.path.join(BENCHMARK_DIR, "business_standin.py"),
+                   "--port", str(self.args.port), "--log-level", self.args.log_level]
+        self.process = subprocess.Popen(command, env=self._business_env(urls))
+        deadline = time.monotonic() + 60
+        async with aiohttp.ClientSession() as session:
+            while time.monotonic() < deadline:
+                if self.process.poll() is not None:
+                    raise SystemExit(f"Business server exited with code {self.process.returncode}.")
+                try:
+                    async with session.get(f"{self.base_url}/health") as response:
+                        if response.status == 200:
+                            return
+                except aiohttp.ClientError:
+                    pass
+                await asyncio.sleep(0.25)
+        raise SystemExit("Business server did not become healthy within 60s.")
+
+    def stop_business_server(self):
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+    async def sample_memory(self, stop: asyncio.Event):
+        while not stop.is_set():
+            rss = read_rss_mb(self.process.pid)
+            if rss is not None:
+                self.rss_samples.append(rss)
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=self.args.memory_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def upload_one(self, session: aiohttp.ClientSession, index: int, measured: bool):
+        extension, image_bytes, content_type = self.images[index % len(self.images)]
+        file_name = f"bench_{index:07d}{extension}"
+        customer_id = f"bench_{self.rng.randrange(self.args.customers):05d}"
+        form = aiohttp.FormData()
+        form.add_field("customer_id", customer_id)
+        form.add_field("image", image_bytes, filename=file_name, content_type=content_type)
+        sent_at = datetime.utcnow()
+        started = time.perf_counter()
+        try:
+            async with session.post(f"{self.base_url}/api/upload_image/", data=form) as response:
+                await response.read()
+                status = str(response.status)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            status = type(e).__name__
+        elapsed = time.perf_counter() - started
+        self.status_counts[status] = self.status_counts.get(status, 0) + 1
+        if measured:
+            self.upload_latencies.append(elapsed)
+        if status == "200":
+            self.sent[file_name] = {"sent_at": sent_at, "measured": measured}
+
+    async def drive_load(self) -> float:
+        """
+        Open loop: requests are fired on schedule whether or not earlier ones have finished.
+        Returns the wall time spent sending.
+        """
+        total_seconds = self.args.warmup + self.args.duration
+        connector = aiohttp.TCPConnector(limit=0)
+        timeout = aiohttp.ClientTimeout(total=self.args.request_timeout)
+        tasks = []
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+            loop = asyncio.get_running_loop()
+            started = loop.time()
+            next_at = 0.0
+            index = 0
+            while next_at < total_seconds:
+                delay = started + next_at - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                tasks.append(asyncio.create_task(self.upload_one(session, index, measured=next_at >= self.args.warmup)))
+                index += 1
+                if self.args.arrivals == "poisson":
+                    next_at += self.rng.expovariate(self.args.rps)
+                else:
+                    next_at += 1.0 / self.args.rps
+            send_seconds = loop.time() - started
+            await asyncio.gather(*tasks)
+        return send_seconds
+
+    async def wait_for_drain(self, session: aiohttp.ClientSession) -> bool:
+        deadline = time.monotonic() + self.args.drain_timeout
+        while time.monotonic() < deadline:
+            async with session.get(f"{self.base_url}/api/admin/admission_status/") as response:
+                status = await response.json()
+            if status.get("unfinished_requests", 0) == 0:
+                return True
+            await asyncio.sleep(0.25)
+        return False
+
+    async def collect_results(self, session: aiohttp.ClientSession) -> Dict[str, Any]:
+        limit = max(1, len(self.sent))
+        async with session.get(f"{self.base_url}/api/admin/all_summaries/", params={"limit": str(limit)}) as response:
+            summaries = await response.json()
+        async with session.get(f"{self.base_url}/metrics") as response:
+            metrics_text = await response.text()
+
+        e2e_latencies = []
+        completed_at = []
+        for record in summaries:
+            sent = self.sent.get(record.get("original_file_name"))
+            if sent is None:
+                continue
+            created_at = datetime.fromisoformat(record["created_at"])
+            completed_at.append(created_at)
+            if sent["measured"]:
+                e2e_latencies.append((created_at - sent["sent_at"]).total_seconds())
+
+        histograms = parse_histograms(metrics_text, ["queue_wait_seconds", "stage_latency_seconds"])
+        return {
+            "summaries": summaries,
+            "completed": len(completed_at),
+            "e2e_latencies": e2e_latencies,
+            "completion_span": (max(completed_at) - min(completed_at)).total_seconds() if len(completed_at) > 1 else None,
+            "histograms": histograms,
+        }
+
+    async def run(self) -> Dict[str, Any]:
+        runners, servers, urls = await start_fake_model_servers(configs_from_arguments(self.args), base_port=self.args.fake_base_port, seed=self.args.seed)
+        stop_sampling = asyncio.Event()
+        try:
+            await self.start_business_server(urls)
+            baseline_rss = read_rss_mb(self.process.pid)
+            sampler = asyncio.create_task(self.sample_memory(stop_sampling))
+            print(f"Driving {self.args.arrivals} load at {self.args.rps} rps for {self.args.warmup}s warm-up + {self.args.duration}s...")
+            send_seconds = await self.drive_load()
+            async with aiohttp.ClientSession() as session:
+                drained = await self.wait_for_drain(session)
+                results = await self.collect_results(session)
+            stop_sampling.set()
+            await sampler
+
+            sent_total = sum(self.status_counts.values())
+            accepted = len(self.sent)
+            return {
+                "config": {key: value for key, value in vars(self.args).items() if key != "json_out"},
+                "offered_rps": round(sent_total / send_seconds, 2) if send_seconds else None,
+                "requests": sent_total,
+                "status_counts": dict(sorted(self.status_counts.items())),
+                "accepted": accepted,
+                "completed": results["completed"],
+                "incomplete": accepted - results["completed"],
+                "drained": drained,
+                "completion_throughput_rps": round(results["completed"] / results["completion_span"], 2) if results["completion_span"] else None,
+                "upload_latency_seconds": summarize(self.upload_latencies),
+                "e2e_latency_seconds": summarize(results["e2e_latencies"]),
+                "queue_wait_seconds": results["histograms"].get("queue_wait_seconds"),
+                "stage_latency_seconds": {key: value for key, value in results["histograms"].items() if key.startswith("stage_latency_seconds")},
+                "business_rss_mb": {
+                    "baseline": round(baseline_rss, 1) if baseline_rss else None,
+                    "peak": round(max(self.rss_samples), 1) if self.rss_samples else None,
+                    "end": round(self.rss_samples[-1], 1) if self.rss_samples else None,
+                },
+                "fake_servers": {kind: server.stats for kind, server in servers.items()},
+            }
+        finally:
+            stop_sampling.set()
+            self.stop_business_server()
+            for runner in runners:
+                await runner.cleanup()
+
+def format_seconds(value: Optional[float]) -> str:
+    return "-" if value is None else f"{value * 1000:.1f}ms"
+
+def print_report(report: Dict[str, Any]):
+    print()
+    print("=== Benchmark report ===")
+    print(f"Requests: {report['requests']} at {report['offered_rps']} rps offered; status codes: {report['status_counts']}")
+    print(f"Accepted: {report['accepted']}, completed: {report['completed']}, incomplete: {report['incomplete']}" + ("" if report["drained"] else " (drain timed out)"))
+    print(f"Completion throughput: {report['completion_throughput_rps']} items/s")
+    for title, key in (("Upload latency", "upload_latency_seconds"), ("End-to-end latency", "e2e_latency_seconds"), ("Queue wait (histogram est.)", "queue_wait_seconds")):
+        stats = report.get(key) or {}
+        print(f"{title:<28} n={stats.get('count', 0):<6} mean={format_seconds(stats.get('mean'))} "
+              f"p50={format_seconds(stats.get('p50'))} p95={format_seconds(stats.get('p95'))} p99={format_seconds(stats.get('p99'))}")
+    for key, stats in sorted(report["stage_latency_seconds"].items()):
+        print(f"  {key:<40} n={stats['count']:<6} mean={format_seconds(stats['mean'])} p95={format_seconds(stats['p95'])}")
+    rss = report["business_rss_mb"]
+    print(f"Business server RSS: baseline {rss['baseline']} MB, peak {rss['peak']} MB, end {rss['end']} MB")
+    print(f"Fake servers: {report['fake_servers']}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Open-loop end-to-end load benchmark with fake model servers and in-memory MongoDB.")
+    parser.add_argument("--rps", type=float, default=10.0, help="Target request rate.")
+    parser.add_argument("--duration", type=float, default=30.0, help="Measured seconds of load.")
+    parser.add_argument("--warmup", type=float, default=5.0, help="Seconds of load before measuring.")
+    parser.add_argument("--arrivals", choices=["constant", "poisson"], default="poisson", help="Inter-arrival distribution.")
+    parser.add_argument("--customers", type=int, default=1000, help="Distinct customer ids to spread uploads over.")
+    parser.add_argument("--images", default=SAMPLE_IMAGES_DIR, help="Directory of PNG/JPEG images to upload.")
+    parser.add_argument("--result-cache", action="store_true", help="Keep the result cache on (repeated images then skip the models).")
+    parser.add_argument("--port", type=int, default=8100, help="Port for the business server under test.")
+    parser.add_argument("--fake-base-port", type=int, default=9101, help="First port of the fake model servers.")
+    parser.add_argument("--request-timeout", type=float, default=60.0, help="Client timeout per upload.")
+    parser.add_argument("--drain-timeout", type=float, default=300.0, help="Max seconds to wait for queued work after the load stops.")
+    parser.add_argument("--memory-interval", type=float, default=0.5, help="Seconds between RSS samples.")
+    parser.add_argument("--log-level", default="warning", help="Business server log level.")
+    parser.add_argument("--seed", type=int, default=1234, help="Seed for arrivals, customers and fake latencies.")
+    parser.add_argument("--json-out", default=None, help="Also write the full report as JSON to this path.")
+    add_fake_server_arguments(parser)
+    args = parser.parse_args()
+
+    report = asyncio.run(BenchmarkRun(args).run())
+    print_report(report)
+    if args.json_out:
+        with open(args.json_out, "w") as output:
+            json.dump(report, output, indent=2, default=str)
+        print(f"Report written to {args.json_out}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Tests for admission control: 503 above the high-water mark, 429 at the per-customer cap, Retry-After
+derived from the EWMA processing rate, and idempotent complete/release.
+"""
+import os
+import sys
+
+BUSINESS_SERVER_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "business_server"))
+if BUSINESS_SERVER_DIR not in sys.path:
+    sys.path.insert(0, BUSINESS_SERVER_DIR)
+
+import pytest  # noqa: E402
+
+from app.core import admission  # noqa: E402
+from app.core.admission import AdmissionController, AdmissionRejected  # noqa: E402
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(admission.time, "monotonic", clock.monotonic)
+    return clock
+
+def make_controller(**overrides) -> AdmissionController:
+    # Initial rate 0.5/s: 2 seconds per item until completions have been measured
+    settings = {"high_water_mark": 3, "max_in_flight_per_customer": 2, "smoothing": 0.5, "initial_rate": 0.5, "max_retry_after": 120}
+    settings.update(overrides)
+    return AdmissionController(**settings)
+
+def test_sheds_with_503_above_the_high_water_mark(clock):
+    controller = make_controller()
+    for i in range(3):
+        controller.admit(f"req-{i}", f"customer-{i}")
+
+    with pytest.raises(AdmissionRejected) as rejected:
+        controller.admit("req-3", "customer-3")
+    assert rejected.value.status_code == 503
+    # One item has to drain at the assumed 2 seconds per item
+    assert rejected.value.retry_after == 2
+    assert controller.get_status()["rejected_overload"] == 1
+
+    # A finished request makes room again
+    controller.complete("req-0")
+    controller.admit("req-3", "customer-3")
+    assert controller.depth == 3
+
+def test_rejects_with_429_at_the_per_customer_cap(clock):
+    controller = make_controller(high_water_mark=10)
+    assert controller.admit("req-1", "customer-a") == (2.0, 1)
+    assert controller.admit("req-2", "customer-a") == (4.0, 2)
+    controller.admit("req-3", "customer-b")
+
+    with pytest.raises(AdmissionRejected) as rejected:
+        controller.admit("req-4", "customer-a")
+    assert rejected.value.status_code == 429
+    # Bounded by the time the current backlog (3 items) takes to drain
+    assert rejected.value.retry_after == 6
+    assert controller.get_status()["rejected_customer"] == 1
+    # Other customers are unaffected
+    controller.admit("req-5", "customer-b")
+
+def test_retry_after_follows_the_measured_rate(clock):
+    controller = make_controller(high_water_mark=2, max_retry_after=10)
+    controller.admit("req-1", "customer-a")
+    controller.admit("req-2", "customer-b")
+
+    # The first interval is measured from the moment the system became busy
+    clock.now += 4.0
+    controller.complete("req-1")
+    assert controller.processing_rate == pytest.approx(0.25)
+    # Later intervals are smoothed: 4 + 0.5 * (1 - 4)
+    clock.now += 1.0
+    controller.complete("req-2")
+    assert controller.estimate_wait(1) == pytest.approx(2.5)
+
+    controller.admit("req-3", "customer-a")
+    controller.admit("req-4", "customer-b")
+    with pytest.raises(AdmissionRejected) as rejected:
+        controller.admit("req-5", "customer-c")
+    assert rejected.value.retry_after == 3  # ceil(2.5)
+
+    # Capped at max_retry_after however slow the measured rate gets
+    clock.now += 100.0
+    controller.complete("req-3")
+    controller.admit("req-5", "customer-c")
+    with pytest.raises(AdmissionRejected) as rejected:
+        controller.admit("req-6", "customer-d")
+    assert rejected.value.retry_after == 10
+
+def test_idle_time_does_not_count_as_processing_time(clock):
+    controller = make_controller()
+    controller.admit("req-1", "customer-a")
+    clock.now += 2.0
+    controller.complete("req-1")
+    # Idle for a long while, then busy again
+    clock.now += 600.0
+    controller.admit("req-2", "customer-a")
+    clock.now += 2.0
+    controller.complete("req-2")
+    assert controller.estimate_wait(1) == pytest.approx(2.0)
+
+def test_complete_and_release_are_idempotent(clock):
+    controller = make_controller()
+    controller.admit("req-1", "customer-a")
+    controller.admit("req-2", "customer-a")
+    controller.admit("req-3", "customer-b")
+
+    clock.now += 3.0
+    # process_single_item_from_queue can complete an item that save_item_summary already completed
+    controller.complete("req-1")
+    interval = controller.estimate_wait(1)
+    clock.now += 50.0
+    controller.complete("req-1")
+    controller.release("req-1")
+    assert controller.estimate_wait(1) == interval
+    assert controller.get_status()["completed"] == 1
+
+    assert controller.release("req-2") is True
+    assert controller.release("req-2") is False
+    controller.complete("req-2")
+    assert controller.get_status()["completed"] == 1
+
+    status = controller.get_status()
+    assert status["unfinished_requests"] == 1
+    assert status["customers_in_flight"] == 1
+    # customer-a is back to zero in flight, so it gets its full allowance again
+    controller.admit("req-4", "customer-a")
+    controller.admit("req-5", "customer-a")
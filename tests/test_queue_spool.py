@@ -0,0 +1,219 @@
+"""
+Crash-recovery tests for the durable queue spool (QUEUE_SPOOL_DIR): enqueue, drop the manager without
+closing it, recover into a fresh manager and check exactly the unfinished items come back.
+"""
+import asyncio
+import logging
+import os
+import sys
+import threading
+
+BUSINESS_SERVER_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "business_server"))
+if BUSINESS_SERVER_DIR not in sys.path:
+    sys.path.insert(0, BUSINESS_SERVER_DIR)
+
+from app.core.queue_manager import SimpleQueueManager  # noqa: E402
+from app.core.queue_spool import QueueSpool  # noqa: E402
+from app.models.schemas import QueuedItem  # noqa: E402
+
+# Small enough that a handful of items spans several segments
+SEGMENT_MAX_BYTES = 512
+
+def make_manager(spool_dir, memory_cap_bytes: int = 64 * 1024 * 1024, max_attempts: int = 5) -> SimpleQueueManager:
+    manager = SimpleQueueManager(spool_dir=str(spool_dir), memory_cap_bytes=memory_cap_bytes)
+    manager._spool = QueueSpool(str(spool_dir), segment_max_bytes=SEGMENT_MAX_BYTES, max_attempts=max_attempts)
+    return manager
+
+def make_item(index: int, priority: bool = False) -> QueuedItem:
+    return QueuedItem(
+        request_id=f"req-{index:03d}",
+        customer_id=f"customer-{index % 3}",
+        file_name=f"image-{index}.jpg",
+        image_bytes=f"payload-{index}".encode() * 8,
+        is_first_time_user=priority
+    )
+
+async def drain(manager: SimpleQueueManager):
+    items = []
+    while True:
+        item = await manager.get_from_queue()
+        if item is None:
+            return items
+        items.append(item)
+
+def segment_count(spool_dir) -> int:
+    return len(os.listdir(os.path.join(str(spool_dir), "segments")))
+
+def test_recover_returns_exactly_the_unfinished_items_after_rotation(tmp_path, caplog):
+    async def scenario():
+        manager = make_manager(tmp_path)
+        a, b, c, d, e = (make_item(i) for i in range(5))
+        await manager.add_to_queue(a)
+        # Two records per segment from here on
+        manager._spool.segment_max_bytes = os.path.getsize(manager._spool._segment_path(manager._spool._segment_id)) + 1
+        await manager.add_to_queue(b)                # segment 1: put a, put b
+        await manager.add_to_queue(c)                # segment 2: put c ...
+        assert (await manager.get()).request_id == a.request_id
+        await manager.mark_done(a.request_id)        # ... done a (its put stays behind in segment 1 with b)
+        await manager.add_to_queue(d)                # segment 3: put d ...
+        assert (await manager.get()).request_id == b.request_id  # b stays in flight
+        assert (await manager.get()).request_id == c.request_id
+        await manager.mark_done(c.request_id)        # ... done c; segment 2 holds nothing unfinished
+        await manager.add_to_queue(e)                # segment 4
+        assert segment_count(tmp_path) > 1
+        # "Crash": the manager is dropped without close(); spool writes are flushed per record
+        manager._spool_executor.shutdown(wait=True)
+
+        recovered_manager = make_manager(tmp_path)
+        with caplog.at_level(logging.WARNING):
+            recovered = await recovered_manager.recover()
+        recovered_items = await drain(recovered_manager)
+        recovered_manager.close()
+        return recovered, recovered_items
+
+    recovered, recovered_items = asyncio.run(scenario())
+
+    # b was in flight, d and e were still queued; a and c must not come back
+    assert recovered == 3
+    assert [item.request_id for item in recovered_items] == ["req-001", "req-003", "req-004"]
+    for item in recovered_items:
+        assert item.image_bytes == make_item(int(item.request_id.split("-")[1])).image_bytes
+    assert "missing" not in caplog.text
+
+def test_recover_after_many_rotations(tmp_path):
+    async def scenario():
+        manager = make_manager(tmp_path)
+        for i in range(12):
+            await manager.add_to_queue(make_item(i))
+        taken = [await manager.get() for _ in range(8)]
+        # Finished out of order, so "done" records land in later segments than their puts
+        for item in taken[1:6]:
+            await manager.mark_done(item.request_id)
+        for i in range(12, 20):
+            await manager.add_to_queue(make_item(i))
+        for item in await drain(manager):
+            if item.request_id not in ("req-013", "req-017"):
+                await manager.mark_done(item.request_id)
+        manager._spool_executor.shutdown(wait=True)
+
+        recovered_manager = make_manager(tmp_path)
+        await recovered_manager.recover()
+        recovered_items = await drain(recovered_manager)
+        recovered_manager.close()
+        return taken, recovered_items
+
+    taken, recovered_items = asyncio.run(scenario())
+    expected = [taken[0].request_id, taken[6].request_id, taken[7].request_id, "req-013", "req-017"]
+    assert [item.request_id for item in recovered_items] == expected
+
+def test_recovered_state_survives_a_second_crash(tmp_path):
+    async def scenario():
+        manager = make_manager(tmp_path)
+        for i in range(6):
+            await manager.add_to_queue(make_item(i))
+        manager._spool_executor.shutdown(wait=True)
+
+        second = make_manager(tmp_path)
+        assert await second.recover() == 6
+        first, second_item = await second.get(), await second.get()
+        await second.mark_done(first.request_id)
+        await second.mark_done(second_item.request_id)
+        second._spool_executor.shutdown(wait=True)
+
+        third = make_manager(tmp_path)
+        count = await third.recover()
+        remaining = [item.request_id for item in await drain(third)]
+        third.close()
+        payload_files = os.listdir(os.path.join(str(tmp_path), "payloads"))
+        return count, remaining, payload_files
+
+    count, remaining, payload_files = asyncio.run(scenario())
+    assert count == 4
+    assert remaining == ["req-002", "req-003", "req-004", "req-005"]
+    assert sorted(payload_files) == sorted(f"{request_id}.bin" for request_id in remaining)
+
+def test_spilled_payloads_are_read_back_from_the_spool(tmp_path):
+    async def scenario():
+        # Room for about one payload in memory; the rest keep only their metadata in RAM
+        manager = make_manager(tmp_path, memory_cap_bytes=100)
+        items = [make_item(i, priority=(i % 2 == 0)) for i in range(5)]
+        for item in items:
+            await manager.add_to_queue(item)
+        status = await manager.get_queue_status()
+        taken = await drain(manager)
+        manager.close()
+        return items, status, taken
+
+    items, status, taken = asyncio.run(scenario())
+    assert status["spilled_items"] >= 3
+    # Priority items first, each group in enqueue order, with the original payload bytes
+    expected = [item for item in items if item.is_first_time_user] + [item for item in items if not item.is_first_time_user]
+    assert [item.request_id for item in taken] == [item.request_id for item in expected]
+    assert [item.image_bytes for item in taken] == [item.image_bytes for item in expected]
+
+def test_spilled_payloads_are_read_on_the_spool_thread(tmp_path):
+    async def scenario():
+        manager = make_manager(tmp_path, memory_cap_bytes=0)
+        spool = manager._spool
+        read_threads = []
+
+        def read_payload(request_id):
+            read_threads.append(threading.current_thread().name)
+            return QueueSpool.read_payload(spool, request_id)
+
+        spool.read_payload = read_payload
+        for i in range(3):
+            await manager.add_to_queue(make_item(i))
+        taken = [await manager.get(), await manager.get_from_queue(), *(await manager.get_many(2))]
+        manager.close()
+        return read_threads, taken
+
+    read_threads, taken = asyncio.run(scenario())
+    assert len(read_threads) == 3
+    assert all(name.startswith("queue-spool") for name in read_threads)
+    assert [item.image_bytes for item in taken] == [make_item(i).image_bytes for i in range(3)]
+
+def test_failed_items_are_not_replayed_and_release_their_segments(tmp_path):
+    async def scenario():
+        manager = make_manager(tmp_path)
+        for i in range(6):
+            await manager.add_to_queue(make_item(i))
+        for item in await drain(manager):
+            if item.request_id == "req-002":
+                await manager.mark_failed(item.request_id)
+            else:
+                await manager.mark_done(item.request_id)
+        # Rotates past the finished segments, which can then be deleted
+        await manager.add_to_queue(make_item(6))
+        manager._spool_executor.shutdown(wait=True)
+
+        recovered_manager = make_manager(tmp_path)
+        await recovered_manager.recover()
+        remaining = [item.request_id for item in await drain(recovered_manager)]
+        recovered_manager.close()
+        return remaining
+
+    assert asyncio.run(scenario()) == ["req-006"]
+    assert segment_count(tmp_path) == 1
+    assert os.listdir(os.path.join(str(tmp_path), "payloads")) == ["req-006.bin"]
+
+def test_items_left_unfinished_max_attempts_times_are_dropped(tmp_path, caplog):
+    async def scenario():
+        manager = make_manager(tmp_path, max_attempts=3)
+        await manager.add_to_queue(make_item(0))
+        manager._spool_executor.shutdown(wait=True)
+        recovered_counts = []
+        for _ in range(3):
+            # Every restart takes the item and "crashes" before it finishes
+            manager = make_manager(tmp_path, max_attempts=3)
+            recovered_counts.append(await manager.recover())
+            await drain(manager)
+            manager._spool_executor.shutdown(wait=True)
+        return recovered_counts
+
+    with caplog.at_level(logging.ERROR):
+        recovered_counts = asyncio.run(scenario())
+    # Queued once, replayed twice, then given up on
+    assert recovered_counts == [1, 1, 0]
+    assert "req-000 was queued 3 times" in caplog.text
+    assert os.listdir(os.path.join(str(tmp_path), "payloads")) == []
@@ -0,0 +1,113 @@
+"""
+Tests for the in-memory quota engine: reservations cannot over-admit, releases are idempotent and
+counter changes survive a failed write-behind flush.
+"""
+import asyncio
+import os
+import sys
+
+BUSINESS_SERVER_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "business_server"))
+if BUSINESS_SERVER_DIR not in sys.path:
+    sys.path.insert(0, BUSINESS_SERVER_DIR)
+
+import pytest  # noqa: E402
+
+from app.core import quota  # noqa: E402
+from app.core.quota import QuotaEngine  # noqa: E402
+from app.utils.dates import utc_date_str  # noqa: E402
+
+class FakeRepository:
+    """
+    Stands in for mongo_repository in the flush path; fails the next `failures` writes.
+    """
+    def __init__(self, failures: int = 0, delay: float = 0.0):
+        self.failures = failures
+        self.delay = delay
+        self.writes = []
+
+    async def apply_usage_increments(self, total_increments, usage_increments):
+        await asyncio.sleep(self.delay)
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("MongoDB unreachable")
+        self.writes.append((dict(total_increments), {key: dict(changes) for key, changes in usage_increments.items()}))
+
+@pytest.fixture
+def repository(monkeypatch):
+    repository = FakeRepository()
+    monkeypatch.setattr(quota, "mongo_repository", repository)
+    return repository
+
+def make_engine(max_summaries_per_day: int = 5, max_participation: int = 100) -> QuotaEngine:
+    return QuotaEngine(max_summaries_per_day=max_summaries_per_day, max_participation=max_participation, flush_interval=3600)
+
+def test_concurrent_reservations_never_exceed_the_daily_limit(repository):
+    repository.delay = 0.01
+    engine = make_engine(max_summaries_per_day=5)
+
+    async def submit(index: int):
+        # Interleaved like concurrent uploads, with a flush in progress part of the time
+        await asyncio.sleep(0)
+        return engine.try_reserve(f"customer-{index % 4}", f"req-{index}")[0]
+
+    async def scenario():
+        flush = asyncio.create_task(engine.flush())
+        results = await asyncio.gather(*(submit(i) for i in range(40)))
+        await flush
+        await engine.flush()
+        return results
+
+    results = asyncio.run(scenario())
+    assert results.count(True) == 5
+    assert engine.get_status()["total_today"] == 5
+    assert sum(total.get(utc_date_str(), 0) for total, _ in repository.writes) == 5
+
+def test_per_customer_participation_limit(repository):
+    engine = make_engine(max_summaries_per_day=100, max_participation=2)
+    results = [engine.try_reserve("customer-a", f"req-{i}") for i in range(3)]
+    assert [allowed for allowed, *_ in results] == [True, True, False]
+    # Only the first reservation of the day is a first participation
+    assert [first for _, _, first, _ in results[:2]] == [True, False]
+    assert engine.try_reserve("customer-b", "req-b")[0]
+
+def test_release_gives_the_slot_back_once(repository):
+    engine = make_engine(max_summaries_per_day=2)
+    assert engine.try_reserve("customer-a", "req-1")[0]
+    assert engine.try_reserve("customer-a", "req-2")[0]
+    assert not engine.try_reserve("customer-b", "req-3")[0]
+
+    # The request failed after its reservation; releasing it twice must not free a second slot
+    assert engine.release("req-1") is True
+    assert engine.release("req-1") is False
+    assert engine.release("req-unknown") is False
+    assert engine.get_status()["total_today"] == 1
+    assert engine.try_reserve("customer-b", "req-4")[0]
+    assert not engine.try_reserve("customer-b", "req-5")[0]
+
+    asyncio.run(engine.flush())
+    totals, usage = repository.writes[-1]
+    assert totals == {utc_date_str(): 2}
+    assert usage[(utc_date_str(), "customer-a")] == {"summary_count": 1, "participation_count": 1}
+
+def test_failed_flush_keeps_the_changes_for_the_next_flush(repository):
+    repository.failures = 1
+    engine = make_engine()
+
+    async def scenario():
+        engine.try_reserve("customer-a", "req-1")
+        engine.try_reserve("customer-b", "req-2")
+        await engine.flush()
+        assert repository.writes == []
+        assert engine.get_status()["pending_writes"] == 2
+        # Changes made between the failed flush and the retry are merged with the ones put back
+        engine.try_reserve("customer-a", "req-3")
+        engine.release("req-2")
+        await engine.flush()
+        await engine.flush()
+
+    asyncio.run(scenario())
+    assert len(repository.writes) == 1
+    totals, usage = repository.writes[0]
+    assert totals == {utc_date_str(): 2}
+    assert usage == {(utc_date_str(), "customer-a"): {"summary_count": 2, "participation_count": 2}}
+    assert engine.get_status()["pending_writes"] == 0